@@ -0,0 +1,184 @@
+# backtest_sweep.py
+# Grid search over RuleParams for strict_backtest_price_volume.py (--sweep grid.json).
+#
+# Per-trade features that do not depend on the parameters are computed once:
+#   15m move, signal-bar volume ratio (registry vol_ratio), 4h breakout level, 5m hold count after
+#   the signal bar, coin age (for is_new). Trigger/confirmation for every combination
+#   are then evaluated as boolean masks over all trades at once, and trade simulations
+#   are cached per (breakeven_r, trail_start_r), the only knobs they depend on.
+#
+# grid.json maps RuleParams fields to lists of values, e.g.
+#   {"a_main_up": [0.03, 0.04, 0.055], "a_main_dn": [-0.03, -0.04, -0.055],
+#    "vol_mult_main": [2, 3], "confirm_5m_bars": [0, 1, 2], "breakeven_r": [1, 1.5], "trail_start_r": [2, 3]}
+# Fields not in the grid keep their RuleParams defaults.
+
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields, replace
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from kline_store import KlineArrays, KlineStore
+from strict_backtest_price_volume import (RuleParams, WIN15, WIN5, is_breakout_4h_15m, merge_stats,
+                                          pct_change_15m, signal_features, simulate_trade)
+
+DAY_MS = 24*60*60*1000
+
+
+def load_grid(path):
+    with open(path, "r", encoding="utf-8") as f:
+        grid = json.load(f)
+    known = {f.name for f in fields(RuleParams)}
+    unknown = set(grid) - known
+    if unknown:
+        raise SystemExit(f"Unknown RuleParams fields in grid: {sorted(unknown)}")
+    return {k: (v if isinstance(v, list) else [v]) for k, v in grid.items()}
+
+
+def expand(grid, base: RuleParams):
+    keys = list(grid)
+    return [replace(base, **dict(zip(keys, vals))) for vals in itertools.product(*(grid[k] for k in keys))]
+
+
+def trade_features(k15, k5, side, tm, max_confirm):
+    """Parameter-independent inputs of the rule check for one trade (None if no klines / no bar)."""
+    if k15.empty or k5.empty:
+        return None
+    idx = k15.bar_at(tm)
+    if idx < 0:
+        return None
+    f = signal_features(k15, idx)
+    ok_break, level = is_breakout_4h_15m(k15, idx, "up" if side == "LONG" else "down", f)
+    close_time = int(k15.close_time[idx])
+    # number of consecutive 5m closes holding the level right after the signal bar
+    hold_n = 0
+    if level is not None:
+        i = k5.first_at_or_after(close_time)
+        closes = k5.close[i:i+max_confirm]
+        hold = closes >= level if side == "LONG" else closes <= level
+        hold_n = int(np.argmin(hold)) if not hold.all() else len(hold)
+    return {
+        "age_ms": tm - int(k15.open_time[0]),
+        "move": pct_change_15m(k15, idx, f),
+        "vol_ratio": float(f.vol_ratio[0]) if f.enough("vol_spike") else np.nan,
+        "ok_break": bool(ok_break and level is not None),
+        "level": level,
+        "close_time": close_time,
+        "hold_n": hold_n,
+    }
+
+
+def sweep_symbol(cache_dir, sym, trades, sim_pairs, min_confirm, max_confirm):
+    """
+    Worker: features for every trade of one symbol, plus simulations for each (breakeven_r, trail_start_r)
+    pair on trades that can pass at least the loosest confirmation. Returns [(pos, side, feats, sims)].
+    """
+    store = KlineStore(cache_dir, offline=True)
+    tms = [tm for _, _, tm in trades]
+    k15 = KlineArrays.from_frame(store.read(sym, "15m", min(tms) - WIN15[0], max(tms) + WIN15[1]))
+    k5 = KlineArrays.from_frame(store.read(sym, "5m", min(tms) - WIN5[0], max(tms) + WIN5[1]))
+    out = []
+    for pos, side, tm in trades:
+        w15 = k15.window(tm - WIN15[0], tm + WIN15[1])
+        w5 = k5.window(tm - WIN5[0], tm + WIN5[1])
+        feats = trade_features(w15, w5, side, tm, max_confirm)
+        sims = None
+        if feats and feats["ok_break"] and feats["hold_n"] >= min_confirm:
+            sims = []
+            for be, tr in sim_pairs:
+                p = RuleParams(breakeven_r=be, trail_start_r=tr)
+                sim = simulate_trade(w15, w5, feats["close_time"], side, feats["level"], p)
+                sims.append(sim["pnl_r"] if sim.get("taken") else np.nan)
+        out.append((pos, side, feats, sims))
+    return out, store.stats
+
+
+def evaluate(combos, sim_pairs, rows):
+    """Vectorized rule evaluation: one row of masks per combination, one column per trade."""
+    n = len(rows)
+    long = np.array([side == "LONG" for _, side, _, _ in rows])
+    valid = np.array([f is not None for _, _, f, _ in rows])
+    get = lambda key, default: np.array([f[key] if f else default for _, _, f, _ in rows], dtype=float)
+    age, move, vol_ratio = get("age_ms", np.inf), get("move", np.nan), get("vol_ratio", np.nan)
+    ok_break = np.array([bool(f and f["ok_break"]) for _, _, f, _ in rows])
+    hold_n = get("hold_n", -1)
+
+    pnl = np.full((len(sim_pairs), n), np.nan)
+    for j, (_, _, _, sims) in enumerate(rows):
+        if sims is not None: pnl[:, j] = sims
+
+    col = lambda name: np.array([getattr(p, name) for p in combos], dtype=float)[:, None]
+    is_new = age[None, :] <= col("new_days") * DAY_MS
+    th_up = np.where(is_new, col("a_new_up"), col("a_main_up"))
+    th_dn = np.where(is_new, col("a_new_dn"), col("a_main_dn"))
+    ok_move = np.where(long[None, :], move[None, :] >= th_up, move[None, :] <= th_dn)
+    mult = np.where(is_new, col("vol_mult_new"), col("vol_mult_main"))
+    with np.errstate(invalid="ignore"):
+        ok_vol = vol_ratio[None, :] >= mult  # same comparison as the vol_spike rule
+    confirm = hold_n[None, :] >= col("confirm_5m_bars")
+
+    pair_idx = {pair: i for i, pair in enumerate(sim_pairs)}
+    sel = np.array([pair_idx[(p.breakeven_r, p.trail_start_r)] for p in combos])
+    r = pnl[sel]  # (combos, trades)
+    taken = (valid & ok_break)[None, :] & ok_move & ok_vol & confirm & ~np.isnan(r)
+    r = np.where(taken, r, np.nan)
+
+    n_taken = taken.sum(axis=1)
+    wins = np.where(taken & (r > 0), r, 0).sum(axis=1)
+    losses = np.where(taken & (r <= 0), r, 0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        res = pd.DataFrame({
+            "trades_taken_by_rule": n_taken,
+            "take_rate": n_taken / max(1, n),
+            "win_rate": (taken & (r > 0)).sum(axis=1) / n_taken,
+            "avg_r": np.nanmean(r, axis=1) if n else np.nan,
+            "median_r": np.nanmedian(r, axis=1) if n else np.nan,
+            "profit_factor_r": wins / np.maximum(1e-9, np.abs(losses)),
+            "max_r": np.nanmax(np.where(taken, r, -np.inf), axis=1),
+            "min_r": np.nanmin(np.where(taken, r, np.inf), axis=1),
+        })
+    res.loc[n_taken == 0, ["win_rate", "avg_r", "median_r", "profit_factor_r", "max_r", "min_r"]] = np.nan
+    return res
+
+
+def run_sweep(args, jobs, base: RuleParams, stats):
+    grid = load_grid(args.sweep)
+    combos = expand(grid, base)
+    sim_pairs = sorted({(p.breakeven_r, p.trail_start_r) for p in combos})
+    confirms = [p.confirm_5m_bars for p in combos]
+    print(f"sweep: {len(combos)} combinations, {len(sim_pairs)} simulation variants")
+
+    rows = []
+    with tqdm(total=sum(len(t) for _, t in jobs), desc="Features") as bar:
+        if args.workers <= 1:
+            for sym, trades in jobs:
+                out, st = sweep_symbol(args.cache_dir, sym, trades, sim_pairs, min(confirms), max(confirms))
+                rows.extend(out); merge_stats(stats, st); bar.update(len(trades))
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers) as ex:
+                futs = {ex.submit(sweep_symbol, args.cache_dir, sym, trades, sim_pairs, min(confirms), max(confirms)):
+                        len(trades) for sym, trades in jobs}
+                for fut in as_completed(futs):
+                    out, st = fut.result()
+                    rows.extend(out); merge_stats(stats, st); bar.update(futs[fut])
+    rows.sort(key=lambda x: x[0])
+
+    res = evaluate(combos, sim_pairs, rows)
+    params = pd.DataFrame([{k: getattr(p, k) for k in grid} for p in combos])
+    table = pd.concat([params, res], axis=1)
+    table.insert(len(grid), "total_trades_in_file", len(rows))
+    table = table.sort_values(["avg_r", "profit_factor_r", "trades_taken_by_rule"],
+                              ascending=[False, False, False], na_position="last").reset_index(drop=True)
+
+    out_csv = os.path.join(args.out, "sweep_results.csv")
+    table.to_csv(out_csv, index=False, encoding="utf-8-sig")
+    print("DONE")
+    print("kline store:", stats)
+    print("sweep:", out_csv)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(table.head(20).to_string(index=False))
+    return table
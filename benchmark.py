@@ -0,0 +1,368 @@
+# benchmark.py
+# Offline benchmarks for the scanner and backtest hot paths.
+#
+# Everything runs against deterministic synthetic fixtures, never the exchange:
+#   - a local HTTP stub (separate process) serving /fapi/v1/klines, /ticker/24hr and /ticker/price
+#     for --symbols synthetic symbols (50x15m and 50x1m bars each)
+#   - months of 15m/5m bars per symbol of --trades, built around the trade times in that file
+# Timed:
+#   scanner : ScannerEngine.analyze_single (REST to the stub), check_180s_shock / check_trend
+#             (no I/O), get_dashboard_data / get_dashboard_snapshot, a whole run_scan round
+#   scan.py : Level1ScannerV05.analyze_single (REST to the stub, no Tk window)
+#   backtest: confirm_hold_5m, simulate_trade, backtest_trade (full rule check per trade)
+# The stub's weight limiter is lifted, so rounds measure our code and not the 2400/min budget.
+# Results go to --out as JSON. With --baseline, each benchmark's mean is compared with an earlier
+# run, and the exit code is 1 when any is slower by more than --tolerance.
+#
+# Usage:
+#   python benchmark.py --out bench.json
+#   python benchmark.py --only backtest --trades trades.csv
+#   python benchmark.py --baseline bench_main.json --tolerance 0.25   # CI regression gate
+
+import argparse, os, sys, json, time, platform, subprocess, tempfile
+import multiprocessing as mp
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "crypto_scanner_v2.2"))
+
+M1 = 60_000
+M5 = 300_000
+M15 = 900_000
+DAY_MS = 24*60*60*1000
+INTERVAL_MS = {"1m": M1, "5m": M5, "15m": M15}
+
+
+# ---------- fixtures ----------
+def random_walk(rng, n, start_ms, step_ms, p0=1.0, vol=0.004):
+    """OHLCV arrays of a random walk with occasional volume/price spikes (so the rules do fire)."""
+    ret = rng.normal(0, vol, n)
+    spikes = rng.random(n) < 0.02
+    ret[spikes] *= 10
+    close = p0 * np.exp(np.cumsum(ret))
+    open_ = np.r_[p0, close[:-1]]
+    wick = np.abs(rng.normal(0, vol / 2, n))
+    high = np.maximum(open_, close) * (1 + wick)
+    low = np.minimum(open_, close) * (1 - wick)
+    volume = rng.lognormal(10, 0.4, n) * np.where(spikes, 6.0, 1.0)
+    t = start_ms + np.arange(n, dtype=np.int64) * step_ms
+    return t, open_, high, low, close, volume
+
+
+def fixture_symbols(n):
+    return [f"BENCH{i:04d}USDT" for i in range(n)]
+
+
+def fixture_rows(symbol, interval, n, end_ms, seed):
+    """Binance kline rows for the n bars ending at end_ms (last one still forming)."""
+    rng = np.random.default_rng([seed, int.from_bytes(symbol.encode(), "little") % 2**32, n, INTERVAL_MS[interval]])
+    step = INTERVAL_MS[interval]
+    start = (end_ms // step - n + 1) * step
+    t, o, h, l, c, v = random_walk(rng, n, start, step, p0=float(rng.uniform(0.1, 100)))
+    return [[int(t[i]), f"{o[i]:.8f}", f"{h[i]:.8f}", f"{l[i]:.8f}", f"{c[i]:.8f}", f"{v[i]:.3f}",
+             int(t[i]) + step - 1, "0", 100, "0", "0", "0"] for i in range(n)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as two writes; avoid the 40ms delayed-ACK stall
+    symbols, seed, end_ms, cache = [], 0, 0, {}
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        key = (u.path, q.get("symbol"), q.get("interval"), q.get("limit"))
+        body = self.cache.get(key)
+        if body is None:
+            if u.path.endswith("/klines"):
+                data = fixture_rows(q["symbol"], q["interval"], int(q.get("limit", 500)), self.end_ms, self.seed)
+            elif u.path.endswith("/ticker/24hr"):
+                rng = np.random.default_rng(self.seed)
+                data = [{"symbol": s, "lastPrice": "1.0", "priceChangePercent": f"{rng.normal(0, 6):.2f}",
+                         "quoteVolume": f"{rng.uniform(3.1e7, 5e8):.0f}"} for s in self.symbols]
+            elif u.path.endswith("/ticker/price"):
+                data = [{"symbol": s, "price": "1.0"} for s in self.symbols]
+            else:
+                self.send_response(404); self.send_header("Content-Length", "0"); self.end_headers()
+                return
+            body = self.cache[key] = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_stub(n_symbols, seed, end_ms, port_q):
+    StubHandler.symbols, StubHandler.seed, StubHandler.end_ms = fixture_symbols(n_symbols), seed, end_ms
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    srv.daemon_threads = True
+    port_q.put(srv.server_port)
+    srv.serve_forever()
+
+
+# ---------- timing ----------
+def timed(name, fn, items, results, rounds=1, warmup=1):
+    """
+    Call fn(item) for every item, `rounds` times; store latency stats under results[name].
+    mean_ms / total_s / per_sec are from the fastest round (least disturbed by other load),
+    the percentiles are over every call.
+    """
+    for item in items[:warmup]:
+        fn(item)
+    lat = np.empty((rounds, len(items)))
+    totals = []
+    for r in range(rounds):
+        t0 = time.perf_counter()
+        for i, item in enumerate(items):
+            s = time.perf_counter()
+            fn(item)
+            lat[r, i] = time.perf_counter() - s
+        totals.append(time.perf_counter() - t0)
+    best = int(np.argmin(totals))
+    total = totals[best]
+    results[name] = {
+        "n": len(items),
+        "rounds": rounds,
+        "total_s": round(total, 6),
+        "mean_ms": round(float(lat[best].mean()) * 1000, 4),
+        "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 4),
+        "p95_ms": round(float(np.percentile(lat, 95)) * 1000, 4),
+        "max_ms": round(float(lat.max()) * 1000, 4),
+        "per_sec": round(len(items) / total, 2) if total > 0 else None,
+    }
+    r = results[name]
+    print(f"  {name:<36} n={r['n']:<6} mean {r['mean_ms']:>9.3f} ms  p95 {r['p95_ms']:>9.3f} ms  {r['per_sec']}/s")
+
+
+def lift_weight_limit(url):
+    """The stub has no exchange budget: give its host an effectively unlimited token bucket."""
+    from app.http_client import limiter_for
+    lim = limiter_for(urlparse(url).netloc)
+    lim.capacity = lim.tokens = lim.rate = 1e12
+
+
+# ---------- scanner benchmarks ----------
+def bench_scanner(args, url, results):
+    # ScannerEngine is built at import time and its sqlite / signal journal paths are relative:
+    # run the whole section inside the scratch dir, with Telegram off
+    os.environ.update(TG_BOT_TOKEN="", STREAM_MODE="0", PROFILE_SLOW_ROUND_SECONDS="0")
+    cwd = os.getcwd()
+    os.chdir(args.workdir)
+    try:
+        _bench_scanner(args, url, results)
+    finally:
+        os.chdir(cwd)
+
+
+def _bench_scanner(args, url, results):
+    from app.database import create_db_and_tables
+    from app.scanner import scanner
+    from app.stream import klines_df
+    create_db_and_tables()
+    lift_weight_limit(url)
+    scanner.base_url = url
+    symbols = fixture_symbols(args.symbols)
+
+    print("scanner (app/scanner.py):")
+    timed("scanner.analyze_single", scanner.analyze_single, symbols, results, args.rounds)
+
+    end_ms = args.end_ms
+    df1 = {s: klines_df(fixture_rows(s, "1m", 5, end_ms, args.seed)) for s in symbols}
+    df15 = {s: klines_df(fixture_rows(s, "15m", 50, end_ms, args.seed)) for s in symbols}
+    timed("scanner.check_180s_shock", lambda s: scanner.check_180s_shock(s, df1[s]), symbols, results, args.rounds)
+    timed("scanner.check_trend", lambda s: scanner.check_trend(s, df15[s]), symbols, results, args.rounds)
+
+    rng = np.random.default_rng(args.seed)
+    now = time.time()
+    for i in range(args.symbols * 4):
+        s = symbols[i % len(symbols)]
+        scanner.leaderboard.update(s, int(rng.integers(50, 99)), f"rule{i % 7}", float(rng.normal(0, 0.03)),
+                                   ts=now - float(rng.uniform(0, 3600)))
+    reps = list(range(args.repeat * 20))
+    timed("scanner.get_dashboard_data", lambda _: scanner.get_dashboard_data(), reps, results, args.rounds)
+
+    def snapshot(_):
+        scanner.touch()  # force a rebuild, as after every hit
+        scanner.get_dashboard_snapshot()
+    timed("scanner.get_dashboard_snapshot", snapshot, reps, results, args.rounds)
+
+    def full_round(_):
+        # worst case: re-tier, every symbol due, prefilter cold (1m fetch for all), no cooldown
+        scanner.tiers.snapshot_at = 0
+        scanner.tiers.last_scan.clear()
+        scanner.last_hit.clear()
+        if scanner.prefilter is not None: scanner.prefilter.reset()
+        scanner.run_scan()
+    timed("scanner.run_scan", full_round, list(range(args.repeat)), results)
+    results["scanner.run_scan"]["symbols"] = args.symbols
+    scanner.shutdown()
+
+
+def bench_level1(args, url, results):
+    try:
+        from scan import Level1ScannerV05
+    except ImportError as e:  # no tkinter on this interpreter
+        print(f"scan.py: skipped ({e})")
+        return
+    from app.evomemory import EvoMemory
+    from app.http_client import HttpClient
+    from app.leaderboard import Leaderboard
+    from app.tiers import TierScheduler
+
+    # the constructor builds the Tk window; analyze_single only needs the data attributes
+    v05 = Level1ScannerV05.__new__(Level1ScannerV05)
+    v05.http = HttpClient(pool_size=10)
+    v05.base_url = url
+    v05.evolution_memory, v05.watchlist, v05.symbols_info = EvoMemory(), set(), {}
+    v05.scan_round, v05.frames, v05.last_alert = 0, {}, {}
+    v05.tiers, v05.board = TierScheduler(), Leaderboard()
+    thresholds = {"trend": 0.05, "vol": 2.5, "accel": 0.08}
+
+    print("scan.py (Level1ScannerV05):")
+    timed("level1.analyze_single", lambda s: v05.analyze_single(s, thresholds), fixture_symbols(args.symbols), results,
+          args.rounds)
+
+
+# ---------- backtest benchmarks ----------
+def load_trades(path):
+    """(symbol, side, t_ms) per row, with the same column detection as strict_backtest main()."""
+    from strict_backtest_price_volume import to_utc_ms
+    df = pd.read_csv(path)
+    tms = df["Opened"].apply(to_utc_ms)
+    side = df["Position Side"].astype(str).str.upper().replace({"BUY": "LONG", "SELL": "SHORT"})
+    ok = tms.notna() & side.isin(["LONG", "SHORT"])
+    return [(str(s).upper(), sd, int(t)) for s, sd, t in zip(df["symbol"][ok], side[ok], tms[ok])]
+
+
+def fixture_arrays(symbol, interval, t0, t1, seed):
+    from kline_store import KlineArrays
+    step = INTERVAL_MS[interval]
+    start = t0 // step * step
+    n = int((t1 - start) // step) + 1
+    rng = np.random.default_rng([seed, int.from_bytes(symbol.encode(), "little") % 2**32, step])
+    t, o, h, l, c, v = random_walk(rng, n, start, step, p0=float(rng.uniform(0.1, 100)),
+                                   vol=0.006 if interval == "15m" else 0.0035)
+    return KlineArrays(t, t + step - 1, o, h, l, c, v)
+
+
+def bench_backtest(args, results):
+    import strict_backtest_price_volume as bt
+
+    trades = load_trades(args.trades)
+    params = bt.RuleParams()
+    by_sym = {}
+    for sym, side, tm in trades:
+        by_sym.setdefault(sym, []).append((side, tm))
+    k15, k5 = {}, {}
+    for sym, rows in by_sym.items():
+        tms = [tm for _, tm in rows]
+        k15[sym] = fixture_arrays(sym, "15m", min(tms) - bt.WIN15[0], max(tms) + bt.WIN15[1], args.seed)
+        k5[sym] = fixture_arrays(sym, "5m", min(tms) - bt.WIN5[0], max(tms) + bt.WIN5[1], args.seed)
+    results["_fixtures"]["backtest"] = {
+        "trades": len(trades), "symbols": len(by_sym),
+        "bars_15m": int(sum(len(k) for k in k15.values())), "bars_5m": int(sum(len(k) for k in k5.values())),
+    }
+
+    # per trade: windows exactly as run_symbol hands them to backtest_trade, level 1% through the entry
+    jobs = []
+    for sym, side, tm in trades:
+        w15 = k15[sym].window(tm - bt.WIN15[0], tm + bt.WIN15[1])
+        w5 = k5[sym].window(tm - bt.WIN5[0], tm + bt.WIN5[1])
+        i = w5.first_at_or_after(tm)
+        if i >= len(w5): continue
+        level = float(w5.open[i]) * (0.99 if side == "LONG" else 1.01)
+        jobs.append((sym, side, tm, w15, w5, level))
+
+    print(f"backtest (strict_backtest_price_volume.py, {len(jobs)} trades):")
+    timed("backtest.confirm_hold_5m",
+          lambda j: bt.confirm_hold_5m(j[4], j[5], j[2], "up" if j[1] == "LONG" else "down", params.confirm_5m_bars),
+          jobs, results, args.rounds)
+    timed("backtest.simulate_trade", lambda j: bt.simulate_trade(j[3], j[4], j[2], j[1], j[5], params),
+          jobs, results, args.rounds)
+    timed("backtest.backtest_trade", lambda j: bt.backtest_trade(j[0], j[1], j[2], j[3], j[4], params),
+          jobs, results, args.rounds)
+
+
+# ---------- report ----------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Print mean-latency ratios against a previous JSON; returns names slower than 1 + tolerance."""
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)["results"]
+    slower = []
+    print(f"vs baseline {baseline_path} (tolerance {tolerance:.0%}):")
+    for name, r in results.items():
+        if name.startswith("_") or name not in base or not base[name]["mean_ms"]: continue
+        ratio = r["mean_ms"] / base[name]["mean_ms"]
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        if flag: slower.append(name)
+        print(f"  {name:<36} {base[name]['mean_ms']:>9.3f} -> {r['mean_ms']:>9.3f} ms  x{ratio:.2f} {flag}")
+    return slower
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="./bench.json", help="JSON results file")
+    ap.add_argument("--only", default="scanner,level1,backtest", help="Comma separated subset of scanner,level1,backtest")
+    ap.add_argument("--symbols", type=int, default=500, help="Synthetic symbols served by the klines stub")
+    ap.add_argument("--trades", default=os.path.join(ROOT, "trades.csv"), help="Trades csv driving the backtest fixtures")
+    ap.add_argument("--repeat", type=int, default=3, help="Full run_scan rounds to time")
+    ap.add_argument("--rounds", type=int, default=3, help="Passes over the items of every other benchmark (best pass is reported)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--baseline", default=None, help="Earlier --out JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown of mean latency vs --baseline")
+    args = ap.parse_args()
+    only = set(args.only.split(","))
+    args.end_ms = int(time.time() * 1000)
+
+    results = {"_fixtures": {"symbols": args.symbols, "seed": args.seed}}
+    stub = None
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        args.workdir = workdir
+        if only & {"scanner", "level1"}:
+            port_q = mp.Queue()
+            stub = mp.Process(target=serve_stub, args=(args.symbols, args.seed, args.end_ms, port_q), daemon=True)
+            stub.start()
+            url = f"http://127.0.0.1:{port_q.get(timeout=30)}"
+        try:
+            if "scanner" in only: bench_scanner(args, url, results)
+            if "level1" in only: bench_level1(args, url, results)
+            if "backtest" in only: bench_backtest(args, results)
+        finally:
+            if stub is not None: stub.terminate()
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": git_commit(),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "numpy": np.__version__, "pandas": pd.__version__, "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {args.out}")
+
+    if args.baseline:
+        slower = compare(results, args.baseline, args.tolerance)
+        if slower:
+            raise SystemExit(f"{len(slower)} benchmark(s) slower than baseline: {', '.join(slower)}")
+
+
+if __name__ == "__main__":
+    main()
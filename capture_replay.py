@@ -0,0 +1,107 @@
+# capture_replay.py
+# Deterministic offline re-run of recorded ScannerEngine rounds.
+#
+# Record while the service runs (every exchange GET and every scheduler tick go to one gzip JSONL log):
+#   MARKET_CAPTURE=captures/2025-12-18.jsonl.gz uvicorn app.main:app
+# Replay it here: each recorded tick calls run_scan(now=tick time) back to back, the HTTP layer
+# serves the recorded responses (no network, no weight limiter), so a day of rounds takes minutes.
+# The same capture can drive threshold tuning (--flash_threshold) and regression checks (--expect).
+#
+# Usage:
+#   python capture_replay.py --log captures/2025-12-18.jsonl.gz --out ./out_capture
+#   python capture_replay.py --log day.jsonl.gz --flash_threshold 0.025
+#   python capture_replay.py --log day.jsonl.gz --expect out_capture/hits.csv   # exit 1 on any difference
+
+import argparse, os, sys, json, time, tempfile
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "crypto_scanner_v2.2"))
+
+HIT_KEY = ["tick", "symbol", "rule"]
+
+
+def replay(args, workdir):
+    # MARKET_REPLAY must be set before app.capture is imported; the scanner's sqlite / journal paths
+    # are relative, so it runs inside a scratch dir, with Telegram off
+    os.environ.update(MARKET_REPLAY=os.path.abspath(args.log), TG_BOT_TOKEN="", STREAM_MODE="0",
+                      PROFILE_SLOW_ROUND_SECONDS="0", PREFILTER="1" if args.prefilter else "0")
+    os.chdir(workdir)
+    from app import capture as market
+    from app.batch import BatchParams
+    from app.database import create_db_and_tables
+    from app.scanner import scanner
+    create_db_and_tables()
+
+    if args.flash_threshold is not None:
+        scanner.flash_threshold = args.flash_threshold
+        scanner.rule_params = BatchParams(flash_threshold=args.flash_threshold)
+
+    hits = []
+    handle = scanner.handle_result
+
+    def collect(res):
+        hits.append({"tick": scanner.tick_time, "symbol": res.symbol, "rule": res.rule_name,
+                     "tags": res.tags, "score": res.score, "price": res.price})
+        handle(res)
+    scanner.handle_result = collect
+
+    ticks = market.capture.ticks()
+    if not ticks:
+        raise SystemExit(f"No scheduler ticks in {args.log} (was it recorded by ScannerEngine?)")
+    t0 = time.perf_counter()
+    for t in ticks:
+        scanner.run_scan(now=t)
+    wall = time.perf_counter() - t0
+    scanner.shutdown()
+
+    span = ticks[-1] - ticks[0]
+    summary = {
+        "log": args.log, "ticks": len(ticks), "rounds": scanner.scan_round, "hits": len(hits),
+        "recorded_span_s": round(span, 1), "replay_wall_s": round(wall, 2),
+        "speedup": round(span / wall, 1) if wall > 0 else None,
+        "flash_threshold": scanner.flash_threshold, "prefilter": args.prefilter,
+        "responses": market.capture.stats,
+    }
+    return pd.DataFrame(hits, columns=HIT_KEY + ["tags", "score", "price"]), summary
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", required=True, help="gzip JSONL written with MARKET_CAPTURE")
+    ap.add_argument("--out", default="./out_capture")
+    ap.add_argument("--flash_threshold", type=float, default=None, help="Override the 180s shock threshold")
+    ap.add_argument("--no_prefilter", dest="prefilter", action="store_false",
+                    help="Disable the 180s price prefilter (the capture must then contain every 1m fetch)")
+    ap.add_argument("--expect", default=None, help="hits.csv of an earlier replay; exit 1 if the hits differ")
+    args = ap.parse_args()
+    args.out = os.path.abspath(args.out)
+    if args.expect: args.expect = os.path.abspath(args.expect)
+    os.makedirs(args.out, exist_ok=True)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="capture_replay_") as workdir:
+        try:
+            hits, summary = replay(args, workdir)
+        finally:
+            os.chdir(cwd)
+
+    hits.to_csv(os.path.join(args.out, "hits.csv"), index=False, encoding="utf-8-sig")
+    with open(os.path.join(args.out, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.expect:
+        want = pd.read_csv(args.expect, encoding="utf-8-sig")
+        a = set(map(tuple, hits[HIT_KEY].astype(str).values))
+        b = set(map(tuple, want[HIT_KEY].astype(str).values))
+        if a != b:
+            for row in sorted(b - a)[:20]: print("missing:", row)
+            for row in sorted(a - b)[:20]: print("new:    ", row)
+            raise SystemExit(f"Hits differ from {args.expect}: {len(b - a)} missing, {len(a - b)} new")
+        print(f"Hits match {args.expect} ({len(a)})")
+
+
+if __name__ == "__main__":
+    main()
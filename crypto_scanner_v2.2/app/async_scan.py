@@ -0,0 +1,131 @@
+import asyncio
+import json
+import queue
+import threading
+from urllib.parse import urlparse
+
+import aiohttp
+
+from . import capture as market
+from .http_client import WEIGHT_HEADER, backoff, limiter_for, metrics
+
+
+class AsyncHttpClient:
+    """
+    V2.3 asyncio 版 HTTP 客户端: 与 HttpClient 共用同一套权重限速器、按 host 退避和计数器,
+    所以同步/异步两种请求混跑时也不会一起把权重打爆。
+    """
+    def __init__(self, concurrency=20, proxy=None, max_429_retries=3):
+        self.concurrency = concurrency
+        self.proxy = proxy or None
+        self.max_429_retries = max_429_retries
+        self.session = None
+
+    async def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": "Mozilla/5.0"})
+        return self.session
+
+    async def _sleep(self, seconds, reason):
+        if seconds <= 0: return
+        metrics.inc("waits")
+        metrics.inc("wait_seconds", seconds)
+        metrics.inc(f"waits_{reason}")
+        await asyncio.sleep(seconds)
+
+    async def get_json(self, url, params=None, weight=1, timeout=5):
+        """返回解析后的 JSON; 429 重试用完仍失败时抛异常"""
+        cap = market.capture
+        if cap.replaying:
+            return json.loads(cap.lookup(url, params)[1])
+        session = await self._get_session()
+        host = urlparse(url).netloc
+        limiter = limiter_for(host) if weight > 0 else None
+
+        for attempt in range(self.max_429_retries + 1):
+            await self._sleep(backoff.wait_time(host), "backoff")
+            if limiter: await self._sleep(limiter.reserve(weight), "weight")
+
+            metrics.inc("requests")
+            try:
+                async with session.get(url, params=params, proxy=self.proxy,
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                    used = resp.headers.get(WEIGHT_HEADER)
+                    if limiter and used: limiter.observe(int(used))
+                    if resp.status in (418, 429):
+                        metrics.inc(f"status_{resp.status}")
+                        backoff.hit(host, resp.headers.get("Retry-After"))
+                        if attempt < self.max_429_retries:
+                            metrics.inc("retries")
+                            continue
+                    resp.raise_for_status()
+                    backoff.ok(host)
+                    if cap.recording:
+                        body = await resp.text()
+                        cap.record(url, params, resp.status, body)
+                        return json.loads(body)
+                    return await resp.json(content_type=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                metrics.inc("errors")
+                raise
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+
+class AsyncScanEngine:
+    """
+    常驻事件循环 (后台线程) 跑每轮扫描: 信号量控制并发, 每个币种单独超时,
+    结果按完成顺序通过队列流回调用线程, 不用每轮创建/销毁线程池。
+    """
+    def __init__(self, concurrency=20, symbol_timeout=10, proxy=None):
+        self.concurrency = concurrency
+        self.symbol_timeout = symbol_timeout
+        self.client = AsyncHttpClient(concurrency=concurrency, proxy=proxy)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def scan(self, symbols, scan_symbol):
+        """
+        对每个币种调用协程 scan_symbol(client, symbol), 生成器按完成顺序产出
+        (symbol, result, error), 调用方边收边处理。
+        """
+        results = queue.Queue()
+
+        async def run_one(sem, symbol):
+            async with sem:
+                try:
+                    res = await asyncio.wait_for(scan_symbol(self.client, symbol), self.symbol_timeout)
+                    results.put((symbol, res, None))
+                except asyncio.TimeoutError as e:
+                    metrics.inc("symbol_timeouts")
+                    results.put((symbol, None, e))
+                except Exception as e:
+                    metrics.inc("symbol_errors")
+                    results.put((symbol, None, e))
+
+        async def run_round():
+            sem = asyncio.Semaphore(self.concurrency)
+            try:
+                await asyncio.gather(*(run_one(sem, s) for s in symbols))
+            finally:
+                results.put(None)
+
+        asyncio.run_coroutine_threadsafe(run_round(), self.loop)
+        while True:
+            item = results.get()
+            if item is None: break
+            yield item
+
+    def close(self):
+        fut = asyncio.run_coroutine_threadsafe(self.client.close(), self.loop)
+        try:
+            fut.result(timeout=5)
+        except Exception: pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
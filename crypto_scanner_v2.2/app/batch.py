@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# (symbols × bars × fields) 数组里的字段顺序
+O, H, L, C, V = range(5)
+
+
+@dataclass
+class BatchParams:
+    # V0.5 (scan.py) 阈值, 验证模式下由调用方覆盖
+    trend: float = 0.05
+    vol: float = 2.5
+    accel: float = 0.08
+    watch_move: float = 0.01
+
+    # V0.0 (scan.ini) A/B/C 规则, 对应 PRD 第五章
+    vol_factor: float = 2.5
+    trend_threshold: float = 0.05
+    accel_single: float = 0.08
+    accel_accum: float = 0.07
+    accel_each: float = 0.03
+    fail_shock: float = 0.06
+    fail_vol: float = 2.0
+    fail_wick: float = 0.02
+    lookback_4h: int = 16
+
+    # V2.x (scanner.py) 布林/RSI 做空 + 均线做多
+    short_rsi: float = 70
+    short_volatility: float = 0.05
+    long_volatility: float = 0.03
+    flash_threshold: float = 0.03  # 180s 异动
+
+    min_bars: int = 25
+
+
+def pack_klines(frames, bars=50, cols=('o', 'h', 'l', 'c', 'v')):
+    """
+    把 {symbol: DataFrame 或 (n × 5) 数组} 打包成 (symbols × bars × 5) 的 float 数组。
+    K线右对齐 (最后一根都在 [:, -1]), 不足 bars 根的左侧补 NaN。
+    返回 (symbols, arr, n_bars)。
+    """
+    symbols = [s for s, df in frames.items() if df is not None and len(df)]
+    arr = np.full((len(symbols), bars, 5), np.nan)
+    n_bars = np.zeros(len(symbols), dtype=np.int64)
+    for i, sym in enumerate(symbols):
+        df = frames[sym]
+        n = min(len(df), bars)
+        if isinstance(df, np.ndarray):
+            arr[i, bars - n:, :] = df[-n:, :5]
+        else:
+            # 按列取比 df[cols].to_numpy() 快几倍, 几百个币种时差别明显
+            for k, col in enumerate(cols):
+                arr[i, bars - n:, k] = df[col].to_numpy(dtype=float)[-n:]
+        n_bars[i] = n
+    return np.array(symbols, dtype=object), arr, n_bars
+
+
+def flash_move(open_3m_ago, close, threshold):
+    """
+    ScannerEngine.check_180s_shock 的判定部分: 标量和数组都能用 (回放时一次算所有币种/时刻)。
+    返回 (涨跌幅, 是否触发, 分数)。
+    """
+    pct = (close - open_3m_ago) / open_3m_ago
+    abs_change = np.abs(pct)
+    hit = abs_change >= threshold
+    score = np.minimum(100, 85 + np.trunc((abs_change - threshold) * 100 * 2))
+    return pct, hit, score
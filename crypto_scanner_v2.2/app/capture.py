@@ -0,0 +1,168 @@
+import atexit
+import bisect
+import gzip
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+
+class ReplayMiss(requests.ConnectionError):
+    """回放时请求了录制里没有的 key; 继承 ConnectionError, 调用方按网络失败处理"""
+
+
+def capture_key(url, params=None):
+    """端点路径 + 排序后的参数 (不含 host, 主备域名录到同一个 key)"""
+    parts = urlsplit(url)
+    items = parse_qsl(parts.query) + [(k, str(v)) for k, v in (params or {}).items()]
+    query = urlencode(sorted(items))
+    return f"{parts.path}?{query}" if query else parts.path
+
+
+class MarketCapture:
+    """
+    V2.3 行情录制 / 回放, 挂在 HttpClient / AsyncHttpClient 的 GET 请求上:
+      - record: 每个成功的响应追加一行 {"t": 时间, "k": key, "s": 状态码, "b": 原始响应体} 到 gzip JSONL,
+                ScannerEngine 每个 tick 另记一行 {"t": 时间, "m": "tick"}, 回放时按同样的时间点驱动
+      - replay: 不走网络也不扣权重。回放方每个 tick 调 mark("tick", t) 推进时钟, 每个 key 返回
+                这个 tick 里录到的那条响应; 这个 tick 没录到 (例如调低阈值后多拉了 K线) 时返回之前最近的一条。
+                没有 tick 标记时 (scan.py / 回测脚本) 同一个 key 按录制顺序依次返回, 用完后一直返回最后一条
+    文件只追加; 每 flush_seconds 秒做一次 gzip 同步刷新, 进程异常退出也只丢最后几秒。
+    """
+    def __init__(self, mode=None, path=None, flush_seconds=5.0):
+        self.mode = mode
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.file = None
+        self.last_flush = 0.0
+        self.entries = {}   # replay: key -> [(时间, 状态码, 响应体), ...]
+        self.times = {}     # replay: key -> [时间, ...] (二分用)
+        self.cursor = {}    # replay: key -> 下一条的下标 (无 tick 时)
+        self.marks = []     # replay: [(时间, 名字), ...]
+        self.tick_times = []
+        self.clock = None   # replay: 当前 tick 的 [开始, 下一个 tick)
+        self.stats = {"recorded": 0, "replayed": 0, "repeated": 0, "missed": 0}
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = gzip.open(path, "at", encoding="utf-8")
+            atexit.register(self.close)
+        elif mode == "replay":
+            self.load(path)
+
+    @classmethod
+    def from_env(cls):
+        """MARKET_REPLAY=文件 优先于 MARKET_CAPTURE=文件; 都没设时不做任何事"""
+        if os.getenv("MARKET_REPLAY"): return cls("replay", os.getenv("MARKET_REPLAY"))
+        if os.getenv("MARKET_CAPTURE"): return cls("record", os.getenv("MARKET_CAPTURE"))
+        return cls()
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    # --- record ---
+    def _write(self, row):
+        line = json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.file is None: return
+            self.file.write(line)
+            now = time.monotonic()
+            if now - self.last_flush >= self.flush_seconds:
+                self.file.flush()
+                self.last_flush = now
+
+    def record(self, url, params, status, body):
+        self._write({"t": round(time.time(), 3), "k": capture_key(url, params), "s": status, "b": body})
+        self.stats["recorded"] += 1
+
+    def mark(self, name, t=None):
+        t = time.time() if t is None else t
+        if self.replaying:
+            ticks = self.ticks()
+            i = bisect.bisect_right(ticks, t)
+            self.clock = (t, ticks[i] if i < len(ticks) else float("inf"))
+            return
+        self._write({"t": round(t, 3), "m": name})
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    # --- replay ---
+    def load(self, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    break  # 录制中途退出留下的半行
+                if "m" in row:
+                    self.marks.append((row["t"], row["m"]))
+                else:
+                    self.entries.setdefault(row["k"], []).append((row["t"], row["s"], row["b"]))
+        for key, seq in self.entries.items():
+            seq.sort(key=lambda e: e[0])
+            self.times[key] = [e[0] for e in seq]
+        self.tick_times = sorted(t for t, name in self.marks if name == "tick")
+
+    def ticks(self):
+        return self.tick_times
+
+    def lookup(self, url, params=None):
+        """返回录制的 (状态码, 响应体); 没录到这个 key 时抛 ReplayMiss"""
+        key = capture_key(url, params)
+        with self.lock:
+            seq = self.entries.get(key)
+            if not seq:
+                self.stats["missed"] += 1
+                raise ReplayMiss(f"not in capture: {key}")
+            if self.clock is not None:
+                start, end = self.clock
+                i = bisect.bisect_left(self.times[key], start)
+                if i < len(seq) and seq[i][0] < end:
+                    self.stats["replayed"] += 1
+                else:
+                    i = max(i - 1, 0)
+                    self.stats["repeated"] += 1
+            else:
+                i = self.cursor.get(key, 0)
+                if i < len(seq):
+                    self.cursor[key] = i + 1
+                    self.stats["replayed"] += 1
+                else:
+                    i = len(seq) - 1
+                    self.stats["repeated"] += 1
+            return seq[i][1:]
+
+    def response(self, url, params=None):
+        """lookup 的结果包装成 requests.Response, HttpClient 的调用方不用改"""
+        status, body = self.lookup(url, params)
+        resp = requests.Response()
+        resp.status_code = status
+        resp._content = body.encode("utf-8")
+        resp.encoding = "utf-8"
+        resp.url = url
+        resp.headers["Content-Type"] = "application/json"
+        return resp
+
+
+# 同一进程共用一份, 由环境变量决定模式 (见 .env 的 MARKET_CAPTURE / MARKET_REPLAY)
+capture = MarketCapture.from_env()
+
+
+def configure(mode, path):
+    """脚本里切换模式 (例如 --replay 参数); HttpClient / AsyncHttpClient 每次请求都读这里的 capture"""
+    global capture
+    capture.close()
+    capture = MarketCapture(mode, path)
+    return capture
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
 
 sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
@@ -6,9 +7,22 @@ sqlite_url = f"sqlite:///{sqlite_file_name}"
 # check_same_thread=False 允许 FastAPI 和 Scheduler 线程共用连接
 engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
 
+# V2.3 WAL 模式: 读 (FastAPI) 不阻塞写 (DbWriter), synchronous=NORMAL 下每个事务不再强制 fsync
+@event.listens_for(engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # create_all 不会给已存在的表补索引, 老库这里补上
+    for table in SQLModel.metadata.tables.values():
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import threading
+
+# 单个客户端最多积压这么多条未发送事件, 超过说明客户端太慢, 直接断开让它重连拿快照
+MAX_PENDING = 1000
+
+
+def sse_message(event, data):
+    """编码成一条 SSE 消息 (bytes)"""
+    return sse_raw(event, json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def sse_raw(event, body):
+    """已经序列化好的单行 JSON bytes 直接包成 SSE 消息"""
+    return b"event: " + event.encode() + b"\ndata: " + body + b"\n\n"
+
+
+class EventHub:
+    """
+    V2.3 仪表盘推送中心: 扫描线程 publish, 每个 SSE 连接一个 asyncio.Queue。
+    每条事件只序列化一次, 再把同一份 bytes 分发给所有连接,
+    所以观看的客户端越多, 服务端的额外开销也只是入队。
+    """
+    def __init__(self):
+        self.subscribers = {}  # queue -> loop
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """在 FastAPI 的事件循环里调用, 返回该连接的消息队列"""
+        q = asyncio.Queue(maxsize=MAX_PENDING)
+        with self.lock:
+            self.subscribers[q] = asyncio.get_running_loop()
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.pop(q, None)
+
+    @property
+    def count(self):
+        return len(self.subscribers)
+
+    def publish(self, event, data):
+        """任意线程可调用; 没有客户端在看时什么都不做"""
+        with self.lock:
+            targets = list(self.subscribers.items())
+        if not targets: return
+        msg = sse_message(event, data)
+        for q, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, q, msg)
+            except RuntimeError:
+                self.unsubscribe(q)  # 事件循环已关闭
+
+    def _put(self, q, msg):
+        try:
+            q.put_nowait(msg)
+        except asyncio.QueueFull:
+            self.unsubscribe(q)
+            while not q.empty(): q.get_nowait()
+            q.put_nowait(None)  # None = 断开
+
+
+hub = EventHub()
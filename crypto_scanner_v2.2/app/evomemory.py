@@ -0,0 +1,125 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+class EvoMemory:
+    """
+    V2.3 每个币种最近 size 次告警的环形缓冲 (分数 / 价格 / 时间), 全部币种共用三块二维数组:
+      - 一个币种占一行, 行满了覆盖最旧的那格, 内存 = 币种数 x size, 不随运行时长增长
+      - 每行维护分数累加和, last / mean / trend 都是 O(1)
+      - save() 把数组和关注列表写成一个 .npz (同目录唯一临时文件写完再替换), load() 启动时恢复
+    加了锁: 扫描线程记录 / 读取, UI 线程清空, 可以同时发生。
+    """
+    def __init__(self, size=32, capacity=256):
+        self.size = size
+        self.lock = threading.Lock()
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        self.index = {}                                   # symbol -> 行号
+        self.scores = np.zeros((capacity, self.size), dtype=np.float32)
+        self.prices = np.zeros((capacity, self.size), dtype=np.float64)
+        self.times = np.zeros((capacity, self.size), dtype=np.float64)
+        self.head = np.zeros(capacity, dtype=np.int32)    # 下一次写入的格子
+        self.count = np.zeros(capacity, dtype=np.int32)   # 已写入格数 (<= size)
+        self.total = np.zeros(capacity, dtype=np.float64) # 环里分数之和
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def _row(self, symbol):
+        row = self.index.get(symbol)
+        if row is not None: return row
+        row = len(self.index)
+        if row == len(self.head):
+            # 扩容翻倍, 摊还 O(1)
+            grow = lambda a: np.concatenate([a, np.zeros_like(a)])
+            self.scores, self.prices, self.times = grow(self.scores), grow(self.prices), grow(self.times)
+            self.head, self.count, self.total = grow(self.head), grow(self.count), grow(self.total)
+        self.index[symbol] = row
+        return row
+
+    def record(self, symbol, score, price, ts=None):
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            r = self._row(symbol)
+            h = self.head[r]
+            if self.count[r] == self.size:
+                self.total[r] -= self.scores[r, h]
+            else:
+                self.count[r] += 1
+            self.scores[r, h], self.prices[r, h], self.times[r, h] = score, price, ts
+            self.total[r] += score
+            self.head[r] = (h + 1) % self.size
+
+    def last(self, symbol):
+        """最近一次的分数, 没有记录时 None"""
+        r = self.index.get(symbol)
+        if r is None or not self.count[r]: return None
+        return float(self.scores[r, self.head[r] - 1])
+
+    def mean(self, symbol):
+        r = self.index.get(symbol)
+        if r is None or not self.count[r]: return None
+        return float(self.total[r] / self.count[r])
+
+    def trend(self, symbol):
+        """最近一次分数减去环内均值: > 0 越来越强, < 0 在走弱"""
+        r = self.index.get(symbol)
+        if r is None or not self.count[r]: return 0.0
+        return float(self.scores[r, self.head[r] - 1] - self.total[r] / self.count[r])
+
+    def history(self, symbol):
+        """按时间从旧到新返回 (scores, prices, times) 三个数组"""
+        with self.lock:
+            r = self.index.get(symbol)
+            if r is None: return np.empty(0), np.empty(0), np.empty(0)
+            n, h = self.count[r], self.head[r]
+            order = (np.arange(h - n, h)) % self.size
+            return self.scores[r, order].copy(), self.prices[r, order].copy(), self.times[r, order].copy()
+
+    def clear(self):
+        with self.lock:
+            self._reset(len(self.head))
+
+    def save(self, path, watchlist=()):
+        with self.lock:
+            n = len(self.index)
+            data = {
+                "size": np.int32(self.size),
+                "symbols": np.array(list(self.index), dtype=str),
+                "scores": self.scores[:n], "prices": self.prices[:n], "times": self.times[:n],
+                "head": self.head[:n], "count": self.count[:n], "total": self.total[:n],
+                "watchlist": np.array(sorted(watchlist), dtype=str),
+            }
+            # 扫描线程和 UI 线程都会保存: 写文件和替换都在锁内, 临时文件名各不相同
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                       dir=os.path.dirname(os.path.abspath(path)))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez_compressed(f, **data)
+                os.replace(tmp, path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+
+    def load(self, path):
+        """恢复快照, 返回其中的关注列表; 文件不存在或 size 不一致时返回 None, 保持空状态"""
+        if not os.path.exists(path): return None
+        with np.load(path) as z:
+            if int(z["size"]) != self.size: return None
+            symbols = [str(s) for s in z["symbols"]]
+            with self.lock:
+                self._reset(max(len(symbols) * 2, len(self.head)))
+                n = len(symbols)
+                self.index = {s: i for i, s in enumerate(symbols)}
+                self.scores[:n], self.prices[:n], self.times[:n] = z["scores"], z["prices"], z["times"]
+                self.head[:n], self.count[:n], self.total[:n] = z["head"], z["count"], z["total"]
+            return set(str(s) for s in z["watchlist"])
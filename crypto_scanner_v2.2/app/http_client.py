@@ -0,0 +1,189 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import capture as market
+
+# Binance 合约 REST 每分钟权重上限 (IP 维度), 留 20% 余量给其他进程/手工请求
+BINANCE_WEIGHT_PER_MIN = 2400
+WEIGHT_SAFETY = 0.8
+WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+
+
+def kline_weight(limit):
+    """/fapi/v1/klines 的权重随 limit 变化"""
+    if limit < 100: return 1
+    if limit < 500: return 2
+    if limit <= 1000: return 5
+    return 10
+
+
+class WeightLimiter:
+    """
+    令牌桶: 容量 = 每分钟权重预算, 匀速回填。
+    每次请求先扣权重, 不够就等; 响应头里交易所报告的已用权重会把桶校准到真实值,
+    这样多个进程共用同一个 IP 时也能在 429 之前自己慢下来。
+    """
+    def __init__(self, limit_per_min=BINANCE_WEIGHT_PER_MIN, safety=WEIGHT_SAFETY):
+        self.capacity = limit_per_min * safety
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def reserve(self, weight):
+        """扣除 weight, 返回需要等待的秒数 (调用方自己 sleep, 同步/异步都能用)"""
+        if weight <= 0: return 0.0
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= weight
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def observe(self, used_weight):
+        """用服务端报告的本分钟已用权重校准桶"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - used_weight)
+
+
+class HostBackoff:
+    """按 host 记录 429/418 之后的冷却截止时间, 同 host 的所有请求一起等"""
+    def __init__(self):
+        self.until = {}
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def wait_time(self, host):
+        with self.lock:
+            return max(0.0, self.until.get(host, 0) - time.monotonic())
+
+    def hit(self, host, retry_after=None):
+        with self.lock:
+            n = self.failures.get(host, 0) + 1
+            self.failures[host] = n
+            delay = float(retry_after) if retry_after else min(60.0, 2 ** n)
+            self.until[host] = max(self.until.get(host, 0), time.monotonic() + delay)
+            return delay
+
+    def ok(self, host):
+        with self.lock:
+            self.failures.pop(host, None)
+
+
+class Metrics:
+    """简单线程安全计数器: requests / retries / waits / wait_seconds / status_429 / errors"""
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+# 同一进程里所有 client 共用限速器/退避状态/计数器 (限额是按 IP 算的)
+_limiters = {}
+_limiters_lock = threading.Lock()
+backoff = HostBackoff()
+metrics = Metrics()
+
+
+def limiter_for(host):
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = WeightLimiter()
+        return _limiters[host]
+
+
+class HttpClient:
+    """
+    V2.3 共用 HTTP 客户端: keep-alive 连接池 + GET 5xx 自动重试 + 权重限速 + 429 按 host 退避。
+    scanner.py / scan.py / scan.ini / strict_backtest_price_volume.py 都通过它访问交易所。
+    weight 传 0 表示不计入 Binance 权重 (Telegram、alternative.me 等)。
+    POST 不自动重试 (5xx / 断连时服务端可能已经处理过, 重发会重复下单/重复推送), 由调用方自己决定。
+    GET 请求接入行情录制/回放 (capture.py): 回放模式直接返回录下的响应, 不走网络也不扣权重。
+    host_backoff=False 时不进共用的 HostBackoff: 429 原样返回, 等多久由调用方按响应决定 (notifier.py)。
+    """
+    def __init__(self, pool_size=10, proxies=None, verify=True, retries=3, backoff_factor=0.5,
+                 max_429_retries=3, host_backoff=True):
+        self.proxies = proxies
+        self.verify = verify
+        self.max_429_retries = max_429_retries
+        self.host_backoff = host_backoff
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+            # 429/418 不交给 urllib3 单连接重试, 由下面按 host 统一退避
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": "Mozilla/5.0"})
+
+    def _sleep(self, seconds, reason):
+        if seconds <= 0: return
+        metrics.inc("waits")
+        metrics.inc("wait_seconds", seconds)
+        metrics.inc(f"waits_{reason}")
+        time.sleep(seconds)
+
+    def request(self, method, url, weight=1, **kwargs):
+        cap = market.capture
+        if cap.replaying and method == "GET":
+            return cap.response(url, kwargs.get("params"))
+        host = urlparse(url).netloc
+        kwargs.setdefault("proxies", self.proxies)
+        kwargs.setdefault("verify", self.verify)
+        limiter = limiter_for(host) if weight > 0 else None
+
+        for attempt in range(self.max_429_retries + 1):
+            if self.host_backoff: self._sleep(backoff.wait_time(host), "backoff")
+            if limiter: self._sleep(limiter.reserve(weight), "weight")
+
+            metrics.inc("requests")
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except Exception:
+                metrics.inc("errors")
+                raise
+            history = getattr(getattr(resp.raw, "retries", None), "history", None)
+            if history: metrics.inc("retries", len(history))
+
+            used = resp.headers.get(WEIGHT_HEADER)
+            if limiter and used:
+                limiter.observe(int(used))
+
+            if resp.status_code in (418, 429):
+                metrics.inc(f"status_{resp.status_code}")
+                if self.host_backoff: backoff.hit(host, resp.headers.get("Retry-After"))
+                if attempt < self.max_429_retries:
+                    metrics.inc("retries")
+                    continue
+                return resp
+            if self.host_backoff: backoff.ok(host)
+            if cap.recording and method == "GET" and resp.ok:
+                cap.record(url, kwargs.get("params"), resp.status_code, resp.text)
+            return resp
+
+    def get(self, url, params=None, weight=1, **kwargs):
+        return self.request("GET", url, weight=weight, params=params, **kwargs)
+
+    def post(self, url, weight=0, **kwargs):
+        return self.request("POST", url, weight=weight, **kwargs)
@@ -0,0 +1,188 @@
+import math
+from collections import deque
+
+# 每累计这么多次增量更新, 从窗口原始数据重算一次, 防止浮点误差长期漂移
+RESYNC_EVERY = 1000
+
+
+class RollingWindow:
+    """
+    定长滑动窗口的均值/标准差 (Welford 算法)。
+    push 追加新值 (窗口满时挤掉最旧的), replace_last 修正最新值, 都是 O(1)。
+    """
+    def __init__(self, n):
+        self.n = n
+        self.buf = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nonzero = 0
+        self.updates = 0
+
+    def __len__(self):
+        return len(self.buf)
+
+    @property
+    def full(self):
+        return len(self.buf) >= self.n
+
+    def push(self, x):
+        if len(self.buf) < self.n:
+            self.buf.append(x)
+            d = x - self.mean
+            self.mean += d / len(self.buf)
+            self.m2 += d * (x - self.mean)
+        else:
+            old = self.buf.popleft()
+            self.buf.append(x)
+            self._replace(old, x)
+            self.nonzero -= int(old != 0)
+        self.nonzero += int(x != 0)
+        self._tick()
+
+    def replace_last(self, x):
+        old = self.buf[-1]
+        self.buf[-1] = x
+        self._replace(old, x)
+        self.nonzero += int(x != 0) - int(old != 0)
+        self._tick()
+
+    def _replace(self, old, new):
+        old_mean = self.mean
+        self.mean += (new - old) / len(self.buf)
+        self.m2 += (new - old) * (new - self.mean + old - old_mean)
+
+    def _tick(self):
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            k = len(self.buf)
+            self.mean = sum(self.buf) / k
+            self.m2 = sum((v - self.mean) ** 2 for v in self.buf)
+
+    def value(self):
+        """窗口均值, 全零窗口精确返回 0 (RSI 判断用)"""
+        if not self.full: return math.nan
+        return self.mean if self.nonzero else 0.0
+
+    def std(self):
+        """样本标准差 (ddof=1), 与 pandas rolling().std() 一致"""
+        if not self.full or self.n < 2: return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+
+
+class RollingExtreme:
+    """
+    最近 n 根 K线的最高/最低值: 已收盘部分用单调队列, 实时 K线单独保存。
+    实时 K线反复修正时不需要动队列, 取值 O(1)。
+    """
+    def __init__(self, n, is_max=True):
+        self.n = n
+        self.is_max = is_max
+        self.closed = deque()  # (idx, value), 单调
+        self.idx = -1
+        self.live = None
+
+    def _better(self, a, b):
+        return a >= b if self.is_max else a <= b
+
+    def push(self, x):
+        if self.live is not None:
+            while self.closed and self._better(self.live, self.closed[-1][1]):
+                self.closed.pop()
+            self.closed.append((self.idx, self.live))
+        self.idx += 1
+        self.live = x
+        while self.closed and self.closed[0][0] <= self.idx - self.n:
+            self.closed.popleft()
+
+    def replace_last(self, x):
+        self.live = x
+
+    def value(self):
+        if self.live is None: return math.nan
+        if not self.closed: return self.live
+        best = self.closed[0][1]
+        return self.live if self._better(self.live, best) else best
+
+
+class IndicatorState:
+    """
+    V2.3 单币种 15m 增量指标: SMA20/STD20(布林带), RSI14, MA7, MA25, 最近 maxlen 根高低点。
+    新 K线 push, 实时 K线修正 revise, 结果与 analyze_single 原先的 pandas 计算一致。
+    RSI 沿用原来的 14 周期简单均值 (rolling mean), 不是 Wilder 平滑, 保证数值不变。
+    """
+    def __init__(self, maxlen=50):
+        self.maxlen = maxlen
+        self.sma20 = RollingWindow(20)
+        self.ma7 = RollingWindow(7)
+        self.ma25 = RollingWindow(25)
+        self.gain = RollingWindow(14)
+        self.loss = RollingWindow(14)
+        self.high = RollingExtreme(maxlen, is_max=True)
+        self.low = RollingExtreme(maxlen, is_max=False)
+        self.last_t = None
+        self.close = None
+        self.prev_close = None
+        self.count = 0
+
+    @classmethod
+    def from_df(cls, df, maxlen=50):
+        st = cls(maxlen)
+        for t, h, l, c in zip(df['op_t'], df['h'], df['l'], df['c']):
+            st.update(int(t), h, l, c)
+        return st
+
+    def update(self, open_time, high, low, close):
+        """按开盘时间自动判断是新 K线还是修正当前 K线; 旧数据忽略"""
+        if self.last_t is not None and open_time < self.last_t: return
+        high, low, close = float(high), float(low), float(close)
+        if open_time == self.last_t: self.revise(high, low, close)
+        else: self.push(open_time, high, low, close)
+
+    def push(self, open_time, high, low, close):
+        self.prev_close = self.close
+        self.last_t = open_time
+        self.close = close
+        self.count += 1
+        for w in (self.sma20, self.ma7, self.ma25): w.push(close)
+        g, l = self._gain_loss()
+        self.gain.push(g)
+        self.loss.push(l)
+        self.high.push(high)
+        self.low.push(low)
+
+    def revise(self, high, low, close):
+        self.close = close
+        for w in (self.sma20, self.ma7, self.ma25): w.replace_last(close)
+        g, l = self._gain_loss()
+        self.gain.replace_last(g)
+        self.loss.replace_last(l)
+        self.high.replace_last(high)
+        self.low.replace_last(low)
+
+    def _gain_loss(self):
+        # 第一根没有 diff, pandas 的 where 会把 NaN 填成 0, 这里保持一致
+        if self.prev_close is None: return 0.0, 0.0
+        d = self.close - self.prev_close
+        return max(d, 0.0), max(-d, 0.0)
+
+    def rsi(self):
+        gain, loss = self.gain.value(), self.loss.value()
+        if math.isnan(gain) or math.isnan(loss): return math.nan
+        if loss == 0: return 100.0 if gain > 0 else math.nan
+        return 100 - (100 / (1 + gain / loss))
+
+    def values(self):
+        sma, std = self.sma20.value(), self.sma20.std()
+        high, low = self.high.value(), self.low.value()
+        return {
+            "close": self.close,
+            "sma": sma,
+            "std": std,
+            "upper_band": sma + std * 2,
+            "rsi": self.rsi(),
+            "ma7": self.ma7.value(),
+            "ma25": self.ma25.value(),
+            "high": high,
+            "low": low,
+            "volatility": (high - low) / low if low else math.nan,
+        }
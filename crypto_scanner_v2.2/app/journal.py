@@ -0,0 +1,193 @@
+import csv
+import glob
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from .telemetry import telemetry
+
+COLUMNS = [
+    "Time", "Symbol", "Price", "Rule", "Score", "Strategy_Type",
+    "Change_180s", "RSI_15m", "Volatility_24h", "Bollinger_Pos", "Raw_Msg",
+]
+
+
+class SignalJournal:
+    """
+    V2.3 信号日志单写线程: 扫描线程只把行放进队列, 写线程持有打开的 CSV 文件,
+    每 flush_ms 毫秒 (或攒够 max_batch 行, 或调用 flush) 批量写入一次。
+    文件按天切分, 单个文件超过 max_bytes 也会切分: <prefix>-YYYYMMDD.csv, <prefix>-YYYYMMDD.1.csv ...
+    写完的分段按 compress 归档:
+      - "none"   : 保持 CSV
+      - "gzip"   : 压缩成 .csv.gz
+      - "parquet": 转成列式 .parquet (需要 pyarrow, 没装时退回 gzip)
+    当前正在写的分段始终是纯 CSV, 进程异常退出也只丢最后一批。
+    """
+    def __init__(self, directory="signals", prefix="scan_signals", compress="none",
+                 max_bytes=64 * 1024 * 1024, flush_ms=1000, max_batch=500):
+        self.directory = directory
+        self.prefix = prefix
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.file = None
+        self.csv = None
+        self.day = None
+        self.path = None
+        self.rows = 0
+        self.writes = 0
+        self.running = True
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, row):
+        """row 为 COLUMNS 顺序的一行; 不阻塞"""
+        self.queue.put(row)
+
+    def flush(self, timeout=5):
+        """阻塞到目前为止入队的行全部写入文件"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=10):
+        """关闭时调用: 写完剩下的行, 关闭当前分段 (当前分段不归档, 下次启动接着写)"""
+        if not self.running: return
+        self.flush(timeout)
+        self.running = False
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        while self.running or not self.queue.empty():
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                try:
+                    with telemetry.timer("journal_write"):
+                        self._write(batch)
+                except Exception as e:
+                    telemetry.inc("errors", where="journal_write")
+                    print(f"[ERROR] SignalJournal write failed ({len(batch)} rows): {e}")
+                    self._close()
+            for w in waiters: w.set()
+        self._close()
+
+    def _write(self, rows):
+        day = datetime.now().strftime("%Y%m%d")
+        if self.file is None or day != self.day or self.file.tell() >= self.max_bytes:
+            self._rotate(day)
+        self.csv.writerows(rows)
+        self.file.flush()
+        self.rows += len(rows)
+        self.writes += 1
+        telemetry.inc("journal_rows", len(rows))
+
+    def _rotate(self, day):
+        """关闭并归档当前分段, 打开 day 的下一个分段"""
+        if self.file is not None:
+            self._close()
+            self._archive(self.path)
+        elif self.day is None:
+            # 启动时: 上次运行留下的往日分段还没归档
+            yesterday = (datetime.strptime(day, "%Y%m%d") - timedelta(days=1)).strftime("%Y%m%d")
+            for path in journal_files(self.directory, self.prefix, end=yesterday):
+                if path.endswith(".csv"): self._archive(path)
+        self.day = day
+        self.path = self._segment_path(day)
+        new = not os.path.exists(self.path)
+        self.file = open(self.path, "a", newline="", encoding="utf-8")
+        self.csv = csv.writer(self.file)
+        if new: self.csv.writerow(COLUMNS)
+
+    def _segment_path(self, day):
+        # 续写当天最后一个未归档且未写满的分段, 否则开一个新编号
+        n = 0
+        while True:
+            stem = os.path.join(self.directory, f"{self.prefix}-{day}" + (f".{n}" if n else ""))
+            if os.path.exists(stem + ".csv") and os.path.getsize(stem + ".csv") < self.max_bytes:
+                return stem + ".csv"
+            if not any(os.path.exists(stem + ext) for ext in (".csv", ".csv.gz", ".parquet")):
+                return stem + ".csv"
+            n += 1
+
+    def _close(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except Exception:
+                pass
+        self.file = self.csv = None
+
+    def _archive(self, path):
+        if self.compress == "parquet":
+            try:
+                # 所有列按字符串读: 和 CSV 分段混读时类型一致, 由 read_journal 统一转换
+                pd.read_csv(path, dtype=str).to_parquet(path[:-4] + ".parquet", index=False)
+                os.remove(path)
+                return
+            except ImportError:
+                print("[WARN] SignalJournal: 未安装 pyarrow, 分段改用 gzip 归档")
+                self.compress = "gzip"
+            except Exception as e:
+                print(f"[ERROR] SignalJournal parquet 归档失败 {path}: {e}")
+                return
+        if self.compress == "gzip":
+            try:
+                with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(path)
+            except Exception as e:
+                print(f"[ERROR] SignalJournal gzip 归档失败 {path}: {e}")
+
+
+def journal_files(directory="signals", prefix="scan_signals", start=None, end=None):
+    """按日期 (YYYYMMDD, 含首尾) 挑出分段文件, 按时间顺序返回"""
+    out = []
+    for path in glob.glob(os.path.join(directory, f"{prefix}-*")):
+        name = os.path.basename(path)[len(prefix) + 1:]
+        day, _, rest = name.partition(".")
+        if not day.isdigit() or not rest.split(".")[-1] in ("csv", "gz", "parquet"): continue
+        if (start and day < start) or (end and day > end): continue
+        seq = int(rest.split(".")[0]) if rest.split(".")[0].isdigit() else 0
+        out.append((day, seq, path))
+    return [p for _, _, p in sorted(out)]
+
+
+def read_journal(directory="signals", prefix="scan_signals", start=None, end=None, columns=None):
+    """
+    把 start~end (YYYYMMDD 字符串, 可省略) 的信号分段读成一个 DataFrame。
+    CSV / .csv.gz / .parquet 分段可以混在一起; parquet 分段只读需要的 columns。
+    """
+    frames = []
+    for path in journal_files(directory, prefix, start, end):
+        if path.endswith(".parquet"):
+            frames.append(pd.read_parquet(path, columns=columns))
+        else:
+            frames.append(pd.read_csv(path, usecols=columns, dtype=str))
+    if not frames:
+        return pd.DataFrame(columns=columns or COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    if "Time" in df: df["Time"] = pd.to_datetime(df["Time"])
+    for col in ("Price", "Score", "Change_180s", "RSI_15m", "Volatility_24h"):
+        if col in df: df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
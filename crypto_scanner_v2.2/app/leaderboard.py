@@ -0,0 +1,157 @@
+import bisect
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class WindowCounter:
+    """
+    固定大小的分桶计数器: 60 个 1 分钟桶 (5m / 1h 窗口) + 24 个 1 小时桶 (24h 窗口)。
+    每个桶记着自己属于哪一分钟/小时, 过期的桶在写入时直接覆盖, 内存不随命中次数增长。
+    24h 窗口按整小时计, 最多多算当前小时之前 1 小时内的命中。
+    """
+    __slots__ = ("m_stamp", "m_count", "h_stamp", "h_count")
+
+    def __init__(self):
+        self.m_stamp = [-1] * 60
+        self.m_count = [0] * 60
+        self.h_stamp = [-1] * 24
+        self.h_count = [0] * 24
+
+    def add(self, ts):
+        m = int(ts // 60)
+        i = m % 60
+        if self.m_stamp[i] != m:
+            self.m_stamp[i], self.m_count[i] = m, 0
+        self.m_count[i] += 1
+
+        h = int(ts // 3600)
+        j = h % 24
+        if self.h_stamp[j] != h:
+            self.h_stamp[j], self.h_count[j] = h, 0
+        self.h_count[j] += 1
+
+    def count(self, seconds, now):
+        """最近 seconds 秒内的命中数 (<=3600 用分钟桶, 否则用小时桶)"""
+        if seconds <= 3600:
+            cur, n = int(now // 60), max(1, int(seconds // 60))
+            return sum(c for s, c in zip(self.m_stamp, self.m_count) if 0 <= cur - s < n)
+        cur, n = int(now // 3600), min(24, max(1, int(seconds // 3600)))
+        return sum(c for s, c in zip(self.h_stamp, self.h_count) if 0 <= cur - s < n)
+
+
+class Entry:
+    __slots__ = ("symbol", "counter", "key", "last_ts", "last_score", "max_move", "reasons")
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.counter = WindowCounter()
+        self.key = -math.inf
+        self.last_ts = 0.0
+        self.last_score = 0
+        self.max_move = 0.0
+        self.reasons = OrderedDict()
+
+
+class Leaderboard:
+    """
+    V2.3 有界排行榜。
+    热度 = 每次命中的分数按半衰期指数衰减后求和; 内部存 ln(热度) + t/tau 作为排序键,
+    这个键不随时间变化, 所以有序索引只需要在命中时更新一个位置, 读取 top-K 不用重新排序。
+    超过 ttl 没有命中的币种会被删除, 币种数超过 max_symbols 时先删最久没命中的。
+    热度本身没有上限 (排序用 heat); 展示用的 heat_score = 100 * (1 - e^(-heat / heat_scale)), 落在 0~100,
+    一次 90 分的命中约 59, 短时间内连续命中才接近 100。
+    本身不加锁, 由调用方 (ScannerEngine.board_lock) 保证串行访问。
+    """
+    def __init__(self, ttl=86400, max_symbols=500, half_life=1800, stale=3600, max_reasons=5, heat_scale=100.0):
+        self.ttl = ttl
+        self.max_symbols = max_symbols
+        self.tau = half_life / math.log(2)
+        self.stale = stale
+        self.max_reasons = max_reasons
+        self.heat_scale = heat_scale
+        self.entries = OrderedDict()  # 按最近命中时间排序, 队头最旧
+        self.index = []  # 按热度从高到低: (-key, symbol)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, symbol):
+        return symbol in self.entries
+
+    def update(self, symbol, score, rule_name, change_percent, ts=None):
+        ts = time.time() if ts is None else ts
+        e = self.entries.get(symbol)
+        if e is None:
+            e = self.entries[symbol] = Entry(symbol)
+        else:
+            self._unindex(e)
+            self.entries.move_to_end(symbol)
+
+        e.counter.add(ts)
+        e.last_ts = ts
+        e.last_score = score
+        if abs(change_percent) > abs(e.max_move): e.max_move = change_percent
+        e.reasons.pop(rule_name, None)
+        e.reasons[rule_name] = True
+        while len(e.reasons) > self.max_reasons: e.reasons.popitem(last=False)
+
+        # ln(h_old * exp(-dt/tau) + score) 在排序键空间里就是 logaddexp
+        if score > 0:
+            k = math.log(score) + ts / self.tau
+            hi, lo = max(e.key, k), min(e.key, k)
+            e.key = hi + math.log1p(math.exp(lo - hi))
+        bisect.insort(self.index, (-e.key, symbol))
+
+        self.evict(ts)
+        return e
+
+    def _unindex(self, e):
+        i = bisect.bisect_left(self.index, (-e.key, e.symbol))
+        if i < len(self.index) and self.index[i][1] == e.symbol:
+            del self.index[i]
+
+    def evict(self, now=None):
+        now = time.time() if now is None else now
+        while self.entries:
+            symbol, e = next(iter(self.entries.items()))
+            if now - e.last_ts <= self.ttl and len(self.entries) <= self.max_symbols: break
+            self._unindex(e)
+            del self.entries[symbol]
+
+    def heat(self, e, now):
+        return math.exp(e.key - now / self.tau) if e.key > -math.inf else 0.0
+
+    def item(self, symbol, now=None):
+        """排行榜条目 -> 前端展示用的 dict (接口和推送共用)"""
+        now = time.time() if now is None else now
+        e = self.entries[symbol]
+        hits_24h = e.counter.count(86400, now)
+        heat = self.heat(e, now)
+        return {
+            "symbol": symbol,
+            "hits_today": hits_24h,
+            "hits_5m": e.counter.count(300, now),
+            "hits_1h": e.counter.count(3600, now),
+            "hits_24h": hits_24h,
+            "last_trigger_time": datetime.fromtimestamp(e.last_ts).strftime("%H:%M:%S"),
+            "last_trigger_ts": e.last_ts,
+            "reasons": list(reversed(e.reasons))[:2],
+            "max_vol_ratio": 0.0,
+            "max_move": e.max_move,
+            "last_score": e.last_score,
+            "heat": round(heat, 2),
+            "heat_score": round(100 * (1 - math.exp(-heat / self.heat_scale)), 1),
+        }
+
+    def top(self, k=20, now=None):
+        """热度最高的 k 个 (超过 stale 秒没命中的不展示)"""
+        now = time.time() if now is None else now
+        self.evict(now)
+        out = []
+        for _, symbol in self.index:
+            if now - self.entries[symbol].last_ts > self.stale: continue
+            out.append(self.item(symbol, now))
+            if len(out) >= k: break
+        return out
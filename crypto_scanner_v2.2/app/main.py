@@ -1,13 +1,16 @@
 from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from apscheduler.schedulers.background import BackgroundScheduler
 from contextlib import asynccontextmanager
+import asyncio
+from datetime import datetime
 import os
-from sqlmodel import Session, select, desc
-from .database import create_db_and_tables, engine
-from .models import SystemLog, SystemStatus
+from .database import create_db_and_tables
 from .scanner import scanner
+from .telemetry import telemetry
+from .events import hub, sse_raw
 
 templates = Jinja2Templates(directory="app/templates")
 scheduler = BackgroundScheduler()
@@ -16,20 +19,38 @@ scheduler = BackgroundScheduler()
 async def lifespan(app: FastAPI):
     try:
         create_db_and_tables()
+        scanner.restore_state()
     except Exception as e:
         print(f"DB Init Failed: {e}")
 
     try:
-        interval = int(os.getenv("SCAN_INTERVAL_SECONDS", 60))
+        # V2.3 分层调度: 按 hot 层的间隔 tick, 每次只扫到期的币种
+        interval = scanner.tiers.intervals["hot"]
         scheduler.add_job(scanner.run_scan, 'interval', seconds=interval)
+        # V2.3 定时推送整张排行榜, 纠正客户端只靠增量更新时热度 / 1h 命中数 / 过期行的漂移
+        scheduler.add_job(scanner.publish_board, 'interval', seconds=int(os.getenv("BOARD_PUSH_SECONDS", 30)))
+        # V2.3 恐慌贪婪指数后台刷新, 启动时立即拉一次
+        scheduler.add_job(scanner.refresh_sentiment, 'interval', seconds=300, next_run_time=datetime.now())
         scheduler.start()
     except Exception as e:
         print(f"Scheduler Failed: {e}")
 
+    # V2.3 流模式: STREAM_MODE=1 时用 WebSocket K线推送驱动检测
+    if os.getenv("STREAM_MODE", "0") == "1":
+        try:
+            scanner.start_stream()
+        except Exception as e:
+            print(f"Stream Failed: {e}")
+
     yield
     try:
         scheduler.shutdown()
     except: pass
+    # 停止推送/异步扫描, 并把 DbWriter 队列里剩下的命中和日志刷盘
+    try:
+        scanner.shutdown()
+    except Exception as e:
+        print(f"Shutdown Failed: {e}")
 
 app = FastAPI(lifespan=lifespan)
 
@@ -38,31 +59,45 @@ async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/api/data")
-def get_data():
-    """V1.1 API: 返回聚合后的仪表盘数据"""
+def get_data(request: Request):
+    """V2.3 API: 返回缓存好的仪表盘快照; 客户端带着同一版本的 ETag 来就回 304"""
     try:
-        # 1. 获取 scanner 内存里的聚合数据 (排行榜 + 热度)
-        dashboard_data = scanner.get_dashboard_data()
-        
-        # 2. 补充运行状态 (Heartbeat)
-        is_running = False
-        with Session(engine) as session:
-            status = session.get(SystemStatus, 1)
-            if status:
-                dashboard_data["round"] = status.scan_round
-                is_running = True
-            
-            # 3. 获取日志 (只取最近 50 条)
-            logs = session.exec(select(SystemLog).order_by(desc(SystemLog.created_at)).limit(50)).all()
-            dashboard_data["logs"] = logs
-            dashboard_data["is_running"] = is_running
-            
-        return dashboard_data
-        
+        etag, body = scanner.get_dashboard_snapshot()
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json",
+                        headers={"ETag": etag, "Cache-Control": "no-cache"})
     except Exception as e:
         return {
             "market_heat": {"score": 0, "level": "Error", "icon": "❌", "color_class": "text-gray-500", "delta": 0},
             "hot_list": [],
             "logs": [{"level": "ERROR", "message": str(e), "created_at": "now"}],
             "is_running": False
-        }
\ No newline at end of file
+        }
+
+@app.get("/metrics")
+def get_metrics():
+    """V2.3 Prometheus 抓取接口: 热路径耗时直方图 / 错误、429、扫描币种数等计数器"""
+    return Response(content=telemetry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/stream")
+async def stream(request: Request):
+    """V2.3 SSE 推送: 连接时先发一次完整快照, 之后推增量 (leaderboard / log / heartbeat) 和定时的整表 (board)"""
+    async def events():
+        queue = hub.subscribe()
+        try:
+            _, body = await run_in_threadpool(scanner.get_dashboard_snapshot)
+            yield sse_raw("snapshot", body)
+            while not await request.is_disconnected():
+                try:
+                    msg = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"  # 保活, 防止代理断开空闲连接
+                    continue
+                if msg is None: break  # 客户端积压太多被踢, 浏览器会自动重连拿新快照
+                yield msg
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
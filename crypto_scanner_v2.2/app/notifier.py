@@ -0,0 +1,136 @@
+import queue
+import threading
+import time
+
+from .http_client import HttpClient
+from .telemetry import telemetry
+
+# Telegram 单条消息上限 4096 字符, 留一点余量
+MAX_MESSAGE_CHARS = 4000
+
+
+class TelegramNotifier:
+    """
+    V2.3 后台 Telegram 通知: 扫描线程只入队, 单独的发送线程负责网络 I/O。
+      - 同一币种同一规则在 cooldown 秒内只通知一次
+      - 同一轮的命中合并成一条摘要 (调用 flush, 或攒够 max_batch 条, 或等满 flush_seconds)
+      - 429 按 Telegram 返回的 retry_after 等待后重试, 其他失败重试 max_attempts 次后丢弃并计数
+    api_url 可以指向本地 stub (TG_API_URL), 测试时不用真的发消息。
+    """
+    def __init__(self, token, chat_id, api_url="https://api.telegram.org", cooldown=600,
+                 max_batch=20, flush_seconds=5, max_attempts=5, proxies=None):
+        self.url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.cooldown = cooldown
+        self.max_batch = max_batch
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        # 429 由这里按 retry_after 处理: 不走 HttpClient 的自动重试, 也不进共用的 host 退避,
+        # 否则下一次发送前还会再按 2**n 等一遍
+        self.http = HttpClient(pool_size=1, proxies=proxies, max_429_retries=0, host_backoff=False)
+        self.queue = queue.Queue()
+        self.last_sent = {}
+        self.lock = threading.Lock()
+        self.stats = {"queued": 0, "suppressed": 0, "messages": 0, "dropped": 0, "retries": 0}
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def notify(self, res):
+        """入队一条命中; 冷却期内的重复直接丢掉。不会阻塞"""
+        key = (res.symbol, res.tags)  # 与 ScannerEngine.cooled_down 相同的规则粒度
+        now = time.time()
+        with self.lock:
+            if now - self.last_sent.get(key, 0) < self.cooldown:
+                self.stats["suppressed"] += 1
+                return False
+            self.last_sent[key] = now
+            self.stats["queued"] += 1
+            if len(self.last_sent) > 5000:  # 只保留冷却期内的记录
+                self.last_sent = {k: t for k, t in self.last_sent.items() if now - t < self.cooldown}
+        self.queue.put(res)
+        return True
+
+    def flush(self):
+        """一轮结束时调用: 把攒着的命中立即合并发出 (不等待发送完成)"""
+        self.queue.put(None)
+
+    def stop(self, timeout=10):
+        if not self.running: return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+        self.running = False
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    @staticmethod
+    def format_line(res):
+        return f"{res.evo_state} <b>{res.symbol}</b> {res.rule_name} | {res.score} | {res.tags}"
+
+    def digest(self, items):
+        """多条命中 -> 若干条消息 (按分数排序, 每条不超过 Telegram 长度上限)"""
+        items = sorted(items, key=lambda r: r.score, reverse=True)
+        if len(items) == 1:
+            r = items[0]
+            return [f"🚨 <b>{r.symbol}</b>\nScore: {r.score}\nType: {r.evo_state} {r.tags}\nMsg: {r.rule_name}"]
+        header = f"🚨 本轮 {len(items)} 个信号"
+        messages, lines, size = [], [header], len(header)
+        for r in items:
+            line = self.format_line(r)
+            # size = 当前消息拼好后的长度 (第一条消息的表头也算在内)
+            if size + 1 + len(line) > MAX_MESSAGE_CHARS:
+                messages.append("\n".join(lines))
+                lines, size = [line], len(line)
+                continue
+            lines.append(line)
+            size += 1 + len(line)
+        messages.append("\n".join(lines))
+        return messages
+
+    def _run(self):
+        pending, first_at = [], None
+        while self.running or not self.queue.empty():
+            timeout = None if first_at is None else max(0.0, first_at + self.flush_seconds - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            done = item if isinstance(item, threading.Event) else None
+            if item is not None and done is None:
+                pending.append(item)
+                if first_at is None: first_at = time.monotonic()
+                if len(pending) < self.max_batch: continue
+            if pending:
+                for text in self.digest(pending):
+                    self._send(text)
+                pending, first_at = [], None
+            if done is not None: done.set()
+
+    def _send(self, text):
+        payload = {"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"}
+        for attempt in range(self.max_attempts):
+            wait = min(2 ** attempt, 30)
+            try:
+                with telemetry.timer("telegram_send"):
+                    resp = self.http.post(self.url, json=payload, timeout=10)
+                if resp.ok:
+                    self.stats["messages"] += 1
+                    telemetry.inc("telegram_messages")
+                    return True
+                if resp.status_code == 429:
+                    try:
+                        wait = float(resp.json()["parameters"]["retry_after"])
+                    except (ValueError, KeyError, TypeError):
+                        wait = float(resp.headers.get("Retry-After", wait))
+                elif resp.status_code < 500:
+                    break  # 400/401/403: token 或 chat_id 配置问题, 重试没有意义
+            except Exception:
+                pass
+            self.stats["retries"] += 1
+            telemetry.inc("telegram_retries")
+            time.sleep(wait)
+        self.stats["dropped"] += 1
+        telemetry.inc("telegram_dropped")
+        print(f"[ERROR] Telegram 发送失败, 已丢弃: {text[:80]}")
+        return False
@@ -0,0 +1,82 @@
+import time
+from collections import deque
+
+
+def parse_prices(rows):
+    """/fapi/v1/ticker/price 全市场快照 -> {symbol: 价格}"""
+    out = {}
+    for item in rows:
+        try:
+            out[item['symbol']] = float(item['price'])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return out
+
+
+class PricePrefilter:
+    """
+    V2.3 180s 异动预筛。
+    每次 tick 用一次全市场价格快照 (ticker/price, weight 2) 更新每个币种的价格环, 本地算出
+    check_180s_shock 比较窗口 (3 分钟前那根 1m 的开盘 ~ 现在) 内的最大涨跌幅,
+    只有达到 flash_threshold * margin 的币种才去拉 1m K线确认。
+    环里的采样覆盖不了窗口 (刚启动 / 快照断档超过 max_gap 秒) 的币种一律放行, 宁可多拉不漏报。
+    """
+    def __init__(self, margin=0.5, max_gap=30, horizon=300, maxlen=128):
+        self.margin = margin
+        self.max_gap = max_gap
+        self.horizon = horizon
+        self.maxlen = maxlen
+        self.rings = {}
+        self.stats = {"passed": 0, "skipped": 0, "unknown": 0}
+
+    def update(self, prices, now=None):
+        now = time.time() if now is None else now
+        for sym, price in prices.items():
+            ring = self.rings.get(sym)
+            if ring is None: ring = self.rings[sym] = deque(maxlen=self.maxlen)
+            ring.append((now, price))
+            while ring and now - ring[0][0] > self.horizon: ring.popleft()
+        for sym in [s for s, r in self.rings.items() if not r or now - r[-1][0] > self.horizon]:
+            del self.rings[sym]
+
+    def reset(self):
+        """快照失败后调用: 清空价格环, 之后一个窗口内所有币种都放行"""
+        self.rings.clear()
+
+    def move(self, symbol, now=None):
+        """窗口内 |当前价 / 采样价 - 1| 的最大值; 采样不足以覆盖窗口时返回 None"""
+        now = time.time() if now is None else now
+        ring = self.rings.get(symbol)
+        if not ring or now - ring[-1][0] > self.max_gap: return None
+        # check_180s_shock 用 open[-4]: 当前分钟之前第 3 根 1m 的开盘时刻
+        start = now // 60 * 60 - 180
+        if ring[0][0] > start: return None
+        last, best, prev_t = ring[-1][1], 0.0, None
+        for t, p in reversed(ring):
+            if prev_t is not None and prev_t - t > self.max_gap: return None
+            best = max(best, abs(last / p - 1))
+            prev_t = t
+            if t <= start: break
+        return best
+
+    def passes(self, symbol, threshold, now=None):
+        m = self.move(symbol, now)
+        if m is None:
+            self.stats["unknown"] += 1
+            return True
+        ok = m >= threshold * self.margin
+        self.stats["passed" if ok else "skipped"] += 1
+        return ok
+
+    def candidates(self, threshold, now=None):
+        """当前已经接近异动阈值的币种 (不管它在哪一层, 本轮都应该扫)"""
+        now = time.time() if now is None else now
+        out = []
+        for sym in self.rings:
+            m = self.move(sym, now)
+            if m is not None and m >= threshold * self.margin: out.append(sym)
+        return out
+
+    def take_stats(self):
+        stats, self.stats = self.stats, dict.fromkeys(self.stats, 0)
+        return stats
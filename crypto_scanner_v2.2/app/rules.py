@@ -0,0 +1,321 @@
+from dataclasses import dataclass, fields
+from typing import Callable
+
+import numpy as np
+
+from .batch import C, H, L, O, V, BatchParams
+
+
+# ========== 注册表 ==========
+@dataclass(frozen=True)
+class Spec:
+    """
+    一个特征或一条规则的声明。
+    bars: 需要的 K线根数 (int, 或 params -> int, 例如 4H 回看随 lookback_4h 变化);
+    needs: 规则用到的特征, 规则实际需要的根数 = max(自身 bars, 各特征 bars)。
+    """
+    name: str
+    fn: Callable
+    bars: object = 1
+    needs: tuple = ()
+    group: str = ""
+
+    def min_bars(self, p):
+        own = self.bars(p) if callable(self.bars) else self.bars
+        return max([own] + [FEATURES[n].min_bars(p) for n in self.needs])
+
+
+FEATURES = {}
+RULES = {}
+
+
+def feature(name, bars=1):
+    def deco(fn):
+        FEATURES[name] = Spec(name, fn, bars)
+        return fn
+    return deco
+
+
+def rule(name, group, needs=(), bars=0):
+    def deco(fn):
+        unknown = [n for n in needs if n not in FEATURES]
+        if unknown: raise KeyError(f"rule {name}: unknown features {unknown}")
+        RULES[name] = Spec(name, fn, bars, tuple(needs), group)
+        return fn
+    return deco
+
+
+def rules_in(group):
+    return [name for name, spec in RULES.items() if spec.group == group]
+
+
+# ========== 特征缓存 ==========
+class Features:
+    """
+    一批窗口 (symbols × bars × 5, K线右对齐, 最后一根是当前 K线) 上的特征。
+    f.pct / f.vol_ratio ... 第一次访问时计算并缓存, f.hit(rule) 同理;
+    同一批数据里每个特征只算一次, 所有规则共用。
+    """
+    def __init__(self, arr, n_bars, params=None, watched=None):
+        self.arr = arr
+        self.n_bars = np.asarray(n_bars)
+        self.params = params or BatchParams()
+        self.watched = np.zeros(self.n_bars.shape, dtype=bool) if watched is None else watched
+        self._hits = {}
+
+    @classmethod
+    def from_columns(cls, o, h, l, c, v, bars, params=None):
+        """单个窗口: 5 个一维数组 (截止到当前 K线), 左侧补 NaN 到 bars 根"""
+        n = min(len(c), bars)
+        arr = np.full((1, bars, 5), np.nan)
+        for k, col in ((O, o), (H, h), (L, l), (C, c), (V, v)):
+            if n: arr[0, bars - n:, k] = col[len(col) - n:]
+        return cls(arr, np.array([n]), params)
+
+    @classmethod
+    def from_values(cls, values, n_bars, params=None):
+        """已经算好的标量指标 (例如 IndicatorState.values()), 不再从 K线重算"""
+        f = cls(None, n_bars, params)
+        for name, val in values.items():
+            f.__dict__[name] = np.float64(val)  # np 标量: 比较结果是 np.bool_, ~ 才是逻辑非
+        return f
+
+    def __getattr__(self, name):
+        spec = FEATURES.get(name)
+        if spec is None: raise AttributeError(name)
+        if self.arr is None: raise KeyError(f"feature {name} not provided")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            val = spec.fn(self)
+        self.__dict__[name] = val
+        return val
+
+    def col(self, k):
+        return self.arr[:, :, k]
+
+    def enough(self, name):
+        """K线根数是否满足规则的声明 (扫描器另有 params.min_bars 下限, 由规则自己声明)"""
+        return self.n_bars >= RULES[name].min_bars(self.params)
+
+    def hit(self, name):
+        if name not in self._hits:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._hits[name] = self.enough(name) & RULES[name].fn(self, self.params)
+        return self._hits[name]
+
+
+def _lookback(p):
+    return p.lookback_4h + 1
+
+
+def _scanner_bars(p):
+    return p.min_bars
+
+
+# ========== 特征 ==========
+@feature("close")
+def _close(f): return f.col(C)[:, -1]
+
+@feature("open")
+def _open(f): return f.col(O)[:, -1]
+
+@feature("high")
+def _high(f): return f.col(H)[:, -1]
+
+@feature("low")
+def _low(f): return f.col(L)[:, -1]
+
+@feature("pct")
+def _pct(f): return (f.close - f.open) / f.open
+
+@feature("abs_pct")
+def _abs_pct(f): return np.abs(f.pct)
+
+@feature("prev_pct", bars=2)
+def _prev_pct(f):
+    c, o = f.col(C), f.col(O)
+    return (c[:, -2] - o[:, -2]) / o[:, -2]
+
+# 均量取前 20 根, 不含当前
+@feature("vol_ma20", bars=21)
+def _vol_ma20(f): return f.col(V)[:, -21:-1].mean(axis=1)
+
+@feature("vol_ratio", bars=21)
+def _vol_ratio(f): return f.col(V)[:, -1] / np.where(f.vol_ma20 > 0, f.vol_ma20, 1)
+
+# 4H 结构: 过去 lookback_4h 根 15m 的高低点, 不含当前
+@feature("high_4h", bars=_lookback)
+def _high_4h(f): return f.col(H)[:, -_lookback(f.params):-1].max(axis=1)
+
+@feature("low_4h", bars=_lookback)
+def _low_4h(f): return f.col(L)[:, -_lookback(f.params):-1].min(axis=1)
+
+@feature("change_12h")
+def _change_12h(f):
+    S, B = f.arr.shape[:2]
+    first = np.clip(B - f.n_bars, 0, B - 1)
+    close_first = f.col(C)[np.arange(S), first]
+    return (f.close - close_first) / close_first
+
+# 布林带 / RSI / 均线 (只算最后一根)
+@feature("sma20", bars=20)
+def _sma20(f): return f.col(C)[:, -20:].mean(axis=1)
+
+@feature("std20", bars=20)
+def _std20(f): return f.col(C)[:, -20:].std(axis=1, ddof=1)
+
+@feature("upper_band", bars=20)
+def _upper_band(f): return f.sma20 + f.std20 * 2
+
+@feature("rsi14", bars=15)
+def _rsi14(f):
+    d = np.diff(f.col(C)[:, -15:], axis=1)
+    gain = np.where(d > 0, d, 0).mean(axis=1)
+    loss = np.where(d < 0, -d, 0).mean(axis=1)
+    return 100 - 100 / (1 + gain / loss)
+
+@feature("ma7", bars=7)
+def _ma7(f): return f.col(C)[:, -7:].mean(axis=1)
+
+@feature("ma25", bars=25)
+def _ma25(f): return f.col(C)[:, -25:].mean(axis=1)
+
+# 窗口内全部 K线的振幅
+@feature("volatility")
+def _volatility(f):
+    h, l = f.col(H), f.col(L)
+    hi_all = np.where(np.isnan(h), -np.inf, h).max(axis=1)
+    lo_all = np.where(np.isnan(l), np.inf, l).min(axis=1)
+    return (hi_all - lo_all) / lo_all
+
+@feature("shock_range")
+def _shock_range(f): return (f.high - f.low) / f.open
+
+@feature("upper_wick")
+def _upper_wick(f): return (f.high - f.close) / f.open
+
+@feature("lower_wick")
+def _lower_wick(f): return (f.close - f.low) / f.open
+
+
+# ========== 规则 ==========
+# --- 基础判定: 扫描器和回测 (strict_backtest_price_volume.py) 共用 ---
+@rule("breakout_up", "core", needs=("close", "high_4h"))
+def _breakout_up(f, p): return f.close > f.high_4h
+
+@rule("breakout_dn", "core", needs=("close", "low_4h"))
+def _breakout_dn(f, p): return f.close < f.low_4h
+
+@rule("vol_spike", "core", needs=("vol_ratio",))
+def _vol_spike(f, p): return f.vol_ratio >= p.vol_factor
+
+# --- V0.5 (scan.py) ---
+@rule("v05_trend", "v05", needs=("abs_pct", "vol_ratio"), bars=_scanner_bars)
+def _v05_trend(f, p): return (f.abs_pct >= p.trend) & (f.vol_ratio >= p.vol)
+
+@rule("v05_accel", "v05", needs=("abs_pct",), bars=_scanner_bars)
+def _v05_accel(f, p): return ~f.hit("v05_trend") & (f.abs_pct >= p.accel)
+
+@rule("v05_watch", "v05", needs=("abs_pct",), bars=_scanner_bars)
+def _v05_watch(f, p): return f.watched & (f.abs_pct >= p.watch_move)
+
+# --- 🅐 趋势启动 (scan.ini) ---
+@rule("a_up", "abc", needs=("pct", "abs_pct"), bars=_scanner_bars)
+def _a_up(f, p): return (f.abs_pct >= p.trend_threshold) & f.hit("vol_spike") & (f.pct > 0) & f.hit("breakout_up")
+
+@rule("a_dn", "abc", needs=("pct", "abs_pct"), bars=_scanner_bars)
+def _a_dn(f, p): return (f.abs_pct >= p.trend_threshold) & f.hit("vol_spike") & (f.pct < 0) & f.hit("breakout_dn")
+
+# --- 🅑 加速/失控 ---
+@rule("b_single", "abc", needs=("abs_pct",), bars=_scanner_bars)
+def _b_single(f, p): return ~(f.hit("a_up") | f.hit("a_dn")) & (f.abs_pct >= p.accel_single)
+
+@rule("b_accum", "abc", needs=("pct", "abs_pct", "prev_pct"), bars=_scanner_bars)
+def _b_accum(f, p):
+    return (~(f.hit("a_up") | f.hit("a_dn")) & (f.pct * f.prev_pct > 0)
+            & (np.abs(f.prev_pct) >= p.accel_each) & (f.abs_pct >= p.accel_each)
+            & (np.abs(f.pct + f.prev_pct) >= p.accel_accum))
+
+# --- 🅒 失败异动 ---
+@rule("c_up", "abc", needs=("pct", "close", "high_4h", "shock_range", "vol_ratio", "upper_wick"), bars=_scanner_bars)
+def _c_up(f, p):
+    return ((f.shock_range >= p.fail_shock) & (f.vol_ratio >= p.fail_vol)
+            & (f.pct > 0) & (f.close < f.high_4h) & (f.upper_wick > p.fail_wick))
+
+@rule("c_dn", "abc", needs=("pct", "close", "low_4h", "shock_range", "vol_ratio", "lower_wick"), bars=_scanner_bars)
+def _c_dn(f, p):
+    return ((f.shock_range >= p.fail_shock) & (f.vol_ratio >= p.fail_vol)
+            & (f.pct < 0) & (f.close > f.low_4h) & (f.lower_wick > p.fail_wick))
+
+# --- scanner.py 策略 A/B ---
+@rule("short_reversal", "trend", needs=("close", "upper_band", "rsi14", "volatility"), bars=_scanner_bars)
+def _short_reversal(f, p):
+    return (f.close > f.upper_band) & (f.rsi14 > p.short_rsi) & (f.volatility > p.short_volatility)
+
+@rule("long_trend", "trend", needs=("close", "sma20", "ma7", "ma25", "rsi14", "volatility"), bars=_scanner_bars)
+def _long_trend(f, p):
+    return (~f.hit("short_reversal") & (f.ma7 > f.ma25) & (f.close > f.sma20)
+            & (f.volatility > p.long_volatility) & (f.rsi14 < p.short_rsi))
+
+
+# ========== 批量结果 ==========
+@dataclass
+class BatchHits:
+    """
+    一轮批量计算的结果 (struct-of-arrays): 每个字段都是长度 = 币种数 的数组,
+    第 i 个元素对应 symbols[i]。
+    """
+    symbols: np.ndarray
+    valid: np.ndarray
+    close: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    pct_change: np.ndarray
+    prev_pct: np.ndarray
+    vol_ratio: np.ndarray
+    high_4h: np.ndarray
+    low_4h: np.ndarray
+    change_12h: np.ndarray
+    sma20: np.ndarray
+    std20: np.ndarray
+    rsi14: np.ndarray
+    ma7: np.ndarray
+    ma25: np.ndarray
+    volatility: np.ndarray
+    # --- 规则命中掩码 ---
+    v05_trend: np.ndarray
+    v05_accel: np.ndarray
+    v05_watch: np.ndarray
+    a_up: np.ndarray
+    a_dn: np.ndarray
+    b_single: np.ndarray
+    b_accum: np.ndarray
+    c_up: np.ndarray
+    c_dn: np.ndarray
+    short_reversal: np.ndarray
+    long_trend: np.ndarray
+
+    def hits(self, mask_name):
+        """返回某条规则命中的币种下标"""
+        return np.flatnonzero(getattr(self, mask_name))
+
+    def row(self, i):
+        """把第 i 个币种的所有数值拿出来 (只在命中后组装告警时用)"""
+        return {f.name: getattr(self, f.name)[i] for f in fields(self)}
+
+
+def evaluate_batch(symbols, arr, n_bars, params=None, watched=None):
+    """
+    一次向量化计算所有币种的指标和规则掩码, scan.py / scan.ini / scanner.py 的规则都从注册表取。
+    watched: 与 symbols 等长的 bool 数组 (关注列表)。
+    """
+    f = Features(arr, n_bars, params, watched)
+    masks = {name: f.hit(name) for group in ("v05", "abc", "trend") for name in rules_in(group)}
+    return BatchHits(
+        symbols=symbols, valid=f.n_bars >= f.params.min_bars,
+        close=f.close, open=f.open, high=f.high, low=f.low,
+        pct_change=f.pct, prev_pct=f.prev_pct, vol_ratio=f.vol_ratio,
+        high_4h=f.high_4h, low_4h=f.low_4h, change_12h=f.change_12h,
+        sma20=f.sma20, std20=f.std20, rsi14=f.rsi14, ma7=f.ma7, ma25=f.ma25, volatility=f.volatility,
+        **masks,
+    )
@@ -1,15 +1,29 @@
-import requests
-import pandas as pd
 import time
 import os
-import csv  # V2.1 新增
 import numpy as np
+import json
+import threading
 from datetime import datetime, timedelta
-from sqlmodel import Session, select
 from .database import engine
+from sqlmodel import Session, select, desc
 from .models import ScanResult, SystemLog, SystemStatus
+from .stream import BarStore, KlineStream, klines_df
+from .indicators import IndicatorState
+from .batch import BatchParams, flash_move
+from .rules import Features
+from .http_client import HttpClient, kline_weight
+from .async_scan import AsyncScanEngine
+from .writer import DbWriter
+from .journal import SignalJournal
+from .telemetry import RoundProfiler, telemetry
+from .events import hub
+from .leaderboard import Leaderboard
+from .notifier import TelegramNotifier
+from .tiers import TierScheduler, parse_tickers
+from .prefilter import PricePrefilter, parse_prices
+from . import capture as market
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from collections import deque
 
 load_dotenv()
@@ -25,14 +39,38 @@ class ScannerEngine:
         elif "localhost" in raw_proxy:
             raw_proxy = raw_proxy.replace("localhost", "host.docker.internal")
         self.proxies = {"http": raw_proxy, "https": raw_proxy} if raw_proxy else None
+
+        # V2.3 共用连接池 + 权重限速, 池大小跟扫描并发数一致
+        self.workers = int(os.getenv("SCAN_WORKERS", 10))
+        self.http = HttpClient(pool_size=self.workers, proxies=self.proxies)
+
+        # V2.3 asyncio 扫描: 并发由信号量控制, 单币种超时
+        self.concurrency = int(os.getenv("SCAN_CONCURRENCY", 20))
+        self.symbol_timeout = float(os.getenv("SCAN_SYMBOL_TIMEOUT", 10))
+        self.async_engine = None
+
+        # V2.3 单写线程: 命中/日志/心跳批量提交, 不再一行一个事务
+        self.writer = DbWriter(engine, flush_ms=int(os.getenv("DB_FLUSH_MS", 500)))
+
+        # V2.3 推送: 最近日志留在内存里, 新连接的快照和增量都不用查库
+        self.recent_logs = deque(maxlen=50)
         
         self.tg_token = os.getenv("TG_BOT_TOKEN")
         self.tg_chat_id = os.getenv("TG_CHAT_ID")
+        # V2.3 Telegram 后台发送: 每轮合并成摘要, 同一币种同一规则冷却, 429 按 retry_after 重试
+        self.notifier = TelegramNotifier(
+            self.tg_token, self.tg_chat_id,
+            api_url=os.getenv("TG_API_URL", "https://api.telegram.org"),
+            cooldown=int(os.getenv("TG_COOLDOWN_SECONDS", 600)),
+            proxies=self.proxies,
+        ) if self.tg_token and self.tg_chat_id else None
         
         self.scan_round = 0
         
         # --- V2.0 核心配置 ---
         self.flash_threshold = 0.03
+        # V2.3 规则阈值 (app/rules.py), 和 scan.py / scan.ini / 回测共用
+        self.rule_params = BatchParams(flash_threshold=self.flash_threshold)
         
         # 黑名单
         self.blacklist = [
@@ -43,99 +81,193 @@ class ScannerEngine:
         ]
 
         # 状态管理
-        self.leaderboard = {}
+        # V2.3 有界排行榜: 分桶计数 + 衰减热度 + 超时淘汰
+        self.leaderboard = Leaderboard(
+            ttl=int(os.getenv("LEADERBOARD_TTL", 86400)),
+            max_symbols=int(os.getenv("LEADERBOARD_MAX", 500)),
+            half_life=int(os.getenv("HEAT_HALF_LIFE", 1800)),
+            heat_scale=float(os.getenv("HEAT_SCALE", 100)),
+        )
         self.cached_sentiment = None
         self.last_sentiment_update = 0
+
+        # V2.3 分层调度: hot / warm / cold 各自的扫描间隔(秒), 分层由全市场快照驱动
+        self.watchlist = {s.strip().upper() for s in os.getenv("WATCHLIST", "").split(",") if s.strip()}
+        self.tier_min_quote_vol = float(os.getenv("TIER_MIN_QUOTE_VOL", 30000000))
+        self.tiers = TierScheduler(
+            intervals={"hot": int(os.getenv("TIER_HOT_SECONDS", 10)),
+                       "warm": int(os.getenv("TIER_WARM_SECONDS", 60)),
+                       "cold": int(os.getenv("TIER_COLD_SECONDS", 600))},
+            snapshot_interval=int(os.getenv("TIER_SNAPSHOT_SECONDS", 30)),
+            hold=int(os.getenv("TIER_HOLD_SECONDS", 300)),
+        )
+
+        # V2.3 180s 异动预筛: 每个 tick 一次全市场价格快照, 只给接近阈值的币种拉 1m K线
+        self.prefilter = PricePrefilter(margin=float(os.getenv("PREFILTER_MARGIN", 0.5))) \
+            if os.getenv("PREFILTER", "1") == "1" else None
+
+        # V2.3 仪表盘快照: 状态变化只递增版本号, 接口按需重建一次并缓存序列化好的 bytes
+        self.board_lock = threading.RLock()
+        self.boot_id = int(time.time())
+        self.version = 0
+        self.snapshot = (-1, b"")
+        self.last_round = 0
+        self.is_running = False
+
+        # V2.3 流模式: WebSocket 推送 K线, 内存 ring buffer 代替每轮 REST 轮询
+        self.stream_bars = int(os.getenv("STREAM_BARS", 50))
+        self.bar_store = BarStore(maxlen=self.stream_bars)
+        self.stream = None
+        self.stream_executor = None  # 流模式的检测线程: 推送回调只投递任务, 不在事件循环里算指标
+        self.stream_pending = set()
+        self.stream_lock = threading.Lock()
+        self.stream_eval_seconds = float(os.getenv("STREAM_EVAL_SECONDS", 5))
+        self.alert_cooldown = int(os.getenv("ALERT_COOLDOWN_SECONDS", 180))  # 同一告警的冷却时间
+        self.last_eval = {}
+        self.last_hit = {}
+        self.tick_time = None  # 当前 tick 的时间 (回放时是录制时间)
+
+        # V2.3 每个币种一份 15m 增量指标, 新 K线/实时修正 O(1) 更新
+        self.indicators = {}
+        # V2.3 检测时的指标快照, 按冷却键 (symbol, tags) 暂存; 过了冷却的命中才写进信号日志
+        self.signal_context = {}
         
-        # V2.1 初始化日志文件头
-        self.csv_file = "scan_signals.csv"
-        self.init_csv()
+        # V2.3 信号日志: 单写线程批量落盘, 按天/大小切分, 写完的分段可压缩或转 parquet (app/journal.py)
+        self.journal = SignalJournal(
+            directory=os.getenv("JOURNAL_DIR", "signals"),
+            compress=os.getenv("JOURNAL_COMPRESS", "gzip"),
+            max_bytes=int(float(os.getenv("JOURNAL_MAX_MB", 64)) * 1024 * 1024),
+            flush_ms=int(os.getenv("JOURNAL_FLUSH_MS", 1000)),
+        )
 
-    # --- V2.1 新增: CSV 日志功能 ---
-    def init_csv(self):
-        # 如果文件不存在，写入表头
-        if not os.path.exists(self.csv_file):
-            try:
-                with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        "Time", "Symbol", "Price", "Rule", "Score", "Strategy_Type",
-                        "Change_180s", "RSI_15m", "Volatility_24h", "Bollinger_Pos", "Raw_Msg"
-                    ])
-            except Exception as e:
-                print(f"CSV Init Error: {e}")
+        # V2.3 指标 (/metrics): 热路径耗时直方图 + 计数器, 队列长度等在导出时现取
+        telemetry.gauge("current_round", lambda: self.scan_round)
+        telemetry.gauge("tier_symbols", lambda: {(("tier", t),): n for t, n in self.tiers.counts().items()})
+        telemetry.gauge("queue_length", lambda: {
+            (("queue", "db"),): self.writer.queue.qsize(),
+            (("queue", "journal"),): self.journal.queue.qsize(),
+            (("queue", "telegram"),): self.notifier.queue.qsize() if self.notifier else 0,
+        })
+        telemetry.gauge("leaderboard_symbols", lambda: len(self.leaderboard.entries))
+        # 慢轮采样: 本轮超过 PROFILE_SLOW_ROUND_SECONDS 秒就把调用栈样本写到 profiles/ (0 = 关闭)
+        slow = float(os.getenv("PROFILE_SLOW_ROUND_SECONDS", 0))
+        self.profiler = RoundProfiler(slow, interval=int(os.getenv("PROFILE_INTERVAL_MS", 10)) / 1000.0,
+                                      directory=os.getenv("PROFILE_DIR", "profiles")) if slow > 0 else None
 
+    # --- V2.1 新增: CSV 日志功能 ---
     def record_signal_to_csv(self, res: ScanResult, indicators: dict):
-        """将信号和当时的技术指标写入 CSV"""
-        try:
-            with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    res.symbol,
-                    res.price,
-                    res.rule_name,
-                    res.score,
-                    res.tags,
-                    indicators.get("change_180s", 0),
-                    indicators.get("rsi", 0),
-                    indicators.get("volatility", 0),
-                    indicators.get("bollinger", ""),
-                    res.rule_name
-                ])
-        except Exception as e:
-            self.log(f"CSV Write Error: {e}", "ERROR")
+        """将信号和当时的技术指标写入信号日志 (只入队, 由 journal 写线程落盘)"""
+        self.journal.add([
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            res.symbol,
+            res.price,
+            res.rule_name,
+            res.score,
+            res.tags,
+            indicators.get("change_180s", 0),
+            indicators.get("rsi", 0),
+            indicators.get("volatility", 0),
+            indicators.get("bollinger", ""),
+            res.rule_name
+        ])
 
     def log(self, message, level="INFO"):
         print(f"[{level}] {message}")
-        try:
-            with Session(engine) as session:
-                session.add(SystemLog(level=level, message=message))
-                session.commit()
-        except Exception: pass
+        row = SystemLog(level=level, message=message)
+        self.writer.add(row)
+        entry = {"level": level, "message": message, "created_at": row.created_at.isoformat()}
+        self.recent_logs.appendleft(entry)
+        self.touch()
+        hub.publish("log", entry)
+
+    def touch(self):
+        """仪表盘相关状态变了: 版本号 +1, 下次请求时重建快照"""
+        with self.board_lock:
+            self.version += 1
+
+    def publish_board(self):
+        """
+        V2.3 定时任务: 衰减热度 / 1h 命中数只在读取时才重新计算, 没有新命中的行在客户端会一直停在旧值。
+        定时把整张排行榜推一次 ("board" 事件, 客户端整表替换, 超过 1h 没命中的行随之消失),
+        同时递增版本号, 轮询 /api/data 的客户端也拿到重新计算过的快照。
+        """
+        with self.board_lock:
+            self.version += 1
+            hot_list = self.leaderboard.top(20) if hub.count else None
+        if hot_list is not None:
+            hub.publish("board", {"hot_list": hot_list})
+
+    def restore_state(self):
+        """启动时从库里恢复最近日志和轮次, 之后仪表盘只读内存"""
+        with Session(engine) as session:
+            status = session.get(SystemStatus, 1)
+            logs = session.exec(select(SystemLog).order_by(desc(SystemLog.created_at)).limit(50)).all()
+        with self.board_lock:
+            if status:
+                self.last_round = status.scan_round
+                self.is_running = True
+            for row in (reversed(logs) if not self.recent_logs else []):
+                self.recent_logs.appendleft({"level": row.level, "message": row.message,
+                                             "created_at": row.created_at.isoformat()})
+            self.version += 1
 
     # --- V2.0 智能选币逻辑 ---
-    def get_active_symbols(self):
+    # V2.3 改为分层调度: 一次 /ticker/24hr 快照给所有币种分层, 不再每轮重拉再筛
+    def refresh_tiers(self, now=None):
+        now = time.time() if now is None else now
         try:
-            resp = requests.get(f"{self.base_url}/fapi/v1/ticker/24hr", proxies=self.proxies, timeout=10).json()
-            valid_symbols = []
-            for item in resp:
-                sym = item['symbol']
-                if not sym.endswith('USDT'): continue
-                if sym in self.blacklist: continue
-                
-                quote_vol = float(item['quoteVolume'])
-                price_change = abs(float(item['priceChangePercent']))
-                
-                # 规则: 成交额 > 5000万 且 波动 > 8%
-                if quote_vol > 50000000 and price_change > 8.0:
-                    valid_symbols.append(sym)
-            
-            if len(valid_symbols) < 3:
-                self.log("高波动币种稀缺，启用备用选币标准 (>5%)", "WARNING")
-                valid_symbols = []
-                for item in resp:
-                    sym = item['symbol']
-                    if not sym.endswith('USDT') or sym in self.blacklist: continue
-                    if float(item['quoteVolume']) > 30000000 and abs(float(item['priceChangePercent'])) > 5.0:
-                        valid_symbols.append(sym)
-            return valid_symbols
+            with telemetry.timer("refresh_tiers"):
+                resp = self.http.get(f"{self.base_url}/fapi/v1/ticker/24hr", weight=40, timeout=10).json()
+            tickers = parse_tickers(resp, exclude=set(self.blacklist), min_quote_vol=self.tier_min_quote_vol)
+            with self.board_lock:
+                heat = {sym: self.leaderboard.heat(e, now) for sym, e in self.leaderboard.entries.items()}
+            self.tiers.update(tickers, heat=heat, watchlist=self.watchlist, now=now)
+            return True
         except Exception as e:
+            self.tiers.snapshot_at = now  # 失败也等下一个快照周期再试, 不在每次 tick 重拉
+            telemetry.inc("errors", where="refresh_tiers")
             self.log(f"选币失败: {e}", "ERROR")
-            return []
+            return False
+
+    def refresh_prices(self, now=None):
+        """一次 /ticker/price 全市场快照喂给预筛价格环; 失败时清空价格环, 暂停预筛直到采样重新覆盖窗口"""
+        try:
+            with telemetry.timer("refresh_prices"):
+                resp = self.http.get(f"{self.base_url}/fapi/v1/ticker/price", weight=2, timeout=5).json()
+            self.prefilter.update(parse_prices(resp), now)
+            return True
+        except Exception as e:
+            self.prefilter.reset()
+            telemetry.inc("errors", where="refresh_prices")
+            self.log(f"价格快照失败: {e}", "WARNING")
+            return False
+
+    def get_active_symbols(self):
+        """hot + warm 层的币种 (流模式订阅用); 快照过期时先重新分层"""
+        with telemetry.timer("get_active_symbols"):
+            if self.tiers.stale(): self.refresh_tiers()
+            return self.tiers.members("hot", "warm")
 
     def get_klines(self, symbol, interval='15m', limit=50):
+        # V2.3 流模式下优先读内存 K线, 数据不够时再走 REST
+        if self.stream is not None and self.bar_store.count(symbol, interval) >= limit:
+            return self.bar_store.get_df(symbol, interval, limit)
         try:
             params = {'symbol': symbol, 'interval': interval, 'limit': limit}
-            resp = requests.get(f"{self.base_url}/fapi/v1/klines", params=params, proxies=self.proxies, timeout=5)
-            df = pd.DataFrame(resp.json(), columns=['op_t','o','h','l','c','v','cl_t','qav','nt','tb','tq','ig'])
-            df[['o','h','l','c','v']] = df[['o','h','l','c','v']].astype(float)
-            return df
-        except: return None
+            with telemetry.timer("get_klines", interval=interval):
+                resp = self.http.get(f"{self.base_url}/fapi/v1/klines", params=params, weight=kline_weight(limit), timeout=5)
+            return klines_df(resp.json())
+        except Exception:
+            telemetry.inc("errors", where="get_klines")
+            return None
 
     # --- 180秒急速异动检测 ---
-    def check_180s_shock(self, symbol):
-        df = self.get_klines(symbol, interval='1m', limit=5)
+    def check_180s_shock(self, symbol, df=None):
+        if df is None: df = self.get_klines(symbol, interval='1m', limit=5)
+        with telemetry.timer("check_180s_shock"):
+            return self._check_180s_shock(symbol, df)
+
+    def _check_180s_shock(self, symbol, df):
         if df is None or len(df) < 4: return None
 
         current_price = df.iloc[-1]['c']
@@ -143,59 +275,61 @@ class ScannerEngine:
         
         if price_3m_ago == 0: return None
 
-        pct_change = (current_price - price_3m_ago) / price_3m_ago
+        # 判定逻辑在 batch.flash_move, 回放回测 (replay_backtest.py) 共用同一份
+        pct_change, hit, score = flash_move(price_3m_ago, current_price, self.flash_threshold)
         abs_change = abs(pct_change)
 
-        if abs_change >= self.flash_threshold:
+        if hit:
             direction = "飙升" if pct_change > 0 else "闪崩"
             icon = "🚀" if pct_change > 0 else "📉"
             msg = f"{direction} {abs_change*100:.1f}% (180s)"
-            score = 85 + int((abs_change - self.flash_threshold) * 100 * 2)
             
             res = ScanResult(
                 symbol=symbol, price=current_price, change_percent=pct_change,
-                vol_ratio=0, rule_name=msg, score=min(100, score),
+                vol_ratio=0, rule_name=msg, score=int(score),
                 evo_state=icon, tags="⚡180s异动"
             )
             
-            # V2.1 记录日志
-            self.record_signal_to_csv(res, {
+            # V2.1 记录日志 (冷却通过后在 handle_result 里写)
+            self.signal_context[(res.symbol, res.tags)] = {
                 "change_180s": round(pct_change * 100, 2),
                 "strategy": "FlashShock"
-            })
+            }
             return res
         return None
 
     # --- 综合分析逻辑 ---
     def analyze_single(self, symbol):
-        # 1. 优先检测: 180秒
-        flash_res = self.check_180s_shock(symbol)
-        if flash_res: return flash_res
+        with telemetry.timer("analyze_single", mode="sync"):
+            # 1. 优先检测: 180秒
+            flash_res = self.check_180s_shock(symbol)
+            if flash_res: return flash_res
 
-        # 2. 常规趋势检测
-        df = self.get_klines(symbol, interval='15m', limit=50)
-        if df is None or len(df) < 25: return None
+            # 2. 常规趋势检测
+            return self.check_trend(symbol)
 
-        curr = df.iloc[-1]
-        close = curr['c']
-        
-        # 指标计算
-        df['sma'] = df['c'].rolling(window=20).mean()
-        df['std'] = df['c'].rolling(window=20).std()
-        upper_band = df.iloc[-1]['sma'] + (df.iloc[-1]['std'] * 2)
-        
-        delta = df['c'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs.iloc[-1]))
-        
-        ma7 = df['c'].rolling(window=7).mean().iloc[-1]
-        ma25 = df['c'].rolling(window=25).mean().iloc[-1]
+    def check_trend(self, symbol, df=None):
+        st = self.indicators.get(symbol)
+        sync = self.stream is None or st is None or st.count < 25
+        if sync:
+            if df is None: df = self.get_klines(symbol, interval='15m', limit=50)
+            if df is None or len(df) < 25: return None
+        with telemetry.timer("check_trend"):
+            if sync: st = self.sync_indicators(symbol, df)
+            return self._check_trend(symbol, st)
 
-        high_24 = df['h'].max()
-        low_24 = df['l'].min()
-        volatility = (high_24 - low_24) / low_24
+    def _check_trend(self, symbol, st):
+
+        # 指标计算 (增量维护, 见 indicators.py), 判定用 rules.py 注册表里的规则
+        v = st.values()
+        close = v["close"]
+        upper_band = v["upper_band"]
+        rsi = v["rsi"]
+        volatility = v["volatility"]
+        f = Features.from_values({
+            "close": close, "upper_band": upper_band, "sma20": v["sma"], "rsi14": rsi,
+            "ma7": v["ma7"], "ma25": v["ma25"], "volatility": volatility,
+        }, st.count, self.rule_params)
         
         # 收集指标用于日志
         indicators = {
@@ -205,50 +339,54 @@ class ScannerEngine:
         }
 
         # --- 策略 A: 强力做空 ---
-        if close > upper_band and rsi > 70 and volatility > 0.05:
+        if f.hit("short_reversal"):
             res = ScanResult(
                 symbol=symbol, price=close, change_percent=0, vol_ratio=0,
                 rule_name="做空:超买反转", score=90, evo_state="🐻", tags="高胜率"
             )
-            self.record_signal_to_csv(res, indicators) # 记录 CSV
+            self.signal_context[(res.symbol, res.tags)] = indicators  # 记录 CSV (冷却通过后)
             return res
 
         # --- 策略 B: 顺势做多 ---
-        if ma7 > ma25 and close > df.iloc[-1]['sma'] and volatility > 0.03:
-            if rsi < 70:
-                res = ScanResult(
-                    symbol=symbol, price=close, change_percent=0, vol_ratio=0,
-                    rule_name="做多:趋势增强", score=75, evo_state="🐂", tags="右侧"
-                )
-                self.record_signal_to_csv(res, indicators) # 记录 CSV
-                return res
+        if f.hit("long_trend"):
+            res = ScanResult(
+                symbol=symbol, price=close, change_percent=0, vol_ratio=0,
+                rule_name="做多:趋势增强", score=75, evo_state="🐂", tags="右侧"
+            )
+            self.signal_context[(res.symbol, res.tags)] = indicators  # 记录 CSV (冷却通过后)
+            return res
 
         return None
 
+    def sync_indicators(self, symbol, df):
+        """把 REST K线里比指标状态新的部分增量喂进去; 数据断档则整段重建"""
+        st = self.indicators.get(symbol)
+        first_t = int(df['op_t'].iloc[0])
+        if st is None or st.last_t is None or st.last_t < first_t:
+            st = self.indicators[symbol] = IndicatorState.from_df(df)
+            return st
+        for t, h, l, c in zip(df['op_t'], df['h'], df['l'], df['c']):
+            if int(t) >= st.last_t: st.update(int(t), h, l, c)
+        return st
+
     def update_leaderboard(self, res: ScanResult):
-        now_ts = time.time()
-        sym = res.symbol
-        if sym not in self.leaderboard:
-            self.leaderboard[sym] = {
-                "symbol": sym, "hits_today": 0, "hit_timestamps": [], 
-                "last_trigger_time": "", "last_trigger_ts": 0,
-                "reasons": set(), "max_vol_ratio": 0.0, "max_move": 0.0, "heat_score": 0
-            }
-        data = self.leaderboard[sym]
-        data["hits_today"] += 1
-        data["hit_timestamps"].append(now_ts)
-        data["last_trigger_time"] = datetime.now().strftime("%H:%M:%S")
-        data["last_trigger_ts"] = now_ts
-        data["reasons"].add(res.rule_name)
-        data["heat_score"] = res.score
-        if abs(res.change_percent) > abs(data["max_move"]): data["max_move"] = res.change_percent
+        with self.board_lock:
+            self.leaderboard.update(res.symbol, res.score, res.rule_name, res.change_percent)
+            self.version += 1
+
+    def refresh_sentiment(self):
+        """V2.3 后台定时任务调用, 请求路径不再等 alternative.me"""
+        result = self.fetch_fear_and_greed()
+        if result is not None:
+            with self.board_lock:
+                self.cached_sentiment = result
+                self.last_sentiment_update = time.time()
+                self.version += 1
 
     def fetch_fear_and_greed(self):
-        if time.time() - self.last_sentiment_update < 300 and self.cached_sentiment:
-            return self.cached_sentiment
         try:
             url = "https://api.alternative.me/fng/?limit=2"
-            r = requests.get(url, proxies=self.proxies, timeout=5)
+            r = self.http.get(url, weight=0, timeout=5)
             data = r.json()['data']
             today = data[0]; yesterday = data[1]
             score = int(today['value'])
@@ -258,66 +396,278 @@ class ScannerEngine:
             elif score <= 55: icon, color = "😐", "text-gray-400"
             elif score <= 75: icon, color = "🤑", "text-green-400"
             else: icon, color = "🚀", "text-red-500"
-            result = {"score": score, "level": today['value_classification'], "icon": icon, "color_class": color, "delta": delta}
-            self.cached_sentiment = result; self.last_sentiment_update = time.time()
-            return result
+            return {"score": score, "level": today['value_classification'], "icon": icon, "color_class": color, "delta": delta}
         except:
-            return {"score": 50, "level": "Unknown", "icon": "❓", "color_class": "text-gray-500", "delta": 0}
+            return None
 
     def get_dashboard_data(self):
-        now = time.time()
-        clean_list = []
-        stale_threshold = 3600 
-        for sym, data in self.leaderboard.items():
-            if now - data["last_trigger_ts"] > stale_threshold: continue
-            hits_1h = len([t for t in data["hit_timestamps"] if now - t < 3600])
-            item = data.copy()
-            item["hits_1h"] = hits_1h
-            item["reasons"] = list(data["reasons"])[:2]
-            del item["hit_timestamps"]
-            clean_list.append(item)
-        clean_list.sort(key=lambda x: x["heat_score"], reverse=True)
-        return {"market_heat": self.fetch_fear_and_greed(), "hot_list": clean_list[:20]}
+        with self.board_lock:
+            hot_list = self.leaderboard.top(20)
+            sentiment = self.cached_sentiment
+        if sentiment is None:
+            sentiment = {"score": 50, "level": "Unknown", "icon": "❓", "color_class": "text-gray-500", "delta": 0}
+        return {"market_heat": sentiment, "hot_list": hot_list}
+
+    def get_dashboard_snapshot(self):
+        """
+        V2.3 返回 (etag, json bytes)。版本号没变就直接复用上次序列化的结果,
+        同一版本无论多少个请求都只构建一次。
+        """
+        with self.board_lock:
+            version = self.version
+            if self.snapshot[0] == version:
+                return self.snapshot[1:]
+            data = self.get_dashboard_data()
+            data["round"] = self.last_round
+            data["logs"] = list(self.recent_logs)
+            data["is_running"] = self.is_running
+            body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+            etag = f'"{self.boot_id}-{version}"'
+            self.snapshot = (version, etag, body)
+            return etag, body
 
     def send_telegram(self, res: ScanResult):
-        if not self.tg_token or not self.tg_chat_id: return
-        try:
-            text = (f"🚨 <b>{res.symbol}</b>\nScore: {res.score}\nType: {res.evo_state} {res.tags}\nMsg: {res.rule_name}")
-            requests.post(f"https://api.telegram.org/bot{self.tg_token}/sendMessage", json={"chat_id": self.tg_chat_id, "text": text, "parse_mode": "HTML"}, proxies=self.proxies, timeout=5)
-        except: pass
+        """只入队, 发送在 notifier 线程里做, 扫描不等网络"""
+        if self.notifier is None or not self.tg_token: return
+        self.notifier.notify(res)
 
-    def run_scan(self):
-        self.scan_round += 1
-        self.log(f"开始 V2.1 Round {self.scan_round} 扫描...")
+    # --- V2.3 asyncio 扫描 ---
+    async def scan_symbol_async(self, client, symbol):
+        """与 analyze_single 相同的检测顺序, K线改为异步拉取; 预筛没过的币种不拉 1m K线"""
+        t0 = time.perf_counter()
+        url = f"{self.base_url}/fapi/v1/klines"
+        if self.prefilter is None or self.prefilter.passes(symbol, self.flash_threshold, self.tick_time):
+            # 和同步版 get_klines 一样: 1m 拉取失败只跳过 180s 检测, 照常做 15m 趋势检测
+            try:
+                with telemetry.timer("get_klines", interval="1m"):
+                    rows = await client.get_json(url, {'symbol': symbol, 'interval': '1m', 'limit': 5}, weight=kline_weight(5))
+                flash_res = self.check_180s_shock(symbol, klines_df(rows))
+            except Exception:
+                telemetry.inc("errors", where="get_klines")
+                flash_res = None
+            if flash_res:
+                telemetry.observe("analyze_single", time.perf_counter() - t0, mode="async")
+                return flash_res
+
+        with telemetry.timer("get_klines", interval="15m"):
+            rows = await client.get_json(url, {'symbol': symbol, 'interval': '15m', 'limit': 50}, weight=kline_weight(50))
+        res = self.check_trend(symbol, klines_df(rows))
+        telemetry.observe("analyze_single", time.perf_counter() - t0, mode="async")
+        return res
+
+    def get_async_engine(self):
+        if self.async_engine is None:
+            proxy = self.proxies["https"] if self.proxies else None
+            self.async_engine = AsyncScanEngine(self.concurrency, self.symbol_timeout, proxy=proxy)
+        return self.async_engine
+
+    def shutdown(self):
+        """FastAPI 退出时调用: 停止推送订阅和异步扫描循环, 最后把写队列刷盘"""
+        self.stop_stream()
+        if self.async_engine is not None:
+            self.async_engine.close()
+            self.async_engine = None
+        if self.notifier is not None: self.notifier.stop()
+        self.journal.stop()
+        self.writer.stop()
+
+    def handle_result(self, result: ScanResult):
+        """过了冷却的命中: 入库 / 信号日志 / 排行榜 / 推送 / Telegram"""
+        self.writer.add(result)
+        # hot 层 10 秒一扫、流模式 5 秒一评估, 同一个持续的信号只在冷却窗口里记一次
+        self.record_signal_to_csv(result, self.signal_context.pop((result.symbol, result.tags), {}))
+        self.update_leaderboard(result)
+        if hub.count:
+            with self.board_lock:
+                item = self.leaderboard.item(result.symbol)
+            hub.publish("leaderboard", item)
+        self.send_telegram(result)
+        self.log(f"命中: {result.symbol} {result.rule_name}")
+
+    # --- V2.3 WebSocket 流模式 ---
+    def start_stream(self, url=None):
+        """开启流模式: 订阅 1m/15m K线推送, 每根 K线更新时触发检测"""
+        if self.stream is not None: return
+        # 单线程: 同一币种的指标更新和检测按推送顺序执行
+        self.stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-detect")
+        self.stream = KlineStream(self.bar_store, self.on_bar_update, intervals=('1m', '15m'), url=url)
         symbols = self.get_active_symbols()
-        if not symbols: 
-            self.log("没有符合条件的币种 (成交量/波动率不足)", "WARNING")
+        self.seed_bars(symbols)
+        self.stream.start(symbols)
+        self.log(f"流模式启动: 订阅 {len(symbols)} 个币种 ({self.stream.url})")
+
+    def stop_stream(self):
+        if self.stream is None: return
+        self.stream.stop()
+        self.stream = None
+        self.stream_executor.shutdown(wait=True)
+        self.stream_executor = None
+
+    def sync_stream(self, symbols):
+        new_symbols = [s for s in symbols if s not in self.stream.symbols]
+        for sym in self.stream.symbols:
+            if sym not in symbols:
+                self.bar_store.drop(sym)
+                self.indicators.pop(sym, None)  # 重新订阅时从补齐的 K线重建, 不接着用断档前的状态
+        self.seed_bars(new_symbols)
+        self.stream.set_symbols(symbols)
+        self.log(f"流模式订阅 {len(symbols)} 个币种 (新增 {len(new_symbols)}), {len(self.stream.conns)} 条连接 "
+                 f"(累计建连 {self.stream.connects} 次), 已收推送 {self.stream.messages} 条")
+
+    def seed_bars(self, symbols):
+        """新订阅的币种先用 REST 补齐历史 K线, 之后只靠推送增量更新"""
+        def seed_one(sym):
+            for interval in ('1m', '15m'):
+                try:
+                    params = {'symbol': sym, 'interval': interval, 'limit': self.stream_bars}
+                    rows = self.http.get(f"{self.base_url}/fapi/v1/klines", params=params, weight=kline_weight(self.stream_bars), timeout=5).json()
+                    self.bar_store.seed(sym, interval, [[int(r[0])] + [float(x) for x in r[1:6]] + list(r[6:])
+                                                        for r in rows])
+                except Exception: pass
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(seed_one, symbols))
+
+    def on_bar_update(self, symbol, interval, kind, is_closed):
+        """
+        K线推送回调 (事件循环线程, 不能阻塞): 收盘或距上次检测超过 stream_eval_seconds 才检测,
+        检测投递到 stream_executor; 同一 (币种, 周期) 已经在排队时不重复投递, 执行时读的是最新的 K线。
+        """
+        now = time.time()
+        key = (symbol, interval)
+        if not is_closed and kind != "new" and now - self.last_eval.get(key, 0) < self.stream_eval_seconds:
             return
-        
+        self.last_eval[key] = now
+        with self.stream_lock:
+            if key in self.stream_pending or self.stream_executor is None: return
+            self.stream_pending.add(key)
+        self.stream_executor.submit(self.stream_detect, symbol, interval, now)
+
+    def stream_detect(self, symbol, interval, now):
+        """检测线程: 只读 BarStore 里的 K线, 从不走 REST; K线还没补齐到够用的币种先跳过"""
+        with self.stream_lock:
+            self.stream_pending.discard((symbol, interval))
         try:
-            with Session(engine) as session:
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = {executor.submit(self.analyze_single, sym): sym for sym in symbols}
-                    for future in as_completed(futures):
-                        try:
-                            result = future.result()
-                            if result:
-                                session.add(result)
-                                session.commit()
-                                self.update_leaderboard(result)
-                                self.send_telegram(result)
-                                self.log(f"命中: {result.symbol} {result.rule_name}")
-                        except: pass
-        except Exception as e: self.log(f"Scan error: {e}", "ERROR")
-        
+            if interval == '1m':
+                df = self.bar_store.get_df(symbol, '1m', 5)
+                result = self.check_180s_shock(symbol, df) if df is not None and len(df) >= 4 else None
+            else:
+                # 排队期间可能已经收了不止一根 (上一根的收盘修正 + 新开的一根):
+                # 把 last_t 起存下的每一根都按顺序喂进指标, 不能只喂最后一根
+                st = self.indicators.get(symbol)
+                rows = self.bar_store.since(symbol, '15m', st.last_t) if st is not None and st.count >= 25 else None
+                if rows and rows[0][0] == st.last_t:
+                    for row in rows: st.update(row[0], row[2], row[3], row[4])
+                elif self.bar_store.count(symbol, '15m') >= 25:
+                    # 还没有指标状态, 或者状态的最后一根已经不在 BarStore 里: 用存下的 K线整段同步
+                    st = self.sync_indicators(symbol, self.bar_store.get_df(symbol, '15m', self.stream_bars))
+                else:
+                    return
+                with telemetry.timer("check_trend"):
+                    result = self._check_trend(symbol, st)
+            if result and self.cooled_down(result, now): self.handle_result(result)
+        except Exception as e:
+            telemetry.inc("errors", where="stream_detect")
+            print(f"[ERROR] stream detect {symbol} {interval}: {e}")
+
+    def cooled_down(self, result, now=None):
+        """同一币种同一规则在冷却期 (ALERT_COOLDOWN_SECONDS) 内只报一次; 流模式和分层高频扫描共用"""
+        now = time.time() if now is None else now
+        hit_key = (result.symbol, result.tags)
+        if now - self.last_hit.get(hit_key, 0) < self.alert_cooldown: return False
+        self.last_hit[hit_key] = now
+        return True
+
+    def run_scan(self, now=None):
+        """
+        定时任务入口: 在 scan_tick 外面记录整轮耗时, 开了慢轮采样时顺便采样。
+        now 只在回放录制 (capture_replay.py) 时传入, 用录制时的 tick 时间驱动分层/预筛/冷却。
+        """
+        if self.profiler is not None: self.profiler.start()
+        t0 = time.perf_counter()
+        scanned = 0
         try:
-            with Session(engine) as session:
-                st = session.get(SystemStatus, 1) or SystemStatus(id=1, last_heartbeat=datetime.now())
-                st.last_heartbeat = datetime.now()
-                st.scan_round = self.scan_round
-                session.add(st)
-                session.commit()
-        except: pass
-        self.log(f"Round {self.scan_round} 结束.")
+            scanned = self.scan_tick(now)
+        except Exception as e:
+            telemetry.inc("errors", where="run_scan")
+            self.log(f"Round {self.scan_round} error: {e}", "ERROR")
+        finally:
+            elapsed = time.perf_counter() - t0
+            if scanned: telemetry.observe("scan_round", elapsed)
+            if self.profiler is not None:
+                path = self.profiler.stop(self.scan_round, elapsed if scanned else 0.0)
+                if path: self.log(f"Round {self.scan_round} 耗时 {elapsed:.1f}s, 调用栈采样已保存到 {path}", "WARNING")
+
+    def scan_tick(self, now=None):
+        """
+        V2.3 定时任务按 hot 层的间隔触发: 快照过期先重新分层, 然后只扫描到期的币种;
+        只有重新分层的那一轮写开始/结束日志, 避免高频 tick 刷屏。返回本轮扫描的币种数。
+        """
+        now = time.time() if now is None else now
+        self.tick_time = now
+        if market.capture.mode: market.capture.mark("tick", now)  # 录制: 记下 tick; 回放: 推进回放时钟
+        refreshed = self.refresh_tiers(now) if self.tiers.stale(now) else False
+        if not len(self.tiers):
+            if refreshed: self.log("没有符合条件的币种 (成交量不足)", "WARNING")
+            return 0
+
+        if self.stream is not None:
+            # V2.3 流模式: 重新分层后刷新订阅列表 (hot + warm), 检测由 K线推送驱动
+            if not refreshed: return 0
+            symbols = self.tiers.members("hot", "warm")
+        else:
+            symbols = self.tiers.due(now)
+            if self.prefilter is not None and self.refresh_prices(now):
+                # 价格已经接近 180s 异动阈值的币种, 不管在哪一层本轮都扫
+                queued = set(symbols)
+                symbols += [s for s in self.prefilter.candidates(self.flash_threshold, now)
+                            if s in self.tiers.tiers and s not in queued]
+            if not symbols: return 0
+
+        self.scan_round += 1
+        if refreshed:
+            c = self.tiers.counts()
+            self.log(f"开始 V2.3 Round {self.scan_round}: hot {c['hot']} / warm {c['warm']} / cold {c['cold']}, "
+                     f"本轮扫描 {len(symbols)} 个币种")
+
+        if self.stream is not None:
+            try:
+                self.sync_stream(symbols)
+            except Exception as e: self.log(f"Stream sync error: {e}", "ERROR")
+        else:
+            # V2.3 asyncio 扫描: 结果按完成顺序流回来, 边收边入库
+            failed = 0
+            try:
+                for sym, result, err in self.get_async_engine().scan(symbols, self.scan_symbol_async):
+                    telemetry.inc("symbols_scanned")
+                    if err is not None:
+                        failed += 1
+                        telemetry.inc("symbols_failed", reason=type(err).__name__)
+                        continue
+                    try:
+                        if result:
+                            telemetry.inc("signals", tags=result.tags)
+                            if self.cooled_down(result, now): self.handle_result(result)
+                    except Exception as e:
+                        telemetry.inc("errors", where="handle_result")
+                        self.log(f"{sym} 处理失败: {e}", "ERROR")
+            except Exception as e:
+                telemetry.inc("errors", where="scan")
+                self.log(f"Scan error: {e}", "ERROR")
+            if failed: self.log(f"Round {self.scan_round}: {failed}/{len(symbols)} 个币种拉取失败或超时", "WARNING")
+        
+        # 心跳和本轮的命中/日志一起在一个事务里提交
+        self.writer.heartbeat(self.scan_round)
+        with self.board_lock:
+            self.last_round, self.is_running = self.scan_round, True
+            self.version += 1
+        hub.publish("heartbeat", {"round": self.scan_round, "is_running": True})
+        if refreshed:
+            if self.prefilter is not None:
+                st = self.prefilter.take_stats()
+                self.log(f"预筛: 拉 1m K线 {st['passed'] + st['unknown']} 次, 跳过 {st['skipped']} 次")
+            self.log(f"Round {self.scan_round} 结束.")
+        if self.notifier is not None: self.notifier.flush()  # 本轮命中合并成一条摘要发出
+        self.writer.flush()
+        return len(symbols)
 
 scanner = ScannerEngine()
\ No newline at end of file
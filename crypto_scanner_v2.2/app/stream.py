@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+
+import pandas as pd
+import websockets
+
+# 与 REST /fapi/v1/klines 返回的列顺序保持一致, 方便 get_klines 无缝切换数据源
+KLINE_COLUMNS = ['op_t','o','h','l','c','v','cl_t','qav','nt','tb','tq','ig']
+
+# Binance 单条连接最多订阅 200 个 stream, 超出则拆成多条连接
+MAX_STREAMS_PER_CONN = 200
+
+
+def klines_df(rows):
+    """REST / 推送的 K线行 -> DataFrame (o/h/l/c/v 转 float)"""
+    df = pd.DataFrame(rows, columns=KLINE_COLUMNS)
+    df[['o','h','l','c','v']] = df[['o','h','l','c','v']].astype(float)
+    return df
+
+
+class BarStore:
+    """
+    V2.3 内存 K线仓库: 每个 (symbol, interval) 一个定长 ring buffer。
+    最后一根是正在跳动的实时 K线, 推送更新时原地修正; 新开一根时整体右移。
+    """
+    def __init__(self, maxlen=50):
+        self.maxlen = maxlen
+        self.bars = {}
+        self.lock = threading.Lock()
+
+    def seed(self, symbol, interval, rows):
+        """用 REST 返回的 K线初始化; 已经通过推送收到的更新数据保留"""
+        with self.lock:
+            buf = deque(rows[-self.maxlen:], maxlen=self.maxlen)
+            old = self.bars.get((symbol, interval))
+            if old and buf:
+                last_t = buf[-1][0]
+                for row in old:
+                    if row[0] == last_t: buf[-1] = row
+                    elif row[0] > last_t: buf.append(row)
+            self.bars[(symbol, interval)] = buf
+
+    def update(self, symbol, interval, row):
+        """
+        写入一根推送 K线, 返回:
+          "new"    新开了一根 K线
+          "revise" 修正当前实时 K线
+          "stale"  比已有数据更旧, 忽略
+        """
+        with self.lock:
+            buf = self.bars.get((symbol, interval))
+            if buf is None:
+                buf = self.bars[(symbol, interval)] = deque(maxlen=self.maxlen)
+            if buf and row[0] == buf[-1][0]:
+                buf[-1] = row
+                return "revise"
+            if buf and row[0] < buf[-1][0]:
+                return "stale"
+            buf.append(row)
+            return "new"
+
+    def count(self, symbol, interval):
+        with self.lock:
+            return len(self.bars.get((symbol, interval), ()))
+
+    def last(self, symbol, interval):
+        with self.lock:
+            buf = self.bars.get((symbol, interval))
+            return buf[-1] if buf else None
+
+    def since(self, symbol, interval, open_time):
+        """开盘时间 >= open_time 的 K线 (按时间顺序); 没有这个币种时返回空列表"""
+        with self.lock:
+            buf = self.bars.get((symbol, interval))
+            return [row for row in buf if row[0] >= open_time] if buf else []
+
+    def get_df(self, symbol, interval, limit=50):
+        """返回最近 limit 根 K线, 格式与 ScannerEngine.get_klines 相同"""
+        with self.lock:
+            buf = self.bars.get((symbol, interval))
+            if not buf: return None
+            rows = list(buf)[-limit:]
+        return klines_df(rows)
+
+    def drop(self, symbol):
+        with self.lock:
+            for key in [k for k in self.bars if k[0] == symbol]:
+                del self.bars[key]
+
+
+def parse_kline_event(msg):
+    """
+    解析 combined stream 消息 {"stream": "...", "data": {"e": "kline", "k": {...}}}
+    返回 (symbol, interval, row, is_closed), 非 K线消息返回 None
+    """
+    data = msg.get("data", msg)
+    if data.get("e") != "kline": return None
+    k = data["k"]
+    row = [int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]),
+           int(k["T"]), k.get("q", "0"), k.get("n", 0), k.get("V", "0"), k.get("Q", "0"), "0"]
+    return k.get("s", data.get("s")), k["i"], row, bool(k.get("x"))
+
+
+class _Connection:
+    """一条 combined stream 连接: streams 是它应当订阅的集合, ws 为 None 表示正在(重)连"""
+    def __init__(self):
+        self.streams = set()
+        self.ws = None
+        self.task = None
+
+
+class KlineStream:
+    """
+    V2.3 WebSocket K线订阅: 后台线程跑 asyncio, 订阅 <symbol>@kline_<interval> combined streams,
+    收到推送后写入 BarStore 并回调 on_bar(symbol, interval, kind, is_closed)。
+    订阅列表变化时在已有连接上发 SUBSCRIBE / UNSUBSCRIBE, 不断开重连; 每条连接最多 MAX_STREAMS_PER_CONN 个,
+    装不下才新开连接, 清空的连接关掉。断线重连时按连接当前的订阅集合拼 URL。
+    url 可通过 WS_URL 覆盖, 本地假服务器回放录制的 K线即可驱动 (见 tests/fake_ws.py)。
+    on_bar 在事件循环线程里调用, 不能阻塞。
+    """
+    def __init__(self, store, on_bar, intervals=('1m', '15m'), url=None):
+        self.store = store
+        self.on_bar = on_bar
+        self.intervals = list(intervals)
+        self.url = (url or os.getenv("WS_URL", "wss://fstream.binance.com")).rstrip("/")
+        self.symbols = []
+        self.loop = None
+        self.thread = None
+        self.running = False
+        self.changed = None
+        self.conns = []
+        self.request_id = 0
+        self.messages = 0
+        self.connects = 0
+
+    def start(self, symbols):
+        self.symbols = list(symbols)
+        self.running = True
+        self.thread = threading.Thread(target=self._thread_main, daemon=True)
+        self.thread.start()
+
+    def set_symbols(self, symbols):
+        """订阅列表变化时通知事件循环, 在现有连接上增减订阅"""
+        symbols = list(symbols)
+        if sorted(symbols) == sorted(self.symbols): return
+        self.symbols = symbols
+        if self.loop and self.changed:
+            self.loop.call_soon_threadsafe(self.changed.set)
+
+    def stop(self):
+        self.running = False
+        if self.loop and self.changed:
+            self.loop.call_soon_threadsafe(self.changed.set)
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def stream_names(self):
+        return [f"{s.lower()}@kline_{i}" for s in self.symbols for i in self.intervals]
+
+    def _url(self, names):
+        return f"{self.url}/stream?streams=" + "/".join(sorted(names))
+
+    def _thread_main(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._run())
+        finally:
+            self.loop.close()
+
+    async def _run(self):
+        self.changed = asyncio.Event()
+        try:
+            while self.running:
+                self.changed.clear()
+                await self._apply()
+                await self.changed.wait()
+        finally:
+            tasks = [c.task for c in self.conns]
+            for t in tasks: t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.conns = []
+
+    async def _apply(self):
+        """把各连接的订阅集合调整到 stream_names(): 先退订, 再往有空位的连接里加, 最后才新开连接"""
+        want = set(self.stream_names())
+        for conn in list(self.conns):
+            drop = conn.streams - want
+            if not drop: continue
+            conn.streams -= drop
+            if not conn.streams:
+                conn.task.cancel()
+                self.conns.remove(conn)
+            else:
+                await self._send(conn, "UNSUBSCRIBE", drop)
+        add = sorted(want - set().union(*(c.streams for c in self.conns)))
+        for conn in self.conns:
+            room = MAX_STREAMS_PER_CONN - len(conn.streams)
+            if room <= 0 or not add: continue
+            take, add = add[:room], add[room:]
+            conn.streams |= set(take)
+            await self._send(conn, "SUBSCRIBE", take)
+        for i in range(0, len(add), MAX_STREAMS_PER_CONN):
+            conn = _Connection()
+            conn.streams = set(add[i:i + MAX_STREAMS_PER_CONN])
+            conn.task = asyncio.ensure_future(self._consume(conn))
+            self.conns.append(conn)
+
+    async def _send(self, conn, method, names):
+        # 还在(重)连的连接不用发, 连上后会按当前集合补齐
+        if conn.ws is None or not names: return
+        self.request_id += 1
+        try:
+            await conn.ws.send(json.dumps({"method": method, "params": sorted(names), "id": self.request_id}))
+        except Exception as e:
+            print(f"[WARNING] WS {method} 发送失败, 等重连后补齐: {e}")
+
+    async def _consume(self, conn):
+        backoff = 1
+        while self.running:
+            subscribed = set(conn.streams)
+            try:
+                async with websockets.connect(self._url(subscribed), ping_interval=20, max_size=None) as ws:
+                    backoff = 1
+                    self.connects += 1
+                    conn.ws = ws
+                    # 连接建立期间订阅集合可能又变了
+                    await self._send(conn, "UNSUBSCRIBE", subscribed - conn.streams)
+                    await self._send(conn, "SUBSCRIBE", conn.streams - subscribed)
+                    async for raw in ws:
+                        self.messages += 1
+                        msg = json.loads(raw)
+                        # 退订前已经在路上的推送
+                        if msg.get("stream") and msg["stream"] not in conn.streams: continue
+                        ev = parse_kline_event(msg)
+                        if ev is None: continue
+                        symbol, interval, row, is_closed = ev
+                        kind = self.store.update(symbol, interval, row)
+                        if kind == "stale": continue
+                        try:
+                            self.on_bar(symbol, interval, kind, is_closed)
+                        except Exception as e:
+                            print(f"[ERROR] on_bar {symbol} {interval}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARNING] WS 断开, {backoff}s 后重连: {e}")
+            finally:
+                conn.ws = None
+            # 服务端正常关闭也按断线处理, 指数退避重连
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
@@ -0,0 +1,162 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from .http_client import metrics as http_metrics
+
+# 秒; 从单次 pandas 计算 (毫秒级) 到整轮扫描 (几十秒) 都能落进有意义的桶
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items: return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Telemetry:
+    """
+    V2.3 进程内指标: 计数器 + 耗时直方图 + 取值回调 (gauge), render() 输出 Prometheus 文本格式。
+    指标名统一加 prefix, 计数器以 _total 结尾, 耗时以 _seconds 结尾; 标签用关键字参数传。
+    http_client.metrics 里的请求/重试/429/等待计数一并输出为 <prefix>_http_*_total。
+    """
+    def __init__(self, prefix="scanner"):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None: h = self.histograms[key] = Histogram()
+            h.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def gauge(self, name, fn):
+        """fn() 返回数值, 或 {((标签, 值), ...): 数值}; 只在 render 时调用"""
+        self.gauges[name] = fn
+
+    def render(self):
+        p = self.prefix
+        out = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            hists = sorted((k, (list(h.counts), h.sum, h.count, h.buckets)) for k, h in self.histograms.items())
+        for (name, labels), value in counters:
+            out.append(f"{p}_{name}_total{_labels(labels)} {value:g}")
+        for name, value in sorted(http_metrics.snapshot().items()):
+            out.append(f"{p}_http_{name}_total {value:g}")
+        for (name, labels), (counts, total, count, buckets) in hists:
+            acc = 0
+            for b, c in zip(buckets, counts):
+                acc += c
+                out.append(f"{p}_{name}_seconds_bucket{_labels(labels, ('le', f'{b:g}'))} {acc}")
+            out.append(f"{p}_{name}_seconds_bucket{_labels(labels, ('le', '+Inf'))} {count}")
+            out.append(f"{p}_{name}_seconds_sum{_labels(labels)} {total:.6f}")
+            out.append(f"{p}_{name}_seconds_count{_labels(labels)} {count}")
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    out.append(f"{p}_{name}{_labels(labels)} {v:g}")
+            else:
+                out.append(f"{p}_{name} {value:g}")
+        return "\n".join(out) + "\n"
+
+
+# 同一进程共用一份 (scanner / writer / journal / notifier 都往这里记)
+telemetry = Telemetry()
+
+
+class RoundProfiler:
+    """
+    V2.3 慢轮采样: 每轮开始时起一个采样线程, 每 interval 秒抓一次所有线程的调用栈;
+    本轮耗时超过 threshold 秒就把栈样本按 folded 格式 (flamegraph.pl / speedscope 可直接读) 写到 directory,
+    否则丢弃。最多保留 keep 个文件。停在 Condition.wait 上的空闲线程 (队列/Event 等待) 不计入。
+    """
+    def __init__(self, threshold, interval=0.01, directory="profiles", keep=20):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+        self.samples = Counter()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running: return
+        self.samples = Counter()
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+
+    def stop(self, scan_round, elapsed):
+        """结束本轮采样; 慢轮返回写出的文件路径, 否则 None"""
+        if not self.running: return None
+        self.running = False
+        self.thread.join(1)
+        if elapsed < self.threshold or not self.samples: return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"round-{scan_round}-{int(time.time())}-{elapsed:.1f}s.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        files = sorted((os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".folded")),
+                       key=os.path.getmtime)
+        for old in files[:-self.keep]: os.remove(old)
+        return path
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {}
+        while self.running:
+            for t in threading.enumerate(): names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (frame.f_code.co_name == "wait" and frame.f_code.co_filename.endswith("threading.py")):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
@@ -0,0 +1,115 @@
+import time
+
+
+def parse_tickers(rows, quote="USDT", exclude=(), min_quote_vol=0.0):
+    """
+    /fapi/v1/ticker/24hr 全市场快照 -> [(symbol, 最新价, 24h 涨跌幅(小数), 24h 成交额)],
+    按计价币种 / 黑名单 / 最低成交额过滤。
+    """
+    out = []
+    for item in rows:
+        sym = item.get('symbol', '')
+        if not sym.endswith(quote) or sym in exclude: continue
+        try:
+            price = float(item['lastPrice'])
+            change = float(item['priceChangePercent']) / 100
+            quote_vol = float(item['quoteVolume'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if quote_vol < min_quote_vol or price <= 0: continue
+        out.append((sym, price, change, quote_vol))
+    return out
+
+
+class TierScheduler:
+    """
+    V2.3 分层调度: 每个币种归入 hot / warm / cold 三层, 各层按自己的间隔扫描。
+    分层只靠便宜的全市场快照 (一次 /ticker/24hr) 更新:
+      - hot : 关注列表 / 排行榜热度高 / 两次快照之间价格跳动大 / 24h 大涨大跌且成交额大
+      - warm: 有热度 / 快照间小幅异动 / 24h 波动达到备用选币标准
+      - cold: 其余满足成交额门槛的币种
+    升层立即生效, 降层要等 hold 秒内都没再满足条件, 避免来回抖动。
+    本身不加锁, 由调用方保证串行访问 (run_scan 同一时间只有一个实例)。
+    """
+    TIERS = ("hot", "warm", "cold")
+
+    def __init__(self, intervals=None, snapshot_interval=30, hold=300,
+                 hot_move=0.01, warm_move=0.003, hot_heat=50.0, warm_heat=5.0,
+                 hot_change=0.08, hot_quote_vol=50_000_000, warm_change=0.05, warm_quote_vol=30_000_000):
+        self.intervals = {"hot": 10, "warm": 60, "cold": 600, **(intervals or {})}
+        self.snapshot_interval = snapshot_interval
+        self.hold = hold
+        self.hot_move, self.warm_move = hot_move, warm_move
+        self.hot_heat, self.warm_heat = hot_heat, warm_heat
+        self.hot_change, self.hot_quote_vol = hot_change, hot_quote_vol
+        self.warm_change, self.warm_quote_vol = warm_change, warm_quote_vol
+
+        self.tiers = {}       # symbol -> 当前层
+        self.promoted = {}    # symbol -> (层, 最近一次满足该层条件的时间)
+        self.prices = {}      # symbol -> 上一次快照的价格
+        self.last_scan = {}   # symbol -> 上次被调度扫描的时间
+        self.snapshot_at = 0.0
+
+    def __len__(self):
+        return len(self.tiers)
+
+    def stale(self, now=None):
+        now = time.time() if now is None else now
+        return now - self.snapshot_at >= self.snapshot_interval
+
+    def classify(self, symbol, price, change, quote_vol, heat=0.0, watched=False):
+        prev = self.prices.get(symbol)
+        move = abs(price / prev - 1) if prev else 0.0
+        if (watched or heat >= self.hot_heat or move >= self.hot_move
+                or (abs(change) >= self.hot_change and quote_vol >= self.hot_quote_vol)):
+            return "hot"
+        if (heat >= self.warm_heat or move >= self.warm_move
+                or (abs(change) >= self.warm_change and quote_vol >= self.warm_quote_vol)):
+            return "warm"
+        return "cold"
+
+    def update(self, tickers, heat=None, watchlist=(), now=None):
+        """用一次全市场快照 (parse_tickers 的结果) 重新分层; 不在快照里的币种移出调度"""
+        now = time.time() if now is None else now
+        heat = heat or {}
+        tiers = {}
+        for sym, price, change, quote_vol in tickers:
+            tier = self.classify(sym, price, change, quote_vol, heat.get(sym, 0.0), sym in watchlist)
+            rank = self.TIERS.index(tier)
+            held, since = self.promoted.get(sym, ("cold", 0.0))
+            if rank <= self.TIERS.index(held) or now - since >= self.hold:
+                self.promoted[sym] = (tier, now)
+            else:
+                tier = held  # 降层缓冲期内保持原层
+            tiers[sym] = tier
+            self.prices[sym] = price
+
+        for sym in set(self.tiers) - set(tiers):
+            self.promoted.pop(sym, None)
+            self.prices.pop(sym, None)
+            self.last_scan.pop(sym, None)
+        self.tiers = tiers
+        self.snapshot_at = now
+        return self.counts()
+
+    def due(self, now=None):
+        """到期该扫描的币种 (hot 在前), 同时记为已调度"""
+        now = time.time() if now is None else now
+        out = []
+        for tier in self.TIERS:
+            interval = self.intervals[tier]
+            for sym, t in self.tiers.items():
+                if t != tier: continue
+                last = self.last_scan.get(sym)
+                if last is None or now - last >= interval:  # 新进入调度的币种立即扫一次
+                    out.append(sym)
+                    self.last_scan[sym] = now
+        return out
+
+    def members(self, *tiers):
+        return [s for s, t in self.tiers.items() if t in tiers]
+
+    def counts(self):
+        out = dict.fromkeys(self.TIERS, 0)
+        for t in self.tiers.values(): out[t] += 1
+        return out
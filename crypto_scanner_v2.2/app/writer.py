@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlmodel import Session
+
+from .models import SystemStatus
+from .telemetry import telemetry
+
+# 一批写入失败后最多重试几次, 之后丢弃 (避免坏数据卡死整个队列)
+MAX_ATTEMPTS = 3
+
+
+class DbWriter:
+    """
+    V2.3 单线程 write-behind 写库: ScanResult / SystemLog 先进队列,
+    每 flush_ms 毫秒 (或攒够 max_batch 条, 或调用 flush) 合并成一个事务提交。
+    心跳只保留最新一次, 跟着同一个事务写入。
+    """
+    def __init__(self, engine, flush_ms=500, max_batch=500):
+        self.engine = engine
+        self.flush_interval = flush_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.pending_heartbeat = None
+        self.lock = threading.Lock()
+        self.running = True
+        self.commits = 0
+        self.rows = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, obj):
+        self.queue.put(obj)
+
+    def heartbeat(self, scan_round):
+        with self.lock:
+            self.pending_heartbeat = (datetime.now(), scan_round)
+        self.queue.put(None)  # 唤醒写线程
+
+    def flush(self, timeout=5):
+        """阻塞到目前为止入队的数据全部提交"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=10):
+        """关闭时调用: 把队列里剩下的全部落盘后退出"""
+        if not self.running: return
+        self.flush(timeout)
+        self.running = False
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        retry = []
+        while self.running or not self.queue.empty():
+            batch, waiters = list(retry), []
+            retry = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                if item is not None:
+                    batch.append([item, 0])
+
+            with self.lock:
+                hb, self.pending_heartbeat = self.pending_heartbeat, None
+            if batch or hb:
+                try:
+                    with telemetry.timer("db_commit"):
+                        self._commit([obj for obj, _ in batch], hb)
+                except Exception as e:
+                    telemetry.inc("errors", where="db_commit")
+                    print(f"[ERROR] DbWriter commit failed ({len(batch)} rows): {e}")
+                    retry = [[obj, n + 1] for obj, n in batch if n + 1 < MAX_ATTEMPTS]
+                    if hb:
+                        with self.lock:
+                            self.pending_heartbeat = self.pending_heartbeat or hb
+            for w in waiters: w.set()
+
+    def _commit(self, objs, hb):
+        # expire_on_commit=False: 提交后调用方线程还要读这些对象的字段
+        with Session(self.engine, expire_on_commit=False) as session:
+            session.add_all(objs)
+            if hb:
+                st = session.get(SystemStatus, 1) or SystemStatus(id=1, last_heartbeat=hb[0])
+                st.last_heartbeat = hb[0]
+                st.scan_round = hb[1]
+                session.add(st)
+            session.commit()
+        self.commits += 1
+        self.rows += len(objs)
+        telemetry.inc("db_rows", len(objs))
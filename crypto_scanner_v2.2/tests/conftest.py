@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# scanner 的 sqlite / 信号日志都是相对路径, 整个测试会话在临时目录里跑;
+# 必须在 import app.scanner 之前设置 (load_dotenv 不覆盖已有的环境变量)
+os.environ.update(TG_BOT_TOKEN="", STREAM_MODE="0", PROFILE_SLOW_ROUND_SECONDS="0",
+                  MARKET_CAPTURE="", MARKET_REPLAY="")
+os.chdir(tempfile.mkdtemp(prefix="scanner_tests_"))
+
+
+def wait_for(cond, timeout=5.0):
+    """后台线程 (推送 / 发送 / 写库) 的结果轮询等待"""
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond(): return True
+        time.sleep(0.02)
+    return cond()
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.database import create_db_and_tables
+    from app.scanner import scanner
+    create_db_and_tables()
+    yield scanner
+    scanner.shutdown()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+
+def kline_event(symbol, interval, row, closed):
+    """REST 格式的 K线行 -> Binance combined stream 的 kline 推送"""
+    return {
+        "stream": f"{symbol.lower()}@kline_{interval}",
+        "data": {"e": "kline", "E": int(row[6]), "s": symbol, "k": {
+            "t": int(row[0]), "T": int(row[6]), "s": symbol, "i": interval,
+            "o": str(row[1]), "h": str(row[2]), "l": str(row[3]), "c": str(row[4]), "v": str(row[5]),
+            "n": 0, "x": closed, "q": "0", "V": "0", "Q": "0",
+        }},
+    }
+
+
+class FakeBinanceWS:
+    """
+    本地假 fstream: /stream?streams=a/b 建连, 支持 SUBSCRIBE / UNSUBSCRIBE, replay() 把录制的 K线
+    按时间顺序推给订阅了对应 stream 的连接。后台线程跑自己的事件循环, 方法可以在测试线程里直接调用。
+    """
+    def __init__(self):
+        self.conns = {}      # 连接 -> 订阅集合
+        self.requests = []   # 收到的 SUBSCRIBE / UNSUBSCRIBE
+        self.connects = 0
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        self.url = None
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        self.server = self._call(self._serve())
+        self.url = f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.close()
+        self._call(self.server.wait_closed())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(10)
+
+    async def _serve(self):
+        return await websockets.serve(self._handler, "127.0.0.1", 0)
+
+    async def _handler(self, ws, path=None):
+        path = path or getattr(getattr(ws, "request", None), "path", None) or ws.path
+        streams = parse_qs(urlsplit(path).query).get("streams", [""])[0]
+        self.conns[ws] = {s for s in streams.split("/") if s}
+        self.connects += 1
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                self.requests.append(msg)
+                names = set(msg.get("params", []))
+                if msg["method"] == "SUBSCRIBE": self.conns[ws] |= names
+                elif msg["method"] == "UNSUBSCRIBE": self.conns[ws] -= names
+                await ws.send(json.dumps({"result": None, "id": msg["id"]}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.conns.pop(ws, None)
+
+    def subscribed(self):
+        """所有连接当前订阅的 stream 并集"""
+        return self._call(self._subscribed())
+
+    async def _subscribed(self):
+        return set().union(*self.conns.values())
+
+    def replay(self, bars):
+        """bars: [(symbol, interval, REST 格式的行, 是否收盘), ...], 按给定顺序推送, 返回实际推出的条数"""
+        return self._call(self._replay(bars))
+
+    async def _replay(self, bars):
+        sent = 0
+        for symbol, interval, row, closed in bars:
+            ev = kline_event(symbol, interval, row, closed)
+            for ws, streams in list(self.conns.items()):
+                if ev["stream"] in streams:
+                    await ws.send(json.dumps(ev))
+                    sent += 1
+        return sent
+
+    def drop_all(self):
+        """服务端主动断开所有连接, 用来测重连"""
+        async def close():
+            for ws in list(self.conns): await ws.close()
+        self._call(close())
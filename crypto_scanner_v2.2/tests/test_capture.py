@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app import capture as market
+from app.http_client import limiter_for
+
+SYMBOLS = ["AAAUSDT", "BBBUSDT", "CCCUSDT", "DDDUSDT"]
+# 第几轮哪个币种出现 180s 异动 (3 根 1m 内涨跌 5%)
+SHOCKS = {1: {"AAAUSDT": 1.05}, 2: {"BBBUSDT": 0.95, "CCCUSDT": 1.06}, 3: {"DDDUSDT": 1.05}}
+
+
+class BinanceStub:
+    """本地假 fapi: 行情随 round 变化 (由测试在每轮扫描前设置), 只实现扫描一轮会调用的接口"""
+    def __init__(self):
+        self.round = 0
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                u = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(u.query).items()}
+                data = json.dumps(stub.respond(u.path, q)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def price(self, symbol):
+        return SHOCKS.get(self.round, {}).get(symbol, 1.0)
+
+    def respond(self, path, q):
+        if path.endswith("/ticker/24hr"):
+            # 24h 大涨且成交额大: 全部进 hot 层
+            return [{"symbol": s, "lastPrice": str(self.price(s)), "priceChangePercent": "10",
+                     "quoteVolume": "100000000"} for s in SYMBOLS]
+        if path.endswith("/ticker/price"):
+            return [{"symbol": s, "price": str(self.price(s))} for s in SYMBOLS]
+        if path.endswith("/klines"):
+            step = 60_000 if q["interval"] == "1m" else 900_000
+            n, end = int(q["limit"]), 1_700_000_000_000 + self.round * step
+            last = self.price(q["symbol"])
+            rows = []
+            for i in range(n):
+                # 最后 3 根从 1.0 线性走到本轮价格, 之前走平
+                k = max(0, i - (n - 4))
+                c, o = 1.0 + (last - 1.0) * k / 3, 1.0 + (last - 1.0) * max(0, k - 1) / 3
+                t = end - (n - i) * step
+                rows.append([t, str(o), str(max(o, c)), str(min(o, c)), str(c), "100", t + step - 1,
+                             "0", 10, "0", "0", "0"])
+            return rows
+        return {}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def new_engine(monkeypatch, tmp_path, name, url):
+    from app.scanner import ScannerEngine
+    monkeypatch.setenv("JOURNAL_DIR", str(tmp_path / name))
+    engine = ScannerEngine()
+    engine.base_url = url
+    engine.tiers.intervals = {"hot": 0.05, "warm": 0.05, "cold": 0.05}
+    engine.tiers.snapshot_interval = 0.15
+    hits = []
+    handle = engine.handle_result
+
+    def collect(res):
+        # 录制文件里的 tick 时间精确到毫秒
+        hits.append((round(engine.tick_time, 3), res.symbol, res.rule_name, res.score))
+        handle(res)
+    engine.handle_result = collect
+    return engine, hits
+
+
+@pytest.fixture
+def restore_capture():
+    yield
+    market.configure(None, None)
+
+
+def test_recorded_rounds_replay_to_identical_hits(engine, monkeypatch, tmp_path, restore_capture):
+    """录制几轮真实扫描 (本地假 fapi), 换一个全新的 ScannerEngine 离线回放, 命中必须完全一致"""
+    log = str(tmp_path / "scan.jsonl.gz")
+    stub = BinanceStub()
+    lim = limiter_for(urlparse(stub.url).netloc)
+    lim.capacity = lim.tokens = lim.rate = 1e12
+
+    market.configure("record", log)
+    recorder, recorded = new_engine(monkeypatch, tmp_path, "rec", stub.url)
+    try:
+        for r in range(5):
+            stub.round = r
+            recorder.run_scan()
+            time.sleep(0.1)
+    finally:
+        recorder.shutdown()
+        market.capture.close()
+        stub.close()
+    assert {h[1] for h in recorded} == {s for shocks in SHOCKS.values() for s in shocks}
+
+    # 回放: 假服务器已经关掉, 所有响应都只能来自录制文件
+    requests_before = stub.requests
+    cap = market.configure("replay", log)
+    replayer, replayed = new_engine(monkeypatch, tmp_path, "rep", stub.url)
+    try:
+        ticks = cap.ticks()
+        assert len(ticks) == 5
+        for t in ticks:
+            replayer.run_scan(now=t)
+    finally:
+        replayer.shutdown()
+    # 同一轮内的命中按异步拉取的完成顺序产生, 顺序不固定; 按 (tick, 币种, ...) 排序后逐轮比较
+    assert sorted(replayed) == sorted(recorded)
+    assert replayer.scan_round == recorder.scan_round
+    assert cap.stats["missed"] == 0 and cap.stats["replayed"] > 0
+    assert stub.requests == requests_before
@@ -0,0 +1,38 @@
+import time
+
+from app.events import EventHub, hub
+from app.leaderboard import Leaderboard
+
+
+def test_publish_board_recomputes_and_drops_stale_rows(engine, monkeypatch):
+    """定时整表推送: 热度按当前时间衰减, 超过 stale 没命中的币种不在表里, 快照版本号递增"""
+    published = []
+    monkeypatch.setattr(EventHub, "count", property(lambda self: 1))
+    monkeypatch.setattr(hub, "publish", lambda event, data: published.append((event, data)))
+    board = Leaderboard(stale=3600)
+    monkeypatch.setattr(engine, "leaderboard", board)
+    now = time.time()
+    board.update("OLDUSDT", 90, "飙升 5.0% (180s)", 0.05, ts=now - 7200)
+    board.update("NEWUSDT", 90, "飙升 5.0% (180s)", 0.05, ts=now - 1800)
+    for _ in range(20):
+        board.update("HOTUSDT", 95, "飙升 8.0% (180s)", 0.08, ts=now)
+
+    version = engine.version
+    engine.publish_board()
+    assert engine.version == version + 1
+    (event, data), = published
+    assert event == "board"
+    rows = {c["symbol"]: c for c in data["hot_list"]}
+    assert set(rows) == {"HOTUSDT", "NEWUSDT"}
+    assert rows["NEWUSDT"]["heat"] < 46                      # 半衰期 30 分钟: 90 -> 45
+    assert rows["NEWUSDT"]["hits_5m"] == 0 and rows["NEWUSDT"]["hits_1h"] == 1
+    assert all(0 <= c["heat_score"] <= 100 for c in rows.values())
+    assert rows["HOTUSDT"]["heat_score"] > rows["NEWUSDT"]["heat_score"]
+
+
+def test_publish_board_without_clients_only_bumps_version(engine, monkeypatch):
+    published = []
+    monkeypatch.setattr(hub, "publish", lambda event, data: published.append(event))
+    version = engine.version
+    engine.publish_board()
+    assert engine.version == version + 1 and published == []
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.models import ScanResult
+from app.notifier import MAX_MESSAGE_CHARS, TelegramNotifier
+from conftest import wait_for
+
+
+class TelegramStub:
+    """本地假 Telegram Bot API: 记下每次 sendMessage, 按 script 依次返回 (状态码, 响应体), 用完后一直 200"""
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.calls.append((time.monotonic(), self.path, body))
+                status, payload = stub.script.pop(0) if stub.script else (200, {"ok": True, "result": {}})
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def texts(self):
+        return [body["text"] for _, _, body in self.calls]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    s = TelegramStub()
+    yield s
+    s.close()
+
+
+def hit(symbol="AAAUSDT", score=80, tags="⚡180s异动", rule="急速拉升 3.5%"):
+    return ScanResult(symbol=symbol, price=1.0, change_percent=0.035, vol_ratio=0,
+                      rule_name=rule, score=score, evo_state="🚀", tags=tags)
+
+
+def test_cooldown_suppresses_repeats(stub):
+    n = TelegramNotifier("TOKEN", "42", api_url=stub.url, cooldown=600, flush_seconds=60)
+    assert n.notify(hit())
+    assert not n.notify(hit(score=90))          # 同一币种同一规则, 冷却期内
+    assert n.notify(hit(tags="高胜率"))          # 规则不同
+    assert n.notify(hit(symbol="BBBUSDT"))
+    n.stop()
+    assert n.stats["queued"] == 3 and n.stats["suppressed"] == 1
+    assert len(stub.calls) == 1 and stub.calls[0][1] == "/botTOKEN/sendMessage"
+    assert stub.calls[0][2]["chat_id"] == "42"
+
+
+def test_flush_sends_one_digest_per_round(stub):
+    n = TelegramNotifier("TOKEN", "42", api_url=stub.url, flush_seconds=60)
+    for i, sym in enumerate(["AAAUSDT", "BBBUSDT", "CCCUSDT"]):
+        n.notify(hit(symbol=sym, score=70 + i))
+    n.flush()
+    assert wait_for(lambda: len(stub.calls) == 1)
+    lines = stub.texts()[0].split("\n")
+    assert lines[0] == "🚨 本轮 3 个信号"
+    assert [l.split("</b>")[0][-7:] for l in lines[1:]] == ["CCCUSDT", "BBBUSDT", "AAAUSDT"]  # 按分数排序
+
+    n.notify(hit(symbol="DDDUSDT"))
+    n.flush()
+    assert wait_for(lambda: len(stub.calls) == 2)
+    assert stub.texts()[1].startswith("🚨 <b>DDDUSDT</b>")  # 单条命中用完整格式
+    n.stop()
+    assert n.stats["messages"] == 2
+
+
+def test_429_waits_retry_after():
+    stub = TelegramStub(script=[(429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                       "parameters": {"retry_after": 1}})])
+    try:
+        n = TelegramNotifier("TOKEN", "42", api_url=stub.url)
+        n.notify(hit())
+        n.flush()
+        assert wait_for(lambda: n.stats["messages"] == 1, timeout=10)
+        n.stop()
+    finally:
+        stub.close()
+    (t1, _, first), (t2, _, second) = stub.calls
+    assert first == second                      # 同一条消息重发, 没有重复投递
+    assert t2 - t1 >= 0.95                      # 按 retry_after 等待
+    assert n.stats["retries"] == 1 and n.stats["dropped"] == 0
+
+
+def test_digest_counts_header_in_message_size():
+    n = TelegramNotifier("TOKEN", "42", api_url="http://127.0.0.1:9")
+    n.stop()
+    base = len(n.format_line(hit(symbol="S000USDT", rule="")))
+    # 每行 99 字符 + 换行: 不算表头时 40 行正好 4000 字符, 加上表头就超限
+    items = [hit(symbol=f"S{i:03d}USDT", rule="x" * (99 - base)) for i in range(120)]
+    assert {len(n.format_line(r)) for r in items} == {99}
+    messages = n.digest(items)
+    assert all(len(m) <= MAX_MESSAGE_CHARS for m in messages)
+    assert sum(len(m.split("\n")) for m in messages) == 121   # 所有行都发出去了, 表头只出现一次
+    assert messages[0].startswith("🚨 本轮 120 个信号")
+
+
+def test_429_waits_only_retry_after():
+    """连续两次 429 且没有 Retry-After 头: 只按 retry_after 等, 共用的 host 退避 (2**n) 不再叠加一遍"""
+    from app.http_client import backoff
+    limited = (429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 0.2}})
+    stub = TelegramStub(script=[limited, limited])
+    try:
+        n = TelegramNotifier("TOKEN", "42", api_url=stub.url)
+        n.notify(hit())
+        n.flush()
+        assert wait_for(lambda: n.stats["messages"] == 1, timeout=10)
+        n.stop()
+    finally:
+        stub.close()
+    times = [t for t, _, _ in stub.calls]
+    assert len(times) == 3
+    assert 0.35 <= times[-1] - times[0] < 1.5
+    host = stub.url.split("//")[1]
+    assert backoff.wait_time(host) == 0 and host not in backoff.failures
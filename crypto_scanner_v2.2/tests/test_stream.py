@@ -0,0 +1,157 @@
+import pytest
+
+from app.stream import BarStore, KlineStream
+from conftest import wait_for
+from fake_ws import FakeBinanceWS
+
+MIN = 60_000
+T0 = 1_700_000_000_000 // (15 * MIN) * (15 * MIN)
+
+
+def bar(t, o, c, interval_ms=MIN):
+    return [t, o, max(o, c), min(o, c), c, 100.0, t + interval_ms - 1, "0", 0, "0", "0", "0"]
+
+
+def flat_15m(n=50):
+    return [bar(T0 - (n - i) * 15 * MIN, 1.0, 1.0, 15 * MIN) for i in range(n)]
+
+
+def shock_1m(symbol):
+    """最近 3 根 1m 从 1.0 拉到 1.05: 超过 180s 异动阈值 (3%)"""
+    closes = [1.0, 1.0, 1.02, 1.035, 1.05]
+    rows, o = [], 1.0
+    for i, c in enumerate(closes):
+        rows.append(bar(T0 + i * MIN, o, c))
+        o = c
+    return [(symbol, "1m", r, i < len(rows) - 1) for i, r in enumerate(rows)]
+
+
+@pytest.fixture
+def stream_engine(engine, monkeypatch):
+    """engine 开流模式连到本地假服务器; REST 一律报错, 推送路径里任何 REST 调用都会被记下来"""
+    rest = []
+
+    def no_rest(url, *a, **kw):
+        rest.append(url)
+        raise AssertionError(f"REST call from stream path: {url}")
+
+    monkeypatch.setattr(engine.http, "get", no_rest)
+    monkeypatch.setattr(engine, "get_active_symbols", lambda: ["AAAUSDT", "BBBUSDT"])
+    monkeypatch.setattr(engine, "seed_bars", lambda symbols: None)
+    hits = []
+    monkeypatch.setattr(engine, "handle_result", hits.append)
+    engine.last_hit.clear()
+    engine.last_eval.clear()
+    with FakeBinanceWS() as srv:
+        engine.start_stream(url=srv.url)
+        assert wait_for(lambda: len(srv.subscribed()) == 4)
+        yield engine, srv, hits, rest
+        engine.stop_stream()
+    engine.bar_store.drop("AAAUSDT")
+    engine.bar_store.drop("BBBUSDT")
+    engine.indicators.clear()
+
+
+def test_stream_fills_bar_store():
+    """推送的 K线写进 BarStore: 新开一根 / 原地修正 / 过期丢弃"""
+    store, events = BarStore(maxlen=3), []
+    with FakeBinanceWS() as srv:
+        ks = KlineStream(store, lambda *a: events.append(a), intervals=("1m",), url=srv.url)
+        ks.start(["AAAUSDT"])
+        assert wait_for(lambda: srv.subscribed() == {"aaausdt@kline_1m"})
+        sent = srv.replay([
+            ("AAAUSDT", "1m", bar(T0, 1.0, 1.1), False),
+            ("AAAUSDT", "1m", bar(T0, 1.0, 1.2), True),
+            ("AAAUSDT", "1m", bar(T0 + MIN, 1.2, 1.3), False),
+            ("AAAUSDT", "1m", bar(T0 - MIN, 1.0, 1.0), True),
+            ("BBBUSDT", "1m", bar(T0, 1.0, 1.0), False),  # 没订阅, 服务器不会推
+        ])
+        assert sent == 4
+        assert wait_for(lambda: len(events) == 3)
+        ks.stop()
+    assert [e[2] for e in events] == ["new", "revise", "new"]
+    assert store.count("AAAUSDT", "1m") == 2
+    assert store.last("AAAUSDT", "1m")[4] == 1.3
+    assert store.get_df("AAAUSDT", "1m")["c"].tolist() == [1.2, 1.3]
+
+
+def test_stream_resubscribes_without_reconnect():
+    """订阅列表变化走 SUBSCRIBE / UNSUBSCRIBE, 不重新建连; 服务端断开后按当前集合重连"""
+    with FakeBinanceWS() as srv:
+        ks = KlineStream(BarStore(), lambda *a: None, intervals=("1m",), url=srv.url)
+        ks.start(["AAAUSDT", "BBBUSDT"])
+        assert wait_for(lambda: srv.subscribed() == {"aaausdt@kline_1m", "bbbusdt@kline_1m"})
+        ks.set_symbols(["BBBUSDT", "CCCUSDT"])
+        assert wait_for(lambda: srv.subscribed() == {"bbbusdt@kline_1m", "cccusdt@kline_1m"})
+        assert srv.connects == 1
+        assert sorted(r["method"] for r in srv.requests) == ["SUBSCRIBE", "UNSUBSCRIBE"]
+        srv.drop_all()
+        assert wait_for(lambda: srv.connects == 2 and srv.subscribed() == {"bbbusdt@kline_1m", "cccusdt@kline_1m"})
+        ks.stop()
+
+
+def test_on_bar_update_detects_from_pushed_bars(stream_engine):
+    """录制的 1m 推送驱动 180s 异动检测, 15m 推送驱动趋势检测; 全程不走 REST"""
+    engine, srv, hits, rest = stream_engine
+    engine.bar_store.seed("AAAUSDT", "15m", flat_15m())
+    srv.replay(shock_1m("AAAUSDT") + [("AAAUSDT", "15m", bar(T0, 1.0, 1.0, 15 * MIN), False)])
+    assert wait_for(lambda: any(h.symbol == "AAAUSDT" and "180s" in h.tags for h in hits))
+    assert wait_for(lambda: "AAAUSDT" in engine.indicators)
+    assert engine.bar_store.count("AAAUSDT", "1m") == 5
+    assert rest == []
+
+
+def test_on_bar_update_skips_unseeded_symbols(stream_engine):
+    """K线还没补齐的币种: 跳过检测, 不在推送路径里补拉 REST"""
+    engine, srv, hits, rest = stream_engine
+    srv.replay([("BBBUSDT", "15m", bar(T0, 1.0, 1.0, 15 * MIN), True),
+                ("BBBUSDT", "1m", bar(T0, 1.0, 1.2), True)])
+    assert wait_for(lambda: engine.bar_store.count("BBBUSDT", "1m") == 1)
+    engine.stream_executor.submit(lambda: None).result(5)  # 等检测线程把已投递的任务跑完
+    assert "BBBUSDT" not in engine.indicators
+    assert hits == [] and rest == []
+
+
+def test_stream_detect_applies_every_bar_since_last_update(engine, monkeypatch):
+    """排队期间上一根收盘修正 + 新开一根都进了 BarStore: 指标状态要和 BarStore 整段重算的结果一致"""
+    from app.indicators import IndicatorState
+    monkeypatch.setattr(engine, "handle_result", lambda res: None)
+    sym, step = "CCCUSDT", 15 * MIN
+    rows = [bar(T0 - (30 - i) * step, 1.0 + i * 0.01, 1.0 + (i + 1) * 0.01, step) for i in range(30)]
+    engine.bar_store.seed(sym, "15m", rows)
+    try:
+        engine.stream_detect(sym, "15m", 0)
+        assert engine.indicators[sym].last_t == rows[-1][0]
+
+        # 最后一根的收盘修正和下一根的第一次推送, 检测只轮到一次
+        engine.bar_store.update(sym, "15m", bar(rows[-1][0], rows[-1][1], 0.7, step))
+        engine.bar_store.update(sym, "15m", bar(T0, 0.7, 0.75, step))
+        engine.stream_detect(sym, "15m", 0)
+
+        want = IndicatorState.from_df(engine.bar_store.get_df(sym, "15m", 50)).values()
+        got = engine.indicators[sym].values()
+        assert engine.indicators[sym].last_t == T0
+        assert got == pytest.approx(want, nan_ok=True)
+    finally:
+        engine.bar_store.drop(sym)
+        engine.indicators.pop(sym, None)
+
+
+def test_signal_journal_only_records_hits_past_cooldown(engine, monkeypatch):
+    """同一个持续的异动在冷却窗口里被反复检测到: 信号日志只记冷却通过的那一次"""
+    rows = []
+    monkeypatch.setattr(engine.journal, "add", rows.append)
+    monkeypatch.setattr(engine.writer, "add", lambda res: None)
+    monkeypatch.setattr(engine, "update_leaderboard", lambda res: None)
+    monkeypatch.setattr(engine, "send_telegram", lambda res: None)
+    sym = "DDDUSDT"
+    engine.bar_store.seed(sym, "1m", [r for _, _, r, _ in shock_1m(sym)])
+    engine.last_hit.clear()
+    try:
+        for now in (1000, 1005, 1010):
+            engine.stream_detect(sym, "1m", now)
+        assert len(rows) == 1
+        assert rows[0][1] == sym and rows[0][6] == 5.0  # change_180s 跟着命中一起写
+    finally:
+        engine.bar_store.drop(sym)
+        engine.last_hit.clear()
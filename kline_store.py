@@ -0,0 +1,254 @@
+# kline_store.py
+# Local kline warehouse for the backtest scripts.
+#
+# Layout (one Parquet file per symbol / interval / UTC day):
+#   <root>/<SYMBOL>/<interval>/2025-12-18.parquet
+#   <root>/<SYMBOL>/<interval>/_coverage.json   # merged [start, end) open_time spans already fetched
+#
+# Coverage is tracked separately from the data so that spans with no bars
+# (before listing, delistings, exchange gaps) are not re-requested every run.
+# Only closed bars are stored: coverage never extends past the bar that is
+# still open at fetch time.
+#
+# Requires pyarrow (pinned in requirements-backtest.txt).
+
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": DAY_MS,
+}
+
+COLUMNS = ["open_time", "open", "high", "low", "close", "volume", "close_time",
+           "qav", "num_trades", "tbbav", "tbqav", "ignore"]
+FLOAT_COLS = ["open", "high", "low", "close", "volume", "qav", "tbbav", "tbqav"]
+INT_COLS = ["open_time", "close_time", "num_trades"]
+
+
+def empty_frame():
+    df = pd.DataFrame({c: pd.Series(dtype="float64") for c in COLUMNS})
+    for c in INT_COLS:
+        df[c] = df[c].astype("int64")
+    return df
+
+
+def normalize(df):
+    """Cast to the stored dtypes, dedup on open_time (last write wins) and sort."""
+    if df is None or df.empty:
+        return empty_frame()
+    df = df.reindex(columns=COLUMNS)
+    for c in FLOAT_COLS + ["ignore"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+    for c in INT_COLS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+    return df.drop_duplicates("open_time", keep="last").sort_values("open_time").reset_index(drop=True)
+
+
+class KlineArrays:
+    """
+    Contiguous NumPy columns of a sorted kline frame with a binary-search bar index.
+    view()/window() slice without copying, so per-trade lookups are O(log n) and allocation-free.
+    """
+    FIELDS = ("open_time", "close_time", "open", "high", "low", "close", "volume")
+
+    def __init__(self, open_time, close_time, open, high, low, close, volume):
+        self.open_time = open_time
+        self.close_time = close_time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_frame(cls, df):
+        cols = []
+        for c in cls.FIELDS:
+            dtype = "int64" if c.endswith("_time") else "float64"
+            cols.append(np.ascontiguousarray(df[c].to_numpy(dtype=dtype)))
+        return cls(*cols)
+
+    def __len__(self):
+        return len(self.open_time)
+
+    @property
+    def empty(self):
+        return len(self.open_time) == 0
+
+    def bar_at(self, t):
+        """Index of the bar with open_time <= t < close_time, or -1."""
+        i = int(self.open_time.searchsorted(t, side="right")) - 1
+        return i if i >= 0 and self.close_time[i] > t else -1
+
+    def first_at_or_after(self, t):
+        """Index of the first bar with open_time >= t (len(self) if none)."""
+        return int(self.open_time.searchsorted(t, side="left"))
+
+    def slice(self, t0, t1):
+        """(lo, hi) index range of bars with t0 <= open_time < t1."""
+        lo, hi = self.open_time.searchsorted([t0, t1], side="left")
+        return int(lo), int(hi)
+
+    def view(self, lo, hi):
+        return KlineArrays(*(getattr(self, f)[lo:hi] for f in self.FIELDS))
+
+    def window(self, t0, t1):
+        return self.view(*self.slice(t0, t1))
+
+
+def merge_spans(spans):
+    out = []
+    for s, e in sorted(spans):
+        if out and s <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], e)
+        else:
+            out.append([s, e])
+    return out
+
+
+def subtract_spans(start, end, covered):
+    """Parts of [start, end) not inside any covered span."""
+    missing, cur = [], start
+    for s, e in covered:
+        if e <= cur: continue
+        if s >= end: break
+        if s > cur: missing.append((cur, min(s, end)))
+        cur = max(cur, e)
+        if cur >= end: break
+    if cur < end: missing.append((cur, end))
+    return missing
+
+
+class KlineStore:
+    """
+    get(symbol, interval, start_ms, end_ms) returns bars with open_time in [start_ms, end_ms),
+    downloading only the spans not yet covered on disk (unless offline=True).
+    fetcher(symbol, interval, start_ms, end_ms) must return a kline DataFrame with open_time <= end_ms.
+    Recently read day partitions are kept in memory (max_cached_days).
+    """
+    def __init__(self, root="./kline_cache", fetcher=None, offline=False, max_cached_days=512):
+        self.root = root
+        self.fetcher = fetcher
+        self.offline = offline
+        self.max_cached_days = max_cached_days
+        self._days = OrderedDict()
+        self._coverage = {}
+        self.stats = {"fetches": 0, "fetched_bars": 0, "day_reads": 0, "day_writes": 0}
+
+    # ----- paths / manifest -----
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, symbol, interval)
+
+    def _day_path(self, symbol, interval, day):
+        return os.path.join(self._dir(symbol, interval), f"{day}.parquet")
+
+    def coverage(self, symbol, interval):
+        key = (symbol, interval)
+        if key not in self._coverage:
+            path = os.path.join(self._dir(symbol, interval), "_coverage.json")
+            spans = []
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    spans = json.load(f).get("spans", [])
+            self._coverage[key] = merge_spans(spans)
+        return self._coverage[key]
+
+    def _save_coverage(self, symbol, interval, spans):
+        d = self._dir(symbol, interval)
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, "_coverage.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"spans": spans}, f)
+        os.replace(tmp, path)
+        self._coverage[(symbol, interval)] = spans
+
+    def missing(self, symbol, interval, start_ms, end_ms):
+        step = INTERVAL_MS[interval]
+        start_ms = start_ms // step * step
+        end_ms = -(-end_ms // step) * step
+        return subtract_spans(start_ms, end_ms, self.coverage(symbol, interval))
+
+    # ----- day partitions -----
+    @staticmethod
+    def _day(ms):
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+    def _read_day(self, symbol, interval, day):
+        key = (symbol, interval, day)
+        if key in self._days:
+            self._days.move_to_end(key)
+            return self._days[key]
+        # kept as Arrow tables: reading and concatenating many small days is much cheaper than via pandas
+        path = self._day_path(symbol, interval, day)
+        tb = pq.read_table(path, use_threads=False) if os.path.exists(path) else None
+        if tb is not None: self.stats["day_reads"] += 1
+        self._days[key] = tb
+        while len(self._days) > self.max_cached_days:
+            self._days.popitem(last=False)
+        return tb
+
+    def _write(self, symbol, interval, df):
+        if df.empty: return
+        d = self._dir(symbol, interval)
+        os.makedirs(d, exist_ok=True)
+        day_idx = df["open_time"] // DAY_MS
+        for day_num, part in df.groupby(day_idx, sort=False):
+            day = self._day(int(day_num) * DAY_MS)
+            old = self._read_day(symbol, interval, day)
+            if old is not None:
+                part = normalize(pd.concat([old.to_pandas(), part], ignore_index=True))
+            tb = pa.Table.from_pandas(part, preserve_index=False)
+            path = self._day_path(symbol, interval, day)
+            tmp = path + ".tmp"
+            pq.write_table(tb, tmp)
+            os.replace(tmp, path)
+            self._days[(symbol, interval, day)] = tb
+            self.stats["day_writes"] += 1
+
+    # ----- public -----
+    def fill(self, symbol, interval, start_ms, end_ms):
+        """Download and store the uncovered parts of [start_ms, end_ms). Returns number of bars fetched."""
+        if self.offline or self.fetcher is None: return 0
+        step = INTERVAL_MS[interval]
+        open_bar = int(time.time() * 1000) // step * step  # still forming, never cached
+        n = 0
+        for s, e in self.missing(symbol, interval, start_ms, min(end_ms, open_bar)):
+            e = min(e, open_bar)
+            if s >= e: continue
+            df = normalize(self.fetcher(symbol, interval, s, e - 1))
+            df = df[(df["open_time"] >= s) & (df["open_time"] < e)]
+            self.stats["fetches"] += 1
+            self.stats["fetched_bars"] += len(df)
+            self._write(symbol, interval, df)
+            self._save_coverage(symbol, interval, merge_spans(self.coverage(symbol, interval) + [[s, e]]))
+            n += len(df)
+        return n
+
+    def get(self, symbol, interval, start_ms, end_ms):
+        self.fill(symbol, interval, start_ms, end_ms)
+        return self.read(symbol, interval, start_ms, end_ms)
+
+    def read(self, symbol, interval, start_ms, end_ms):
+        """Stored bars with open_time in [start_ms, end_ms); never touches the network."""
+        parts = []
+        for day_num in range(start_ms // DAY_MS, (end_ms - 1) // DAY_MS + 1):
+            tb = self._read_day(symbol, interval, self._day(day_num * DAY_MS))
+            if tb is not None and tb.num_rows: parts.append(tb)
+        if not parts:
+            return empty_frame()
+        df = pa.concat_tables(parts).to_pandas()
+        lo, hi = df["open_time"].searchsorted([start_ms, end_ms])
+        return df.iloc[lo:hi].reset_index(drop=True)
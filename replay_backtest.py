@@ -0,0 +1,248 @@
+# replay_backtest.py
+# Full-market replay of the live scanner rules over cached history.
+#
+# Streams 1m/15m bars for every symbol in time order, one chunk (default 1 day) at a time,
+# and at every scan step (default 180s, the live ALERT_COOLDOWN_SECONDS) rebuilds exactly what the
+# live scanners see: the last 50 15m bars, the last one still forming (aggregated from 1m bars up
+# to the step, never from the final bar), and the last 1m bars. The detectors are the ones the
+# live code runs:
+#   - app.batch.flash_move  -> ScannerEngine.check_180s_shock
+#   - app.rules registry    -> ScannerEngine.check_trend (short_reversal / long_trend)
+#                              and Level1Scanner A/B/C (scan.ini analyze_batch)
+# Each signal is entered at the next 1m open and marked to fixed horizons (plus MFE/MAE).
+# Memory is bounded by one chunk of bars for all symbols; signals are appended to CSV per chunk.
+#
+# Usage:
+#   python replay_backtest.py --start 2025-11-01 --end 2025-12-01 --out ./out_replay
+#   python replay_backtest.py --symbols WETUSDT,ZECUSDT --start 2025-12-01 --end 2025-12-08 --offline
+
+import argparse, os, sys, json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "crypto_scanner_v2.2"))
+from app.batch import C, H, L, V, BatchParams, flash_move
+from app.rules import Features
+from kline_store import KlineStore
+from strict_backtest_price_volume import fapi_klines
+
+M1 = 60_000
+M15 = 900_000
+DAY_MS = 24*60*60*1000
+BARS = 50        # live scanners request limit=50 15m klines
+SHOCK_BARS = 4   # check_180s_shock compares close[-1] with open[-4]
+
+# (source, rule, app.rules rule name, direction): +1 long, -1 short, 0 = sign of the 15m move
+RULES = [
+    ("scanner", "short_reversal", "short_reversal", -1),
+    ("scanner", "long_trend", "long_trend", +1),
+    ("level1", "A_up", "a_up", +1),
+    ("level1", "A_dn", "a_dn", -1),
+    ("level1", "B_single", "b_single", 0),
+    ("level1", "B_accum", "b_accum", 0),
+    ("level1", "C_up", "c_up", -1),   # 放量冲高回落 -> potential reversal down
+    ("level1", "C_dn", "c_dn", +1),
+]
+
+
+def parse_day(s):
+    return int(datetime.strptime(s, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def cached_symbols(cache_dir):
+    if not os.path.isdir(cache_dir): return []
+    return sorted(d for d in os.listdir(cache_dir) if os.path.isdir(os.path.join(cache_dir, d, "1m")))
+
+
+class SymbolChunk:
+    """One symbol's bars for one chunk, plus running 15m aggregates of the 1m bars (forming bar)."""
+    def __init__(self, df15, df1):
+        self.t15 = df15["open_time"].to_numpy()
+        self.k15 = np.stack([df15[c].to_numpy(dtype=float) for c in ("open", "high", "low", "close", "volume")], axis=1)
+        self.t1 = df1["open_time"].to_numpy()
+        self.o1 = df1["open"].to_numpy(dtype=float)
+        self.c1 = df1["close"].to_numpy(dtype=float)
+        self.h1 = df1["high"].to_numpy(dtype=float)
+        self.l1 = df1["low"].to_numpy(dtype=float)
+        bucket = pd.Series(self.t1 // M15)
+        self.bucket1 = bucket.to_numpy()
+        self.cum_h = df1["high"].groupby(bucket.values).cummax().to_numpy(dtype=float)
+        self.cum_l = df1["low"].groupby(bucket.values).cummin().to_numpy(dtype=float)
+        self.cum_v = df1["volume"].groupby(bucket.values).cumsum().to_numpy(dtype=float)
+
+    def windows(self, taus):
+        """
+        (len(taus), BARS, 5) 15m windows as seen live at each tau, their bar counts, and the
+        1m shock inputs (open 3m ago, last close) with a validity mask.
+        """
+        n = len(taus)
+        k15 = self.t15.searchsorted(taus, side="left")        # 15m bars opened before tau
+        k1 = self.t1.searchsorted(taus, side="left")          # 1m bars closed by tau (tau is minute aligned)
+        idx = k15[:, None] + np.arange(-BARS, 0)[None, :]
+        ok = idx >= 0
+        arr = np.where(ok[:, :, None], self.k15[np.clip(idx, 0, None)], np.nan)
+        n_bars = ok.sum(axis=1)
+
+        # replace the forming bar's high/low/close/volume with the 1m aggregate up to tau
+        last = np.clip(k15 - 1, 0, None)
+        forming = (k15 > 0) & (self.t15[last] + M15 > taus)
+        j = np.clip(k1 - 1, 0, None)
+        have = (k1 > 0) & (self.bucket1[j] == self.t15[last] // M15)
+        arr[forming & have, -1, H] = self.cum_h[j][forming & have]
+        arr[forming & have, -1, L] = self.cum_l[j][forming & have]
+        arr[forming & have, -1, C] = self.c1[j][forming & have]
+        arr[forming & have, -1, V] = self.cum_v[j][forming & have]
+        n_bars[forming & ~have] = 0  # no 1m data for the forming bar: skip rather than peek at its final values
+
+        o_3m = self.o1[np.clip(k1 - SHOCK_BARS, 0, None)]
+        close = self.c1[j]
+        shock_ok = (k1 >= SHOCK_BARS) & (o_3m > 0)
+        return arr, n_bars, o_3m, close, shock_ok, k1
+
+    def forward(self, k1, direction, horizons):
+        """Returns for entry at 1m bar k1 (next open) after each horizon (minutes), plus MFE / MAE."""
+        out = {}
+        if k1 >= len(self.t1):
+            return None
+        entry = self.o1[k1]
+        for hm in horizons:
+            e = k1 + hm - 1
+            out[f"ret_{hm}m"] = direction * (self.c1[e] / entry - 1) if e < len(self.c1) else np.nan
+        end = min(len(self.t1), k1 + max(horizons))
+        hi, lo = self.h1[k1:end].max(), self.l1[k1:end].min()
+        fav, adv = (hi, lo) if direction > 0 else (lo, hi)
+        out["mfe"] = direction * (fav / entry - 1)
+        out["mae"] = direction * (adv / entry - 1)
+        out["entry_px"] = entry
+        return out
+
+
+def replay_chunk(chunks, t0, t1, step_ms, params, horizons, last_fired):
+    """Evaluate every symbol at every step in [t0, t1); returns the signal rows of this chunk."""
+    taus = np.arange(t0, t1, step_ms, dtype=np.int64)
+    rows = []
+    for sym, ch in chunks.items():
+        arr, n_bars, o_3m, close, shock_ok, k1 = ch.windows(taus)
+        f = Features(arr, n_bars, params)  # only the features the rules below need are computed
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_1m, shock_hit, shock_score = flash_move(o_3m, close, params.flash_threshold)
+        shock_hit &= shock_ok
+
+        hits = [("scanner", "shock", shock_hit, 0)]
+        # ScannerEngine.analyze_single: the 180s shock wins, trend rules only when there is no shock
+        for source, rule, mask, direction in RULES:
+            m = f.hit(mask)
+            hits.append((source, rule, m & ~shock_hit if source == "scanner" else m, direction))
+
+        for source, rule, mask, direction in hits:
+            for i in np.flatnonzero(mask):
+                tau = int(taus[i])
+                # one signal per symbol / rule / 15m bar (the live scanners repeat it every round)
+                key = (sym, rule)
+                if last_fired.get(key) == tau // M15: continue
+                last_fired[key] = tau // M15
+                move = float(pct_1m[i]) if rule == "shock" else float(f.pct[i])
+                d = direction or (1 if move > 0 else -1)
+                fwd = ch.forward(int(k1[i]), d, horizons)
+                if fwd is None: continue
+                rows.append({
+                    "time": tau, "symbol": sym, "source": source, "rule": rule,
+                    "direction": "LONG" if d > 0 else "SHORT",
+                    "price": float(close[i]) if rule == "shock" else float(f.close[i]),
+                    "move": move,
+                    "vol_ratio": float(f.vol_ratio[i]),
+                    "score": int(shock_score[i]) if rule == "shock" else None,
+                    **fwd,
+                })
+    return rows
+
+
+def update_summary(summary, rows, horizons):
+    """Streaming per-rule aggregates (count / win rate / mean return per horizon)."""
+    for r in rows:
+        s = summary.setdefault(f'{r["source"]}:{r["rule"]}', {"signals": 0})
+        s["signals"] += 1
+        for hm in horizons:
+            v = r[f"ret_{hm}m"]
+            if v != v: continue  # NaN: horizon past the end of data
+            s[f"n_{hm}m"] = s.get(f"n_{hm}m", 0) + 1
+            s[f"sum_{hm}m"] = s.get(f"sum_{hm}m", 0.0) + v
+            s[f"wins_{hm}m"] = s.get(f"wins_{hm}m", 0) + (v > 0)
+
+
+def finish_summary(summary, horizons):
+    out = {}
+    for rule, s in sorted(summary.items()):
+        o = {"signals": s["signals"]}
+        for hm in horizons:
+            n = s.get(f"n_{hm}m", 0)
+            o[f"win_rate_{hm}m"] = s[f"wins_{hm}m"] / n if n else None
+            o[f"avg_ret_{hm}m"] = s[f"sum_{hm}m"] / n if n else None
+        out[rule] = o
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--start", required=True, help="UTC day, YYYY-MM-DD")
+    ap.add_argument("--end", required=True, help="UTC day (exclusive), YYYY-MM-DD")
+    ap.add_argument("--symbols", default=None, help="Comma separated; default = every symbol with 1m data in --cache_dir")
+    ap.add_argument("--cache_dir", default="./kline_cache")
+    ap.add_argument("--offline", action="store_true", help="Use cached klines only, never hit the network")
+    ap.add_argument("--out", default="./out_replay")
+    ap.add_argument("--step", type=int, default=180, help="Seconds between scans (live ALERT_COOLDOWN_SECONDS)")
+    ap.add_argument("--chunk_days", type=float, default=1.0, help="Bars held in memory at once")
+    ap.add_argument("--horizons", default="15,60,240", help="Minutes after entry to mark returns")
+    args = ap.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    start, end = parse_day(args.start), parse_day(args.end)
+    step_ms = max(M1, args.step * 1000 // M1 * M1)
+    chunk_ms = max(step_ms, int(args.chunk_days * DAY_MS) // step_ms * step_ms)
+    horizons = [int(x) for x in args.horizons.split(",")]
+    lookahead = max(horizons) * M1
+    params = BatchParams()
+
+    store = KlineStore(args.cache_dir, fetcher=fapi_klines, offline=args.offline)
+    symbols = args.symbols.split(",") if args.symbols else cached_symbols(args.cache_dir)
+    if not symbols:
+        raise SystemExit("No symbols: pass --symbols or fill --cache_dir first.")
+
+    out_csv = os.path.join(args.out, "signals.csv")
+    if os.path.exists(out_csv): os.remove(out_csv)
+    summary, last_fired, n_signals = {}, {}, 0
+
+    for t0 in tqdm(range(start, end, chunk_ms), desc="Replay"):
+        t1 = min(end, t0 + chunk_ms)
+        chunks = {}
+        for sym in symbols:
+            df15 = store.get(sym, "15m", t0 - BARS * M15, t1)
+            df1 = store.get(sym, "1m", t0 - SHOCK_BARS * M1 - M15, t1 + lookahead)
+            if df15.empty or df1.empty: continue
+            chunks[sym] = SymbolChunk(df15, df1)
+
+        rows = replay_chunk(chunks, t0, t1, step_ms, params, horizons, last_fired)
+        if rows:
+            df = pd.DataFrame(rows)
+            df.insert(1, "time_utc", pd.to_datetime(df["time"], unit="ms", utc=True).dt.strftime("%Y-%m-%d %H:%M"))
+            df.to_csv(out_csv, mode="a", header=not os.path.exists(out_csv), index=False, encoding="utf-8")
+            update_summary(summary, rows, horizons)
+            n_signals += len(rows)
+
+    result = {"symbols": len(symbols), "start": args.start, "end": args.end, "step_seconds": step_ms // 1000,
+              "signals": n_signals, "rules": finish_summary(summary, horizons)}
+    out_json = os.path.join(args.out, "replay_summary.json")
+    with open(out_json, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print("DONE")
+    print("kline store:", store.stats)
+    print("signals:", out_csv)
+    print("summary:", out_json)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
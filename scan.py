@@ -1,16 +1,35 @@
-import requests
 import pandas as pd
+import numpy as np
+import os
+import sys
 import time
 import datetime
 import threading
+import queue
 import tkinter as tk
 from tkinter import ttk, messagebox
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from itertools import islice
 import urllib3
 
+# 共用 crypto_scanner_v2.2/app 里的批量计算模块和规则注册表
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "crypto_scanner_v2.2"))
+from app.batch import BatchParams, pack_klines
+from app.rules import evaluate_batch
+from app.http_client import HttpClient, kline_weight
+from app.evomemory import EvoMemory
+from app.leaderboard import Leaderboard
+from app.tiers import TierScheduler, parse_tickers
+
 # 禁用安全警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+UI_FRAME_MS = 100      # 主线程每隔多少毫秒处理一次扫描线程投递的 UI 消息
+HISTORY_MAX = 5000     # 历史信号最多保留条数, 表格里只放当前可见的那几行
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scan_state.npz")  # 进化记录 + 关注列表快照
+SNAPSHOT_SECONDS = 60  # 快照间隔
+
 class Level1ScannerV05:
     def __init__(self, root):
         self.root = root
@@ -26,19 +45,45 @@ class Level1ScannerV05:
             "http": f"http://127.0.0.1:{self.proxy_port}",
             "https": f"http://127.0.0.1:{self.proxy_port}"
         }
+        self.http = HttpClient(pool_size=10, proxies=self.proxies, verify=False)
         
         # --- 🧠 核心数据结构 ---
-        self.evolution_memory = {} 
+        self.evolution_memory = EvoMemory(size=32)  # 每个币种最近 32 次告警的环形缓冲
         self.watchlist = set() 
+        self.last_snapshot = 0.0
+        try:
+            watchlist = self.evolution_memory.load(STATE_FILE)
+            if watchlist is not None:
+                self.watchlist = watchlist
+                print(f"Resumed {len(self.evolution_memory)} symbols, {len(watchlist)} watched from {STATE_FILE}")
+        except Exception as e:
+            print(f"State load error: {e}")
         self.new_listings = [] 
         self.top_movers_12h = [] 
         self.scan_round = 0 
         self.base_url = "https://fapi.binance.com"
         self.symbols_info = {} 
-        self.scan_interval = 120
+        self.scan_interval = 120  # 同一币种同一原因的告警最短间隔 (秒)
+
+        # --- ⏱ 分层调度: 热门币几秒一扫, 冷门币很少扫, 分层由全市场 ticker 快照决定 ---
+        self.tiers = TierScheduler(intervals={"hot": 10, "warm": 60, "cold": 300}, snapshot_interval=30)
+        self.board = Leaderboard(half_life=1800)  # 只用来算热度
+        self.frames = {}       # 每个币种最近一次拉到的 K线, 本轮没轮到的沿用上次
+        self.last_alert = {}   # (symbol, reason) -> 上次进历史的时间
+
+        # --- 🖥 UI 队列: 扫描线程只投递消息, Tk 控件只在主线程里 (root.after) 按帧更新 ---
+        self.ui_queue = queue.Queue()
+        self.rows = {}                              # Treeview -> {iid: (values, tags)}, 差量更新用
+        self.history = deque(maxlen=HISTORY_MAX)    # 新的在前: (iid, values, tags)
+        self.history_seq = 0
+        self.history_offset = 0                     # 虚拟滚动: 表格第一行对应 history 的下标
+        self.history_rows = 20                      # 表格可见行数, 随窗口大小更新
+        self.debug = False                          # debug_mode 的副本, 扫描线程只读这个
         
         # 启动 UI 和 线程
         self.setup_ui()
+        self.root.after(UI_FRAME_MS, self.drain_ui)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.start_scan_thread()
 
     def setup_style(self):
@@ -166,7 +211,14 @@ class Level1ScannerV05:
         for c in cols_hist: 
             self.tree_history.heading(c, text=c.capitalize()); 
             self.tree_history.column(c, width=100, anchor="center")
+        # 虚拟滚动: 滚动条对应整个 history, 表格里只有可见的几行
+        self.history_scroll = ttk.Scrollbar(tab_history, orient="vertical", command=self.on_history_scroll)
+        self.history_scroll.pack(side="right", fill="y")
         self.tree_history.pack(fill="both", expand=True)
+        self.tree_history.bind("<Configure>", self.on_history_resize)
+        self.tree_history.bind("<MouseWheel>", lambda e: self.on_history_scroll("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.tree_history.bind("<Button-4>", lambda e: self.on_history_scroll("scroll", -1, "units"))
+        self.tree_history.bind("<Button-5>", lambda e: self.on_history_scroll("scroll", 1, "units"))
 
         # Tab 2: 7天新币 (Module 4)
         tab_new = tk.Frame(self.notebook, bg="#f5f5f5")
@@ -204,12 +256,27 @@ class Level1ScannerV05:
 
     # --- 交互与逻辑 ---
     def clear_all(self):
-        self.evolution_memory = {}
+        self.evolution_memory.clear()
         for tree in [self.tree_signal, self.tree_history, self.tree_new, self.tree_12h_up, self.tree_12h_down, self.tree_market]:
             for item in tree.get_children(): tree.delete(item)
+        self.rows.clear()
+        self.history.clear()
+        self.history_offset = 0
+        self.render_history()
         self.watchlist.clear()
+        self.save_state()
         messagebox.showinfo("系统", "数据已重置")
 
+    def save_state(self):
+        try:
+            self.evolution_memory.save(STATE_FILE, self.watchlist.copy())
+        except Exception as e:
+            print(f"State save error: {e}")
+
+    def on_close(self):
+        self.save_state()
+        self.root.destroy()
+
     def on_add_watchlist(self, event):
         tree = event.widget
         selected = tree.selection()
@@ -224,10 +291,11 @@ class Level1ScannerV05:
             self.watchlist.add(symbol)
             print(f"Added: {symbol}")
             messagebox.showinfo("Watchlist", f"已加入监控: {symbol}")
+        self.save_state()
 
     def get_active_symbols(self):
         try:
-            resp = requests.get(f"{self.base_url}/fapi/v1/exchangeInfo", proxies=self.proxies, verify=False).json()
+            resp = self.http.get(f"{self.base_url}/fapi/v1/exchangeInfo", weight=1, timeout=10).json()
             symbols = []
             curr_time = time.time() * 1000
             for s in resp['symbols']:
@@ -239,159 +307,257 @@ class Level1ScannerV05:
         except: return []
 
     def analyze_single(self, symbol, thresholds):
+        # 单币种入口和批量模式走同一套规则 (app/rules.py), 不再单独实现一遍
         df = self.get_klines(symbol)
-        if df is None or len(df) < 25: return None, None, None
+        if df is None or len(df) < 25: return None, None, None, None
+        alerts, markets, new_listings, top_movers = self.analyze_batch({symbol: df}, thresholds)
+        return (alerts[0] if alerts else None), markets[0], (new_listings[0] if new_listings else None), top_movers[0]
 
-        curr = df.iloc[-1]
-        close = curr['c']; open_p = curr['o']; vol = curr['v']
-        
-        pct_change = (close - open_p) / open_p
+    def build_alert(self, symbol, close, pct_change, vol_ratio, change_12h, reason, is_watched):
         abs_change = abs(pct_change)
-        vol_ma20 = df['v'].iloc[-21:-1].mean()
-        vol_ratio = vol / (vol_ma20 if vol_ma20 > 0 else 1)
-
-        # 12h Change
-        price_12h_ago = df.iloc[0]['c']
-        change_12h = (close - price_12h_ago) / price_12h_ago
-
-        # Lists Data
         info = self.symbols_info.get(symbol, {})
-        new_data = None
-        if info.get('days', 999) <= 7:
-            new_data = {"symbol": symbol, "price": close, "change12h": change_12h, "days": info['days']}
+        score = 50 + int(abs_change * 1000) + int(vol_ratio * 5)
+        if is_watched: score += 20
         
-        top_12h_data = {"symbol": symbol, "change": change_12h, "price": close}
-
-        # Scanner Logic
-        triggered = False
-        reason = ""
-        high_4h = df['h'].iloc[-17:-1].max(); low_4h = df['l'].iloc[-17:-1].min()
+        evo = "⚖️"
+        prev = self.evolution_memory.last(symbol)
+        if prev is not None:
+            if score > prev: evo = "🚀"
+            elif score < prev: evo = "📉"
         
-        if abs_change >= thresholds['trend'] and vol_ratio >= thresholds['vol']:
-            triggered = True; reason = "突破4H" if pct_change > 0 else "跌破4H"
-        if not triggered and abs_change >= thresholds['accel']: triggered = True; reason = "剧烈波动"
+        tags = []
+        if is_watched: tags.append("⭐")
+        if info.get('days', 999) <= 7: tags.append("🆕")
+        if abs(change_12h) > 0.15: tags.append("🚀12h强")
         
-        is_watched = symbol in self.watchlist
-        if is_watched and abs_change >= 0.01: triggered = True; reason = f"⭐关注异动 {reason}"
-
-        alert = None
-        if triggered:
-            is_first = symbol not in self.evolution_memory
-            score = 50 + int(abs_change * 1000) + int(vol_ratio * 5)
-            if is_watched: score += 20
-            
-            evo = "⚖️"
-            if symbol in self.evolution_memory:
-                prev = self.evolution_memory[symbol][-1]
-                if score > prev['score']: evo = "🚀"
-                elif score < prev['score']: evo = "📉"
-            
-            tags = []
-            if is_watched: tags.append("⭐")
-            if info.get('days', 999) <= 7: tags.append("🆕")
-            if abs(change_12h) > 0.15: tags.append("🚀12h强")
-            
-            alert = {
-                "evo": evo, "score": min(99, score), "time": datetime.datetime.now().strftime("%H:%M"),
-                "symbol": symbol, "price": close, "change": pct_change, "vol": vol_ratio,
-                "tags": " ".join(tags), "reason": reason, "is_watched": is_watched, "round": self.scan_round
-            }
+        return {
+            "evo": evo, "score": min(99, score), "time": datetime.datetime.now().strftime("%H:%M"),
+            "symbol": symbol, "price": close, "change": pct_change, "vol": vol_ratio,
+            "tags": " ".join(tags), "reason": reason, "is_watched": is_watched, "round": self.scan_round
+        }
 
-        return alert, {"sym": symbol, "chg": pct_change, "vol": vol_ratio}, new_data, top_12h_data
+    # --- V0.6 批量模式: 所有币种的 K线打包成一个数组, 一次向量化算完规则 ---
+    def analyze_batch(self, frames, thresholds):
+        symbols, arr, n_bars = pack_klines(frames)
+        watched = np.array([s in self.watchlist for s in symbols], dtype=bool)
+        params = BatchParams(trend=thresholds['trend'], vol=thresholds['vol'], accel=thresholds['accel'])
+        res = evaluate_batch(symbols, arr, n_bars, params, watched)
+
+        alerts, markets, new_listings, top_movers = [], [], [], []
+        for i in np.flatnonzero(res.valid):
+            symbol = symbols[i]
+            close, pct_change, vol_ratio = float(res.close[i]), float(res.pct_change[i]), float(res.vol_ratio[i])
+            change_12h = float(res.change_12h[i])
+            markets.append({"sym": symbol, "chg": pct_change, "vol": vol_ratio})
+            top_movers.append({"symbol": symbol, "change": change_12h, "price": close})
+            info = self.symbols_info.get(symbol, {})
+            if info.get('days', 999) <= 7:
+                new_listings.append({"symbol": symbol, "price": close, "change12h": change_12h, "days": info['days']})
+
+            reason = ""
+            if res.v05_trend[i]: reason = "突破4H" if pct_change > 0 else "跌破4H"
+            elif res.v05_accel[i]: reason = "剧烈波动"
+            if res.v05_watch[i]: reason = f"⭐关注异动 {reason}"
+            if reason:
+                alerts.append(self.build_alert(symbol, close, pct_change, vol_ratio, change_12h, reason, bool(watched[i])))
+        return alerts, markets, new_listings, top_movers
 
     def start_scan_thread(self):
         t = threading.Thread(target=self.scan_loop, daemon=True)
         t.start()
 
+    def refresh_tiers(self, now):
+        try:
+            resp = self.http.get(f"{self.base_url}/fapi/v1/ticker/24hr", weight=40, timeout=10).json()
+            tickers = [t for t in parse_tickers(resp) if t[0] in self.symbols_info]
+            heat = {sym: self.board.heat(e, now) for sym, e in self.board.entries.items()}
+            self.tiers.update(tickers, heat=heat, watchlist=self.watchlist, now=now)
+        except Exception as e:
+            self.tiers.snapshot_at = now
+            print(f"Ticker snapshot error: {e}")
+
+    def post(self, kind, *payload):
+        """扫描线程 -> UI: 只入队, 不碰 Tk 控件"""
+        self.ui_queue.put((kind, payload))
+
     def scan_loop(self):
-        self.lbl_progress_info.config(text="Connecting to Binance...")
+        self.post("progress", 0, "Connecting to Binance...")
         self.symbols = self.get_active_symbols()
         
         while True:
+            now = time.time()
+            if self.tiers.stale(now): self.refresh_tiers(now)
+            due = self.tiers.due(now)
+            if not due:
+                time.sleep(1)
+                continue
+
             self.scan_round += 1
-            self.lbl_round.config(text=f"Round {self.scan_round}")
+            c = self.tiers.counts()
+            self.post("round", f"Round {self.scan_round}  🔥{c['hot']} 🌤{c['warm']} ❄{c['cold']}")
             
             # Reset containers
             self.new_listings = []; self.top_movers_12h = []
             alerts = []; markets = []
             
             thresholds = {"trend": 0.05, "vol": 2.5, "accel": 0.08}
-            if self.debug_mode.get(): thresholds = {"trend": 0.02, "vol": 1.5, "accel": 0.03}
+            if self.debug: thresholds = {"trend": 0.02, "vol": 1.5, "accel": 0.03}
             
+            # 线程池只负责拉到期币种的 K线, 规则在全部拉完后一次批量计算
             completed = 0
             with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = {executor.submit(self.analyze_single, sym, thresholds): sym for sym in self.symbols}
+                futures = {executor.submit(self.get_klines, sym): sym for sym in due}
                 for future in as_completed(futures):
                     completed += 1
-                    self.progress_var.set((completed/len(self.symbols))*100)
-                    # 进度条上方显示当前正在扫描的币
-                    self.lbl_progress_info.config(text=f"Scanning: {futures[future]} [{int((completed/len(self.symbols))*100)}%]")
+                    # 进度条上方显示当前正在扫描的币 (UI 每帧只取最新一条)
+                    pct = completed / len(due) * 100
+                    self.post("progress", pct, f"Scanning: {futures[future]} [{int(pct)}%]")
                     
                     try:
-                        res = future.result()
-                        if res[0]: alerts.append(res[0])
-                        if res[1]: markets.append(res[1])
-                        if res[2]: self.new_listings.append(res[2])
-                        if res[3]: self.top_movers_12h.append(res[3])
+                        df = future.result()
+                        if df is not None: self.frames[futures[future]] = df
                     except: pass
+            for sym in [s for s in self.frames if s not in self.tiers.tiers]: del self.frames[sym]
             
-            self.update_ui(alerts, markets)
-            
-            # Record Evo
+            try:
+                alerts, markets, self.new_listings, self.top_movers_12h = self.analyze_batch(self.frames, thresholds)
+            except Exception as e:
+                print(f"Batch analyze error: {e}")
+
+            # 只有本轮刚拉过 K线的告警才算新告警 (进历史/进化记录/热度), 同一原因冷却 scan_interval 秒
+            due_set = set(due)
+            fresh = []
             for a in alerts:
-                if a['symbol'] not in self.evolution_memory: self.evolution_memory[a['symbol']] = []
-                self.evolution_memory[a['symbol']].append(a)
-
-            self.lbl_progress_info.config(text="Scan Complete. Waiting...")
-            self.lbl_update_time.config(text=f"Last Update: {datetime.datetime.now().strftime('%H:%M:%S')}")
+                key = (a['symbol'], a['reason'])
+                if a['symbol'] in due_set and now - self.last_alert.get(key, 0) >= self.scan_interval:
+                    self.last_alert[key] = now
+                    fresh.append(a)
             
-            for i in range(self.scan_interval, 0, -1):
-                time.sleep(1)
-
-    def update_ui(self, alerts, markets):
-        # 1. Main Signal
-        for item in self.tree_signal.get_children(): self.tree_signal.delete(item)
-        alerts.sort(key=lambda x: x['score'], reverse=True)
+            self.post("results", alerts, markets, self.new_listings, self.top_movers_12h, fresh)
+            
+            # Record Evo
+            for a in fresh:
+                self.evolution_memory.record(a['symbol'], a['score'], a['price'], ts=now)
+                self.board.update(a['symbol'], a['score'], a['reason'], a['change'], ts=now)
+            if now - self.last_snapshot >= SNAPSHOT_SECONDS:
+                self.last_snapshot = now
+                self.save_state()
+
+            self.post("progress", 100, "Scan Complete. Waiting...")
+            self.post("updated", f"Last Update: {datetime.datetime.now().strftime('%H:%M:%S')}")
+
+    # --- 🖥 UI 刷新 (只在主线程里跑) ---
+    def drain_ui(self):
+        """取出这一帧积压的全部消息: 同类只用最新一条, 历史把每一轮的新告警都追加上, 然后统一刷新一次"""
+        latest, fresh = {}, []
+        try:
+            while True:
+                kind, payload = self.ui_queue.get_nowait()
+                latest[kind] = payload
+                if kind == "results": fresh.extend(payload[-1])
+        except queue.Empty:
+            pass
+        try:
+            if "round" in latest: self.lbl_round.config(text=latest["round"][0])
+            if "progress" in latest:
+                pct, text = latest["progress"]
+                self.progress_var.set(pct)
+                self.lbl_progress_info.config(text=text)
+            if "updated" in latest: self.lbl_update_time.config(text=latest["updated"][0])
+            if "results" in latest: self.update_ui(*latest["results"][:-1], fresh)
+        except Exception as e:
+            print(f"UI update error: {e}")
+        finally:
+            self.debug = self.debug_mode.get()
+            self.root.after(UI_FRAME_MS, self.drain_ui)
+
+    def sync_tree(self, tree, rows):
+        """
+        按 iid 差量更新 Treeview, rows = [(iid, values, tags), ...] (目标顺序)。
+        值没变的行不动, 变了的原地改, 消失的删掉, 顺序变了才 move; 选中状态和滚动位置都保留。
+        """
+        cache = self.rows.setdefault(tree, {})
+        want = {iid for iid, _, _ in rows}
+        gone = [iid for iid in cache if iid not in want]
+        if gone: tree.delete(*gone)
+        for iid in gone: del cache[iid]
+        for iid, values, tags in rows:
+            old = cache.get(iid)
+            if old is None:
+                tree.insert("", "end", iid=iid, values=values, tags=tags)
+            elif old != (values, tags):
+                tree.item(iid, values=values, tags=tags)
+            cache[iid] = (values, tags)
+        order = [iid for iid, _, _ in rows]
+        if list(tree.get_children()) != order:
+            for i, iid in enumerate(order): tree.move(iid, "", i)
+
+    def update_ui(self, alerts, markets, new_listings, top_movers, fresh=()):
+        # 1. Main Signal (iid = 币种, 每个币种每轮最多一条告警)
+        alerts = sorted(alerts, key=lambda x: x['score'], reverse=True)
+        rows = []
         for r in alerts:
             tag = 'watchlist' if r['is_watched'] else ('strong' if r['evo']=="🚀" else '')
             vals = (r['evo'], r['score'], r['time'], r['symbol'], f"{r['price']:.4f}", 
                     f"{r['change']*100:+.2f}%", f"x{r['vol']:.1f}", r['tags'], r['reason'])
-            self.tree_signal.insert("", "end", values=vals, tags=(tag,))
+            rows.append((r['symbol'], vals, (tag,)))
+        self.sync_tree(self.tree_signal, rows)
             
-            # Add to History (Bottom Tab 1)
+        # Add to History (Bottom Tab 1): 只记本轮新出现的告警
+        for r in fresh:
             hist_vals = (f"#{r['round']}", r['time'], r['symbol'], f"{r['price']:.4f}", 
                          f"{r['change']*100:+.2f}%", f"x{r['vol']:.1f}", r['score'])
-            self.tree_history.insert("", 0, values=hist_vals)
+            self.history_seq += 1
+            self.history.appendleft((f"h{self.history_seq}", hist_vals, ()))
+        if fresh:
+            # 往回翻看时保持看的还是同一批记录
+            if self.history_offset: self.history_offset = min(self.history_offset + len(fresh), len(self.history) - 1)
+            self.render_history()
 
         # 2. Market Context (Right)
-        markets.sort(key=lambda x: abs(x['chg']), reverse=True)
-        for item in self.tree_market.get_children(): self.tree_market.delete(item)
-        for m in markets[:20]:
-            self.tree_market.insert("", "end", values=(m['sym'], f"{m['chg']*100:+.2f}%", f"x{m['vol']:.1f}"))
+        markets = sorted(markets, key=lambda x: abs(x['chg']), reverse=True)
+        self.sync_tree(self.tree_market, [(m['sym'], (m['sym'], f"{m['chg']*100:+.2f}%", f"x{m['vol']:.1f}"), ())
+                                          for m in markets[:20]])
 
         # 3. New Listings (Bottom Tab 2)
-        self.new_listings.sort(key=lambda x: x['days'])
-        for item in self.tree_new.get_children(): self.tree_new.delete(item)
-        for n in self.new_listings:
-            self.tree_new.insert("", "end", values=(n['symbol'], f"{n['price']:.4f}", f"{n['change12h']*100:+.2f}%", f"{n['days']:.1f}d"))
+        new_listings = sorted(new_listings, key=lambda x: x['days'])
+        self.sync_tree(self.tree_new, [(n['symbol'], (n['symbol'], f"{n['price']:.4f}", f"{n['change12h']*100:+.2f}%", f"{n['days']:.1f}d"), ())
+                                       for n in new_listings])
 
         # 4. 12h Top (Bottom Tab 3 - Split)
-        self.top_movers_12h.sort(key=lambda x: x['change'], reverse=True)
-        
-        # Gainers
-        for item in self.tree_12h_up.get_children(): self.tree_12h_up.delete(item)
-        for t in self.top_movers_12h[:10]: # Top 10 Gainers
-            self.tree_12h_up.insert("", "end", values=(t['symbol'], f"{t['change']*100:+.2f}%", f"{t['price']:.4f}"))
-            
-        # Losers
-        for item in self.tree_12h_down.get_children(): self.tree_12h_down.delete(item)
-        for t in self.top_movers_12h[-10:]: # Bottom 10 Losers
-            self.tree_12h_down.insert("", "end", values=(t['symbol'], f"{t['change']*100:+.2f}%", f"{t['price']:.4f}"))
+        top_movers = sorted(top_movers, key=lambda x: x['change'], reverse=True)
+        row12h = lambda t: (t['symbol'], (t['symbol'], f"{t['change']*100:+.2f}%", f"{t['price']:.4f}"), ())
+        self.sync_tree(self.tree_12h_up, [row12h(t) for t in top_movers[:10]])     # Top 10 Gainers
+        self.sync_tree(self.tree_12h_down, [row12h(t) for t in top_movers[-10:]])  # Bottom 10 Losers
+
+    def render_history(self):
+        """虚拟滚动: 只把 history[offset : offset + 可见行数] 放进表格"""
+        n = len(self.history)
+        self.history_offset = max(0, min(self.history_offset, n - self.history_rows))
+        rows = list(islice(self.history, self.history_offset, self.history_offset + self.history_rows))
+        self.sync_tree(self.tree_history, rows)
+        if n: self.history_scroll.set(self.history_offset / n, (self.history_offset + len(rows)) / n)
+        else: self.history_scroll.set(0, 1)
+
+    def on_history_scroll(self, action, value, unit=None):
+        if action == "moveto":
+            self.history_offset = int(float(value) * len(self.history))
+        else:
+            step = self.history_rows if unit == "pages" else 3
+            self.history_offset += int(value) * step
+        self.render_history()
+        return "break"
+
+    def on_history_resize(self, event):
+        rows = max(1, event.height // 25 - 1)  # rowheight=25, 减去表头
+        if rows != self.history_rows:
+            self.history_rows = rows
+            self.render_history()
 
     def get_klines(self, symbol):
         try:
             params = {'symbol': symbol, 'interval': '15m', 'limit': 50}
-            resp = requests.get(f"{self.base_url}/fapi/v1/klines", params=params, proxies=self.proxies, verify=False, timeout=5)
+            resp = self.http.get(f"{self.base_url}/fapi/v1/klines", params=params, weight=kline_weight(50), timeout=5)
             df = pd.DataFrame(resp.json(), columns=['op_t','o','h','l','c','v','cl_t','qav','nt','tb','tq','ig'])
             df[['o','h','l','c','v']] = df[['o','h','l','c','v']].astype(float)
             return df
@@ -3,37 +3,29 @@
 # OI/Funding conditions are disabled (needs extra data source).
 #
 # Usage:
-#   pip install pandas requests python-dateutil tqdm
+#   pip install -r requirements-backtest.txt
 #   python strict_backtest_price_volume.py --trades your_trades.csv --out ./out
+#   python strict_backtest_price_volume.py --trades your_trades.csv --offline   # cached klines only
+#   python strict_backtest_price_volume.py --trades your_trades.csv --sweep grid.json   # parameter grid search
 
-import argparse, os, json, time
+import argparse, os, sys, json, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 
+import numpy as np
 import pandas as pd
-import requests
 from dateutil import parser as dtparser
 from tqdm import tqdm
 
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-def make_session():
-    s = requests.Session()
-    retry = Retry(
-        total=8,
-        backoff_factor=1.2,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET"],
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retry, pool_connections=50, pool_maxsize=50)
-    s.mount("https://", adapter)
-    s.mount("http://", adapter)
-    s.headers.update({"User-Agent": "Mozilla/5.0"})
-    return s
-
-SESSION = make_session()
+# Shared HTTP client (keep-alive pool, retries, weight limiter) and rule registry from crypto_scanner_v2.2/app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "crypto_scanner_v2.2"))
+from app.http_client import HttpClient, kline_weight
+from app.batch import BatchParams
+from app.rules import RULES, Features
+from kline_store import KlineArrays, KlineStore
+
+HTTP = HttpClient(pool_size=50, retries=8, backoff_factor=1.2)
 
 BINANCE_FAPI_PRIMARY = "https://fapi.binance.com"
 BINANCE_FAPI_BACKUP  = "https://fstream.binance.com"
@@ -70,9 +62,10 @@ def to_utc_ms(x):
     except:
         return None
 
-def fapi_klines(symbol, interval, start_ms, end_ms, limit=1500, sleep=0.6):
+def fapi_klines(symbol, interval, start_ms, end_ms, limit=1500, sleep=0.0):
     """
     Download futures klines [open_time, open, high, low, close, volume, close_time, ...]
+    Pacing is done by the shared weight limiter in HTTP; `sleep` is an optional extra pause.
     """
     out = []
     cur = start_ms
@@ -81,13 +74,13 @@ def fapi_klines(symbol, interval, start_ms, end_ms, limit=1500, sleep=0.6):
         # r = requests.get(BINANCE_FAPI + "/fapi/v1/klines", params=params, timeout=20)
         url = BINANCE_FAPI_PRIMARY + "/fapi/v1/klines"
         try:
-            r = SESSION.get(url, params=params, timeout=25)
+            r = HTTP.get(url, params=params, weight=kline_weight(limit), timeout=25)
             r.raise_for_status()
         except Exception:
             # fallback to backup domain
             time.sleep(1.5)
             url2 = BINANCE_FAPI_BACKUP + "/fapi/v1/klines"
-            r = SESSION.get(url2, params=params, timeout=25)
+            r = HTTP.get(url2, params=params, weight=kline_weight(limit), timeout=25)
             r.raise_for_status()
         r.raise_for_status()
         data = r.json()
@@ -100,7 +93,7 @@ def fapi_klines(symbol, interval, start_ms, end_ms, limit=1500, sleep=0.6):
         if nxt >= end_ms or len(data) < limit:
             break
         cur = nxt
-        time.sleep(sleep)
+        if sleep: time.sleep(sleep)
     df = pd.DataFrame(out, columns=[
         "open_time","open","high","low","close","volume","close_time",
         "qav","num_trades","tbbav","tbqav","ignore"
@@ -138,49 +131,72 @@ class RuleParams:
     trail_start_r: float = 3.0
 
 # ---------- rule logic ----------
-def is_breakout_4h_15m(df15, idx, direction):
+# All lookups take KlineArrays (see kline_store.py): indexes are positions within the trade window.
+# The trigger checks are the shared rule registry (crypto_scanner_v2.2/app/rules.py) that the live
+# scanners evaluate: breakout_up/breakout_dn (close beyond the previous 16 bars' high/low) and
+# vol_spike (volume / MA20 of the previous 20 bars >= mult).
+def signal_features(k15, idx, vol_mult=None):
+    """Registry features of the 15m bar idx, computed from the bars up to and including it."""
+    p = BatchParams() if vol_mult is None else BatchParams(vol_factor=vol_mult)
+    bars = max(RULES[n].min_bars(p) for n in ("breakout_up", "breakout_dn", "vol_spike"))
+    lo = max(0, idx + 1 - bars)
+    return Features.from_columns(k15.open[lo:idx+1], k15.high[lo:idx+1], k15.low[lo:idx+1],
+                                 k15.close[lo:idx+1], k15.volume[lo:idx+1], bars, p)
+
+def is_breakout_4h_15m(k15, idx, direction, f=None):
     """
     Check breakout of last 4h range.
     idx is the bar index representing the signal bar (15m).
     """
-    if idx < 16:  # 4h = 16 bars of 15m
+    f = f or signal_features(k15, idx)
+    name = "breakout_up" if direction == "up" else "breakout_dn"
+    if not f.enough(name):  # 4h = 16 bars of 15m before the signal bar
         return False, None
-    window = df15.iloc[idx-16:idx]  # previous 4h
-    prev_high = window["high"].max()
-    prev_low  = window["low"].min()
-    close = df15.iloc[idx]["close"]
-    if direction == "up":
-        return close > prev_high, prev_high
-    else:
-        return close < prev_low, prev_low
+    level = f.high_4h[0] if direction == "up" else f.low_4h[0]
+    return bool(f.hit(name)[0]), level
 
-def vol_spike(df15, idx, mult):
-    if idx < 20:
-        return False
-    ma20 = df15["volume"].iloc[idx-20:idx].mean()
-    return df15.iloc[idx]["volume"] >= ma20 * mult
+def vol_spike(k15, idx, mult, f=None):
+    f = f or signal_features(k15, idx, mult)
+    return bool(f.hit("vol_spike")[0])
 
-def pct_change_15m(df15, idx):
+def pct_change_15m(k15, idx, f=None):
     # Using open->close of the same bar as "15m move"
-    o = df15.iloc[idx]["open"]
-    c = df15.iloc[idx]["close"]
-    return (c - o) / o if o else 0.0
+    f = f or signal_features(k15, idx)
+    return float(f.pct[0])
 
-def confirm_hold_5m(df5, level, t_ms, direction, bars=1):
+def confirm_hold_5m(k5, level, t_ms, direction, bars=1):
     """
     After signal time t_ms, require next 'bars' 5m closes hold above level (up) or below level (down).
     """
-    # find first 5m bar whose open_time >= t_ms
-    sub = df5[df5["open_time"] >= t_ms].copy()
-    if len(sub) < bars:
+    # first 5m bar whose open_time >= t_ms
+    i = k5.first_at_or_after(t_ms)
+    if len(k5) - i < bars:
         return False
-    sub = sub.iloc[:bars]
+    closes = k5.close[i:i+bars]
     if direction == "up":
-        return (sub["close"] >= level).all()
+        return bool((closes >= level).all())
     else:
-        return (sub["close"] <= level).all()
+        return bool((closes <= level).all())
 
-def simulate_trade(df15, df5, entry_ms, side, level, params: RuleParams):
+def structure_levels(k15, t_ms, side):
+    """
+    15m structure stop for each 5m timestamp in t_ms: min low (LONG) / max high (SHORT)
+    of the last 16 15m bars with open_time <= t. NaN where fewer than 16 bars exist.
+    """
+    k = k15.open_time.searchsorted(t_ms, side="right")  # number of 15m bars with open_time <= t
+    out = np.full(len(t_ms), np.nan)
+    ok = k >= 16
+    if not ok.any():
+        return out
+    # only the 15m bars that can be referenced by this trade
+    lo, hi = int(k[ok].min()) - 16, int(k.max())
+    src = k15.low[lo:hi] if side == "LONG" else k15.high[lo:hi]
+    win = np.lib.stride_tricks.sliding_window_view(src, 16)
+    roll = win.min(axis=1) if side == "LONG" else win.max(axis=1)  # roll[j] covers bars lo+j .. lo+j+15
+    out[ok] = roll[k[ok] - 16 - lo]
+    return out
+
+def simulate_trade(k15, k5, entry_ms, side, level, params: RuleParams):
     """
     Simple simulation:
     - enter at next 5m open after entry_ms
@@ -189,102 +205,77 @@ def simulate_trade(df15, df5, entry_ms, side, level, params: RuleParams):
     - breakeven at +1.5R
     - trailing at +3R using 15m swing structure (proxy: last 2 15m lows/highs)
     Returns dict with pnl in R and timestamps.
+
+    Vectorized over the forward 5m path; gives the same exits as walking the bars one by one:
+    breakeven resets the stop to entry on its bar, trailing then only tightens with the 15m structure.
     """
-    direction = "up" if side == "LONG" else "down"
+    long = side == "LONG"
     # entry price: next 5m open
-    nxt = df5[df5["open_time"] >= entry_ms]
-    if nxt.empty:
+    i0 = k5.first_at_or_after(entry_ms)
+    if i0 >= len(k5):
         return {"taken": False, "reason": "no_5m_data"}
-    entry_row = nxt.iloc[0]
-    entry_px = entry_row["open"]
+    entry_t = int(k5.open_time[i0])
+    entry_px = k5.open[i0]
 
     # define stop at level (conservative)
     stop_px = level
 
     # avoid invalid risk
-    risk = (entry_px - stop_px) if side == "LONG" else (stop_px - entry_px)
+    risk = (entry_px - stop_px) if long else (stop_px - entry_px)
     if risk <= 0:
         return {"taken": False, "reason": "non_positive_risk"}
 
-    be_px = entry_px + params.breakeven_r * risk if side == "LONG" else entry_px - params.breakeven_r * risk
-    trail_start_px = entry_px + params.trail_start_r * risk if side == "LONG" else entry_px - params.trail_start_r * risk
+    be_px = entry_px + params.breakeven_r * risk if long else entry_px - params.breakeven_r * risk
+    trail_start_px = entry_px + params.trail_start_r * risk if long else entry_px - params.trail_start_r * risk
 
-    cur_stop = stop_px
-    moved_be = False
-    trail_on = False
-
-    # iterate 5m bars forward for max 10 days as safety
+    # 5m bars forward for max 10 days as safety
     max_end = entry_ms + 10*24*60*60*1000
-    fwd = df5[(df5["open_time"] >= entry_row["open_time"]) & (df5["open_time"] <= max_end)].copy()
-    if fwd.empty:
+    i1 = k5.first_at_or_after(max_end + 1)
+    if i1 <= i0:
         return {"taken": True, "entry_px": entry_px, "exit_px": entry_px, "exit_reason":"no_forward", "pnl_r":0.0}
-
-    exit_px = None
-    exit_t = None
-    exit_reason = None
-
-    # for trailing: use 15m structure proxy
-    def structure_stop(t_ms):
-        # Use last 4h 15m lows/highs as proxy for structure
-        bar = df15[df15["open_time"] <= t_ms]
-        if len(bar) < 16:
-            return cur_stop
-        last = bar.iloc[-16:]  # last 4h
-        if side == "LONG":
-            return last["low"].min()
-        else:
-            return last["high"].max()
-
-    for _, r in fwd.iterrows():
-        o,h,l,c = r["open"], r["high"], r["low"], r["close"]
-        t = int(r["open_time"])
-
-        # move to breakeven
-        if not moved_be:
-            if (side == "LONG" and h >= be_px) or (side == "SHORT" and l <= be_px):
-                cur_stop = entry_px  # breakeven
-                moved_be = True
-
-        # enable trailing
-        if not trail_on:
-            if (side == "LONG" and h >= trail_start_px) or (side == "SHORT" and l <= trail_start_px):
-                trail_on = True
-
-        if trail_on:
-            new_stop = structure_stop(t)
-            # only tighten
-            if side == "LONG":
-                cur_stop = max(cur_stop, new_stop)
-            else:
-                cur_stop = min(cur_stop, new_stop)
-
-        # stop check within bar
-        if side == "LONG":
-            if l <= cur_stop:
-                exit_px = cur_stop
-                exit_t = t
-                exit_reason = "stop"
-                break
-        else:
-            if h >= cur_stop:
-                exit_px = cur_stop
-                exit_t = t
-                exit_reason = "stop"
-                break
-
-    if exit_px is None:
+    t = k5.open_time[i0:i1]
+    h = k5.high[i0:i1]
+    l = k5.low[i0:i1]
+    n = len(t)
+
+    def first(mask):
+        idx = np.flatnonzero(mask)
+        return int(idx[0]) if len(idx) else n
+
+    # bar where breakeven / trailing switch on (n = never)
+    b = first(h >= be_px) if long else first(l <= be_px)
+    a = first(h >= trail_start_px) if long else first(l <= trail_start_px)
+
+    # stop in force on each bar: base stop, reset to entry from the breakeven bar on,
+    # tightened by the running extreme of the structure stop once trailing is on
+    struct = np.full(n, -np.inf if long else np.inf)
+    if a < n:
+        lv = structure_levels(k15, t[a:], side)
+        struct[a:] = np.where(np.isnan(lv), struct[a:], lv)
+    stops = np.empty(n)
+    acc = np.maximum.accumulate if long else np.minimum.accumulate
+    pick = np.maximum if long else np.minimum
+    stops[:b] = pick(stop_px, acc(struct[:b])) if b > 0 else stops[:b]
+    if b < n:
+        stops[b:] = pick(entry_px, acc(struct[b:]))
+
+    # stop check within bar
+    k = first(l <= stops) if long else first(h >= stops)
+    if k < n:
+        exit_px, exit_t, exit_reason = stops[k], int(t[k]), "stop"
+    else:
         # exit at last close
-        exit_px = float(fwd.iloc[-1]["close"])
-        exit_t = int(fwd.iloc[-1]["open_time"])
+        exit_px = float(k5.close[i1 - 1])
+        exit_t = int(t[-1])
         exit_reason = "timeout"
 
-    pnl = (exit_px - entry_px) if side == "LONG" else (entry_px - exit_px)
+    pnl = (exit_px - entry_px) if long else (entry_px - exit_px)
     pnl_r = pnl / risk
     return {
         "taken": True,
         "entry_px": float(entry_px),
         "exit_px": float(exit_px),
-        "entry_time": int(entry_row["open_time"]),
+        "entry_time": entry_t,
         "exit_time": int(exit_t),
         "exit_reason": exit_reason,
         "pnl_r": float(pnl_r),
@@ -292,12 +283,108 @@ def simulate_trade(df15, df5, entry_ms, side, level, params: RuleParams):
         "stop_px_initial": float(stop_px),
     }
 
+# ---------- per-trade / per-symbol runner ----------
+# klines windows per trade: 15m 30d back / 5d fwd, 5m 7d back / 5d fwd
+WIN15 = (30*24*60*60*1000, 5*24*60*60*1000)
+WIN5  = (7*24*60*60*1000, 5*24*60*60*1000)
+
+def backtest_trade(sym, side, tm, k15, k5, params: RuleParams):
+    """Rule check + confirmation + simulation for one trade (KlineArrays windows); returns the result row."""
+    if k15.empty or k5.empty:
+        return {"symbol":sym,"side":side,"tms":tm,"rule_take":False,"reason":"no_klines"}
+
+    # pre-estimate "new coin": we can't know listing time from klines alone reliably; we approximate:
+    # if earliest available 15m kline is within new_days from trade time => treat as new
+    first15 = int(k15.open_time[0])
+    is_new = (tm - first15) <= params.new_days * 24*60*60*1000
+
+    # locate 15m bar containing tm
+    idx = k15.bar_at(tm)
+    if idx < 0:
+        return {"symbol":sym,"side":side,"tms":tm,"rule_take":False,"reason":"no_15m_bar"}
+
+    # trigger check
+    mult = params.vol_mult_new if is_new else params.vol_mult_main
+    f = signal_features(k15, idx, mult)
+    move = pct_change_15m(k15, idx, f)
+
+    if side == "LONG":
+        th = params.a_new_up if is_new else params.a_main_up
+        ok_move = move >= th
+        ok_break, level = is_breakout_4h_15m(k15, idx, "up", f)
+    else:
+        th = params.a_new_dn if is_new else params.a_main_dn
+        ok_move = move <= th
+        ok_break, level = is_breakout_4h_15m(k15, idx, "down", f)
+
+    ok_vol = vol_spike(k15, idx, mult, f)
+
+    if not (ok_move and ok_break and ok_vol and level is not None):
+        return {
+            "symbol":sym,"side":side,"tms":tm,"is_new":is_new,
+            "rule_take":False,"reason":"no_trigger",
+            "move15m":move,"ok_move":ok_move,"ok_break":ok_break,"ok_vol":ok_vol
+        }
+
+    # confirmation: next N 5m closes hold above/below breakout level
+    confirm = confirm_hold_5m(k5, level, int(k15.close_time[idx]), "up" if side=="LONG" else "down",
+                              bars=params.confirm_5m_bars)
+    if not confirm:
+        return {
+            "symbol":sym,"side":side,"tms":tm,"is_new":is_new,
+            "rule_take":False,"reason":"no_confirm",
+            "move15m":move,"break_level":level
+        }
+
+    # simulate trade
+    sim = simulate_trade(k15, k5, int(k15.close_time[idx]), side, level, params)
+    return {
+        "symbol":sym,"side":side,"tms":tm,"is_new":is_new,
+        "rule_take":sim.get("taken", False),
+        "reason":sim.get("reason","ok"),
+        "move15m":move,
+        "break_level":level,
+        **{k:v for k,v in sim.items() if k!="reason"}
+    }
+
+def prefetch_symbol(cache_dir, sym, tms):
+    """Download only the uncovered spans of every trade window of one symbol."""
+    store = KlineStore(cache_dir, fetcher=fapi_klines, max_cached_days=64)
+    for tm in tms:
+        store.fill(sym, "15m", tm - WIN15[0], tm + WIN15[1])
+        store.fill(sym, "5m", tm - WIN5[0], tm + WIN5[1])
+    return store.stats
+
+def run_symbol(cache_dir, sym, trades, params: RuleParams):
+    """
+    Worker: backtest all trades [(pos, side, tm), ...] of one symbol from the local store (no network).
+    The symbol's range is read once into KlineArrays; each trade gets a zero-copy window of it.
+    """
+    store = KlineStore(cache_dir, offline=True)
+    tms = [tm for _, _, tm in trades]
+    k15 = KlineArrays.from_frame(store.read(sym, "15m", min(tms) - WIN15[0], max(tms) + WIN15[1]))
+    k5 = KlineArrays.from_frame(store.read(sym, "5m", min(tms) - WIN5[0], max(tms) + WIN5[1]))
+    out = [(pos, backtest_trade(sym, side, tm,
+                                k15.window(tm - WIN15[0], tm + WIN15[1]),
+                                k5.window(tm - WIN5[0], tm + WIN5[1]), params))
+           for pos, side, tm in trades]
+    return out, store.stats
+
+def merge_stats(total, stats):
+    for k, v in stats.items():
+        total[k] = total.get(k, 0) + v
+
 # ---------- main ----------
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--trades", required=True, help="Your trades csv from Binance (fills/positions).")
     ap.add_argument("--out", default="./out", help="Output folder")
     ap.add_argument("--assume_newdays", type=int, default=7)
+    ap.add_argument("--cache_dir", default="./kline_cache", help="Local Parquet kline store")
+    ap.add_argument("--offline", action="store_true", help="Use cached klines only, never hit the network")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Backtest processes (1 = run inline)")
+    ap.add_argument("--fetch_threads", type=int, default=8, help="Parallel symbols while downloading klines")
+    ap.add_argument("--sweep", default=None, help="Grid-search RuleParams from a JSON grid (see backtest_sweep.py)")
     args = ap.parse_args()
 
     os.makedirs(args.out, exist_ok=True)
@@ -338,88 +425,39 @@ def main():
     df = df[df["_side"].isin(["LONG","SHORT"])].copy()
 
     # We'll backtest each trade as if the rule decides to trade at that time.
-    results = []
-    cache15, cache5 = {}, {}
-
-    # pre-estimate "new coin": we can't know listing time from klines alone reliably; we approximate:
-    # if earliest available 15m kline is within new_days from trade time => treat as new
-    for _, row in tqdm(df.iterrows(), total=len(df), desc="Backtesting"):
-        sym = row["_symbol"]
-        side = row["_side"]
-        tm = int(row["_tms"])
-
-        # get klines window: need 4h before + 2 days after for trailing
-        start = tm - 8*60*60*1000   # 8h before
-        end   = tm + 3*24*60*60*1000  # 3 days after
-
-        key15 = (sym, start//(60*60*1000), end//(60*60*1000))
-        # cache per symbol with broader range to reduce calls
-        if sym not in cache15:
-            cache15[sym] = fapi_klines(sym, "15m", tm - 30*24*60*60*1000, tm + 5*24*60*60*1000)  # 30d back, 5d fwd
-        if sym not in cache5:
-            cache5[sym] = fapi_klines(sym, "5m", tm - 7*24*60*60*1000, tm + 5*24*60*60*1000)     # 7d back, 5d fwd
-
-        df15 = cache15[sym]
-        df5  = cache5[sym]
-        if df15.empty or df5.empty:
-            results.append({"symbol":sym,"side":side,"tms":tm,"rule_take":False,"reason":"no_klines"})
-            continue
-
-        # determine "new coin" proxy
-        first15 = int(df15.iloc[0]["open_time"])
-        is_new = (tm - first15) <= params.new_days * 24*60*60*1000
-
-        # locate 15m bar containing tm
-        idx_candidates = df15.index[(df15["open_time"] <= tm) & (df15["close_time"] > tm)]
-        if len(idx_candidates)==0:
-            results.append({"symbol":sym,"side":side,"tms":tm,"rule_take":False,"reason":"no_15m_bar"})
-            continue
-        idx = int(idx_candidates[0])
-
-        # trigger check
-        mult = params.vol_mult_new if is_new else params.vol_mult_main
-        move = pct_change_15m(df15, idx)
-
-        if side == "LONG":
-            th = params.a_new_up if is_new else params.a_main_up
-            ok_move = move >= th
-            ok_break, level = is_breakout_4h_15m(df15, idx, "up")
+    # Trades are grouped by symbol: klines are fetched once per symbol (threads, shared weight limiter),
+    # then every symbol group is backtested in a process pool from the local store.
+    jobs = [(sym, [(int(p), sd, int(t)) for p, sd, t in zip(g["_pos"], g["_side"], g["_tms"])])
+            for sym, g in df.assign(_pos=range(len(df))).sort_values("_tms", kind="stable").groupby("_symbol")]
+    jobs.sort(key=lambda j: -len(j[1]))  # biggest groups first for better load balance
+    stats = {}
+
+    if not args.offline:
+        with ThreadPoolExecutor(max_workers=args.fetch_threads) as ex:
+            futs = [ex.submit(prefetch_symbol, args.cache_dir, sym, [t for _, _, t in trades]) for sym, trades in jobs]
+            for fut in tqdm(as_completed(futs), total=len(futs), desc="Fetching"):
+                merge_stats(stats, fut.result())
+
+    if args.sweep:
+        from backtest_sweep import run_sweep
+        run_sweep(args, jobs, params, stats)
+        return
+
+    pairs = []
+    with tqdm(total=len(df), desc="Backtesting") as bar:
+        if args.workers <= 1:
+            for sym, trades in jobs:
+                out, st = run_symbol(args.cache_dir, sym, trades, params)
+                pairs.extend(out); merge_stats(stats, st); bar.update(len(trades))
         else:
-            th = params.a_new_dn if is_new else params.a_main_dn
-            ok_move = move <= th
-            ok_break, level = is_breakout_4h_15m(df15, idx, "down")
-
-        ok_vol = vol_spike(df15, idx, mult)
-
-        if not (ok_move and ok_break and ok_vol and level is not None):
-            results.append({
-                "symbol":sym,"side":side,"tms":tm,"is_new":is_new,
-                "rule_take":False,"reason":"no_trigger",
-                "move15m":move,"ok_move":ok_move,"ok_break":ok_break,"ok_vol":ok_vol
-            })
-            continue
-
-        # confirmation: next N 5m closes hold above/below breakout level
-        confirm = confirm_hold_5m(df5, level, int(df15.iloc[idx]["close_time"]), "up" if side=="LONG" else "down",
-                                  bars=params.confirm_5m_bars)
-        if not confirm:
-            results.append({
-                "symbol":sym,"side":side,"tms":tm,"is_new":is_new,
-                "rule_take":False,"reason":"no_confirm",
-                "move15m":move,"break_level":level
-            })
-            continue
-
-        # simulate trade
-        sim = simulate_trade(df15, df5, int(df15.iloc[idx]["close_time"]), side, level, params)
-        results.append({
-            "symbol":sym,"side":side,"tms":tm,"is_new":is_new,
-            "rule_take":sim.get("taken", False),
-            "reason":sim.get("reason","ok"),
-            "move15m":move,
-            "break_level":level,
-            **{k:v for k,v in sim.items() if k!="reason"}
-        })
+            with ProcessPoolExecutor(max_workers=args.workers) as ex:
+                futs = {ex.submit(run_symbol, args.cache_dir, sym, trades, params): len(trades) for sym, trades in jobs}
+                for fut in as_completed(futs):
+                    out, st = fut.result()
+                    pairs.extend(out); merge_stats(stats, st); bar.update(futs[fut])
+
+    # deterministic merge: back to file order regardless of completion order
+    results = [r for _, r in sorted(pairs, key=lambda x: x[0])]
 
     out_csv = os.path.join(args.out, "trade_level_backtest.csv")
     pd.DataFrame(results).to_csv(out_csv, index=False, encoding="utf-8-sig")
@@ -448,6 +486,7 @@ def main():
         json.dump(summary, f, ensure_ascii=False, indent=2)
 
     print("DONE")
+    print("kline store:", stats)
     print("trade-level:", out_csv)
     print("summary:", out_json)
     print(json.dumps(summary, ensure_ascii=False, indent=2))